@@ -2,8 +2,12 @@
 
 from typing import Literal
 import functools
+import inspect
+import time
 import traceback
 import logging
+import root_profiling as profiling
+from root_tracing import tracer
 from PySide6.QtWidgets import (
     QApplication, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QWidget, QGraphicsDropShadowEffect
@@ -22,67 +26,140 @@ def get_error_controller():
     return _error_controller_instance
 
 
-def catch_errors_ui(func):
+def _wrap_generator(func, on_error):
     """
-    Decorator that logs the error, shows a toast error message (if a QApplication exists),
-    logs the error to the database via ErrorController, and then re-raises the exception.
+    Wraps a generator function so that exceptions raised while iterating
+    go through `on_error`, not only the ones raised when it is called.
+    When profiling is enabled, only the time spent inside the generator
+    is recorded, not the time the consumer spends between items.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if not profiling.enabled:
+            try:
+                yield from func(*args, **kwargs)
+            except Exception as e:
+                on_error(e, args)
+                raise
+            return
+
+        elapsed = 0.0
+        statements = 0
+        failed = False
+        gen = func(*args, **kwargs)
         try:
-            return func(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                first_statement = profiling.statement_count()
+                try:
+                    value = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                    statements += profiling.statement_count() - first_statement
+                yield value
         except Exception as e:
-            logging.error(f"Error in {func.__name__}: {e}", exc_info=True)
-            print(f"Error in {func.__name__}: {e}")
-
-            # Use the lazy getter to retrieve the controller.
-            get_error_controller().log_error(
-                error_message=str(e),
-                tb=traceback.format_exc(),
-                func_name=func.__name__,
-            )
-
-            # Check if a QApplication exists.
-            app = QApplication.instance()
-            if app is not None:
-                # Attempt to determine a parent widget from the first argument.
-                if args and hasattr(args[0], "width") and hasattr(args[0], "height"):
-                    parent = args[0]
-                else:
-                    parent = app.activeWindow()
-
-                if parent is not None:
-                    show_error_toast(
-                        parent,
-                        message="An unexpected error occurred.\nPlease check the logs for more details.",
-                        pos="top",
-                        lines=2
-                    )
+            failed = True
+            on_error(e, args)
             raise
+        finally:
+            gen.close()
+            profiling.record(func, elapsed, statements, failed)
     return wrapper
 
 
-def catch_errors(func):
+def _wrap_function(func, on_error, action_scope: bool = False):
     """
-    A simpler decorator that logs the error (with traceback) and then re-raises the exception.
-    Use this when you do not want to show a user dialog.
+    Wraps a plain function with error handling and optional profiling.
+    With `action_scope`, the outermost call is a UI action for the SQL tracer.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if action_scope and tracer.enabled and not tracer.in_action:
+            with tracer.action(profiling.function_key(func)):
+                return wrapper(*args, **kwargs)
+        if not profiling.enabled:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                on_error(e, args)
+                raise
+
+        start = time.perf_counter()
+        first_statement = profiling.statement_count()
+        failed = False
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            logging.error(f"Error in {func.__name__}: {e}", exc_info=True)
-            get_error_controller().log_error(
-                error_message=str(e),
-                tb=traceback.format_exc(),
-                func_name=func.__name__,
-            )
-            print(f"Error in {func.__name__}: {e}")
+            failed = True
+            on_error(e, args)
             raise
+        finally:
+            profiling.record(func, time.perf_counter() - start,
+                             profiling.statement_count() - first_statement, failed)
     return wrapper
 
 
+def catch_errors_ui(func):
+    """
+    Decorator that logs the error, shows a toast error message (if a QApplication exists),
+    logs the error to the database via ErrorController, and then re-raises the exception.
+    Calls are timed when profiling is enabled (see root_profiling).
+    """
+    def handle_error(e, args):
+        logging.error(f"Error in {func.__name__}: {e}", exc_info=True)
+        print(f"Error in {func.__name__}: {e}")
+
+        # Use the lazy getter to retrieve the controller.
+        get_error_controller().log_error(
+            error_message=str(e),
+            tb=traceback.format_exc(),
+            func_name=func.__name__,
+        )
+
+        # Check if a QApplication exists.
+        app = QApplication.instance()
+        if app is not None:
+            # Attempt to determine a parent widget from the first argument.
+            if args and hasattr(args[0], "width") and hasattr(args[0], "height"):
+                parent = args[0]
+            else:
+                parent = app.activeWindow()
+
+            if parent is not None:
+                show_error_toast(
+                    parent,
+                    message="An unexpected error occurred.\nPlease check the logs for more details.",
+                    pos="top",
+                    lines=2
+                )
+
+    if inspect.isgeneratorfunction(func):
+        return _wrap_generator(func, handle_error)
+    return _wrap_function(func, handle_error, action_scope=True)
+
+
+def catch_errors(func):
+    """
+    A simpler decorator that logs the error (with traceback) and then re-raises the exception.
+    Use this when you do not want to show a user dialog.
+    Calls are timed when profiling is enabled (see root_profiling).
+    """
+    def handle_error(e, args):
+        logging.error(f"Error in {func.__name__}: {e}", exc_info=True)
+        get_error_controller().log_error(
+            error_message=str(e),
+            tb=traceback.format_exc(),
+            func_name=func.__name__,
+        )
+        print(f"Error in {func.__name__}: {e}")
+
+    if inspect.isgeneratorfunction(func):
+        return _wrap_generator(func, handle_error)
+    return _wrap_function(func, handle_error)
+
+
 def show_error_toast(
     parent,
     message: str = "An unexpected error occurred.",
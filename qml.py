@@ -295,6 +295,17 @@ class ScrollViewWidget(QWidget):
                     {self.list_model_name}.remove(0);
                 }}
             }}
+
+            // QML helper function to change the text of one item in place.
+            function setItemText(productId, text) {{
+                for (var i = 0; i < {self.list_model_name}.count; i++) {{
+                    if ({self.list_model_name}.get(i).productId === productId) {{
+                        {self.list_model_name}.setProperty(i, "text", text);
+                        return true;
+                    }}
+                }}
+                return false;
+            }}
         }}
         '''
 
@@ -340,6 +351,22 @@ class ScrollViewWidget(QWidget):
         else:
             print("Root object not found.")
 
+    @catch_errors
+    def set_item_text(self, item_id, text: str) -> bool:
+        """
+        Changes the text of the item with the given item_id in place by
+        calling the QML function 'setItemText'. Returns False if no item has the id.
+        """
+        root_obj = self.get_root_object()
+        if root_obj is not None:
+            try:
+                return bool(root_obj.setItemText(item_id, text))
+            except Exception as e:
+                print("Error calling setItemText:", e)
+        else:
+            print("Root object not found.")
+        return False
+
     @catch_errors
     def connect_item_clicked(self, slot):
         """
@@ -0,0 +1,228 @@
+# File: root_analytics.py --------------------------------------------------------------------
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional
+
+from root_database import DatabaseManager
+from root_units import engine, item_price
+from error_handler import catch_errors
+
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+
+@dataclass
+class SpendRow:
+    key: str
+    amount: float
+    purchases: int
+    # Purchases whose product had no price; they add nothing to the amount.
+    unpriced: int = 0
+
+
+@dataclass
+class ProductSpend:
+    product_id: int
+    name: str
+    amount: float
+    purchases: int
+
+
+@dataclass
+class PurchaseFrequency:
+    product_id: int
+    name: str
+    purchases: int
+    days: int
+    first_day: str
+    last_day: str
+
+    @property
+    def interval_days(self) -> Optional[float]:
+        """Average number of days between purchases, None if bought on one day only."""
+        if self.days < 2:
+            return None
+        span = (date.fromisoformat(self.last_day) - date.fromisoformat(self.first_day)).days
+        return round(span / (self.days - 1), 1)
+
+
+class SpendingAnalytics:
+    """
+    Spend statistics over the purchase history.
+
+    Purchases are appended to purchase_log by triggers on
+    shopping_list_items, and unticking an item appends a reversal
+    (ShoppingListRepository.undo_purchases); refresh() folds the rows
+    after the last processed id into spend_daily, one row per local day,
+    product and category. A
+    refresh therefore reads only new purchases, and every report is a
+    GROUP BY over the small rollup table instead of a scan of the lists.
+    Reports refresh first, so they are always current.
+    """
+
+    _NEW_PURCHASES_QUERY = """
+    SELECT id, product_id, category, quantity, unit, price_per_unit, price_unit,
+           density, piece_weight, sign, date(purchased_at, 'localtime') AS day
+    FROM purchase_log
+    WHERE id > ?
+    ORDER BY id
+    """
+
+    _NAMES_JOIN = "LEFT JOIN products p ON p.id = s.product_id"
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+
+    @catch_errors
+    def refresh(self) -> int:
+        """Adds the purchases logged since the last refresh and returns their number."""
+        row = self.db.fetchone("SELECT value FROM analytics_state WHERE name = 'purchase_log'")
+        last_id = row['value'] if row else 0
+        rows = self.db.fetchall(self._NEW_PURCHASES_QUERY, (last_id,))
+        if not rows:
+            return 0
+
+        prices = engine.price_many(
+            [row['quantity'] for row in rows], [row['unit'] for row in rows],
+            [row['price_per_unit'] for row in rows], [row['price_unit'] for row in rows],
+            [row['density'] for row in rows], [row['piece_weight'] for row in rows])
+        totals = defaultdict(lambda: [0.0, 0, 0])
+        for row, price in zip(rows, prices):
+            total = totals[(row['day'], row['product_id'], row['category'])]
+            sign = row['sign']
+            if price is None:
+                # Same fallback as the shopping list totals.
+                price = item_price(row['price_per_unit'] or 0.0, row['quantity'], row['unit'])
+            if row['price_per_unit'] is None:
+                total[2] += sign
+            total[0] += sign * price
+            total[1] += sign
+
+        query = """
+        INSERT INTO spend_daily (day, product_id, category, amount, purchases, unpriced)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day, product_id, category) DO UPDATE SET
+            amount = amount + excluded.amount,
+            purchases = purchases + excluded.purchases,
+            unpriced = unpriced + excluded.unpriced
+        """
+        with self.db.transaction():
+            self.db.executemany(query, [
+                (day, product_id, category, round(amount, 4), purchases, unpriced)
+                for (day, product_id, category), (amount, purchases, unpriced) in totals.items()])
+            self.db.execute_query(
+                "UPDATE analytics_state SET value = ? WHERE name = 'purchase_log'", (rows[-1]['id'],))
+        return len(rows)
+
+    @catch_errors
+    def rebuild(self) -> int:
+        """Recomputes spend_daily from the whole purchase log."""
+        with self.db.transaction():
+            self.db.execute_query("DELETE FROM spend_daily")
+            self.db.execute_query("UPDATE analytics_state SET value = 0 WHERE name = 'purchase_log'")
+            return self.refresh()
+
+    @staticmethod
+    def _since(since: Optional[str]) -> tuple:
+        if since is None:
+            return "", ()
+        return "WHERE s.day >= ?", (since,)
+
+    @catch_errors
+    def spend_by_period(self, period: str = "month", since: str = None,
+                        limit: int = None) -> List[SpendRow]:
+        """
+        Spend per day, week or month, latest first.
+
+        Parameters:
+            period (str): "day", "week" or "month"; weeks start on Monday.
+            since (str): First day to include, YYYY-MM-DD.
+        """
+        self.refresh()
+        where, params = self._since(since)
+        query = f"""
+        SELECT strftime('{PERIOD_FORMATS[period]}', s.day) AS period,
+               SUM(s.amount) AS amount, SUM(s.purchases) AS purchases, SUM(s.unpriced) AS unpriced
+        FROM spend_daily s
+        {where}
+        GROUP BY period
+        HAVING SUM(s.purchases) > 0
+        ORDER BY period DESC
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return [SpendRow(row['period'], round(row['amount'], 2), row['purchases'], row['unpriced'])
+                for row in self.db.fetchall(query, params)]
+
+    @catch_errors
+    def spend_by_category(self, since: str = None) -> List[SpendRow]:
+        """Spend per product category, largest first."""
+        self.refresh()
+        where, params = self._since(since)
+        query = f"""
+        SELECT s.category, SUM(s.amount) AS amount, SUM(s.purchases) AS purchases,
+               SUM(s.unpriced) AS unpriced
+        FROM spend_daily s
+        {where}
+        GROUP BY s.category
+        HAVING SUM(s.purchases) > 0
+        ORDER BY amount DESC
+        """
+        return [SpendRow(row['category'], round(row['amount'], 2), row['purchases'], row['unpriced'])
+                for row in self.db.fetchall(query, params)]
+
+    @catch_errors
+    def spend_by_product(self, since: str = None, limit: int = None) -> List[ProductSpend]:
+        """Spend per product, largest first; with `limit` the top-N products."""
+        self.refresh()
+        where, params = self._since(since)
+        query = f"""
+        SELECT s.product_id, p.name, SUM(s.amount) AS amount, SUM(s.purchases) AS purchases
+        FROM spend_daily s
+        {self._NAMES_JOIN}
+        {where}
+        GROUP BY s.product_id
+        HAVING SUM(s.purchases) > 0
+        ORDER BY amount DESC
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return [ProductSpend(row['product_id'], row['name'] or f"#{row['product_id']}",
+                             round(row['amount'], 2), row['purchases'])
+                for row in self.db.fetchall(query, params)]
+
+    @catch_errors
+    def top_products(self, n: int = 10, since: str = None) -> List[ProductSpend]:
+        return self.spend_by_product(since, limit=n)
+
+    @catch_errors
+    def purchase_frequency(self, since: str = None, limit: int = None) -> List[PurchaseFrequency]:
+        """Products by how often they are bought, most frequent first."""
+        self.refresh()
+        where, params = self._since(since)
+        query = f"""
+        SELECT s.product_id, p.name, SUM(s.purchases) AS purchases,
+               COUNT(DISTINCT CASE WHEN s.purchases > 0 THEN s.day END) AS days,
+               MIN(CASE WHEN s.purchases > 0 THEN s.day END) AS first_day,
+               MAX(CASE WHEN s.purchases > 0 THEN s.day END) AS last_day
+        FROM spend_daily s
+        {self._NAMES_JOIN}
+        {where}
+        GROUP BY s.product_id
+        HAVING SUM(s.purchases) > 0
+        ORDER BY purchases DESC, days DESC
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return [PurchaseFrequency(row['product_id'], row['name'] or f"#{row['product_id']}",
+                                  row['purchases'], row['days'], row['first_day'], row['last_day'])
+                for row in self.db.fetchall(query, params)]
@@ -0,0 +1,163 @@
+# File: root_cache.py --------------------------------------------------------------------
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from root_database import DatabaseManager
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A bounded mapping that evicts the least recently used entry once
+    `maxsize` is exceeded. Keeps hit/miss/eviction counters for diagnostics.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+
+    def clear(self):
+        if self._data:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class EntityCache(LRUCache):
+    """
+    Read-through cache for repository entities.
+
+    Local writes invalidate single keys through `invalidate()`. Changes made by
+    any other connection (another process, a sync tool, the sqlite3 shell) are
+    detected through `PRAGMA data_version`, which only changes when a different
+    connection commits, and drop the whole cache.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__(maxsize)
+        self._db = None
+        self._data_version = None
+        self.external_invalidations = 0
+        self._listeners: List[Callable[[Optional[Hashable]], None]] = []
+
+    def add_listener(self, callback: Callable[[Optional[Hashable]], None]):
+        """
+        Registers `callback` for invalidations: it is called with the key for
+        every invalidate(), cached or not, and with None when the whole cache
+        is dropped. Lets derived structures such as indexes follow local
+        writes incrementally.
+        """
+        self._listeners.append(callback)
+
+    def invalidate(self, key: Hashable):
+        super().invalidate(key)
+        for callback in self._listeners:
+            callback(key)
+
+    def clear(self):
+        super().clear()
+        for callback in self._listeners:
+            callback(None)
+
+    def validate(self):
+        """Clears the cache if the database was swapped or written externally."""
+        db = DatabaseManager.get_instance()
+        data_version = db.get_data_version()
+        if db is not self._db or data_version != self._data_version:
+            if self._data:
+                self.external_invalidations += 1
+            self._db = db
+            self._data_version = data_version
+            self.clear()
+
+    def get(self, key: Hashable, default=None):
+        self.validate()
+        return super().get(key, default)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict, List]:
+        """
+        Looks up several keys with a single validation.
+
+        Returns:
+            (found, missing): a dict of cached values and a list of keys not in the cache.
+        """
+        self.validate()
+        found = {}
+        missing = []
+        for key in keys:
+            value = LRUCache.get(self, key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["external_invalidations"] = self.external_invalidations
+        return stats
+
+
+_caches: Dict[str, EntityCache] = {}
+
+
+def get_entity_cache(name: str, maxsize: int = 1024) -> EntityCache:
+    """Returns the process-wide cache registered under `name`, creating it on first use."""
+    cache = _caches.get(name)
+    if cache is None:
+        cache = EntityCache(maxsize)
+        _caches[name] = cache
+    return cache
+
+
+def get_cache_stats() -> Dict[str, dict]:
+    """Returns hit/miss statistics for every registered cache."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def clear_all_caches():
+    for cache in _caches.values():
+        cache.clear()
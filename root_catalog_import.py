@@ -0,0 +1,270 @@
+# File: root_catalog_import.py --------------------------------------------------------------------
+
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from root_database import DatabaseManager
+from root_repositories import ProductRepository, normalize_name
+from root_units import normalize_unit, normalize_price
+from error_handler import catch_errors
+
+# Rows written per executemany. All batches share one transaction.
+IMPORT_BATCH_SIZE = 5000
+
+# Category given to new products whose catalog row has none.
+DEFAULT_CATEGORY = "Muut"
+
+# Column (CSV) / key (NDJSON) names accepted for each product field.
+FIELD_ALIASES = {
+    "name": ("name", "nimi", "product", "tuote"),
+    "unit": ("unit", "yksikkö", "yksikko"),
+    "price_per_unit": ("price_per_unit", "price", "hinta", "kilohinta"),
+    "category": ("category", "kategoria"),
+    "density": ("density", "tiheys"),
+    "piece_weight": ("piece_weight", "kappalepaino", "kpl_paino"),
+}
+
+
+@dataclass
+class CatalogImportReport:
+    rows_read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    duplicates: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def upserted(self) -> int:
+        return self.inserted + self.updated
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"Rows read: {self.rows_read} ({self.rows_per_second:.0f} rows/s, {self.elapsed:.2f} s)",
+            f"Inserted: {self.inserted}, updated: {self.updated}, duplicates: {self.duplicates}",
+            f"Rejected: {len(self.rejected)}",
+        ]
+        for line_no, reason in self.rejected[:20]:
+            lines.append(f"  line {line_no}: {reason}")
+        if len(self.rejected) > 20:
+            lines.append(f"  ... and {len(self.rejected) - 20} more")
+        return "\n".join(lines)
+
+
+def detect_format(path: str) -> str:
+    """Returns 'csv' or 'ndjson' based on the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".ndjson", ".jsonl", ".json"):
+        return "ndjson"
+    return "csv"
+
+
+def iter_csv_records(stream: TextIO) -> Iterator[Tuple[int, dict]]:
+    """Yields (line number, row dict) from a CSV file with a header row. Detects ';' or ','."""
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(stream, dialect=dialect)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_ndjson_records(stream: TextIO) -> Iterator[Tuple[int, dict]]:
+    """Yields (line number, object) from a newline-delimited JSON file. Blank lines are skipped."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {"__error__": f"invalid JSON: {e.msg}"}
+        if not isinstance(record, dict):
+            record = {"__error__": "not a JSON object"}
+        yield line_no, record
+
+
+def _field(record: dict, name: str):
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_price(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value).replace("€", "").replace(" ", "").replace(" ", "")
+    return float(text.replace(",", "."))
+
+
+def _parse_positive(record: dict, name: str, label: str) -> Optional[float]:
+    raw = _field(record, name)
+    if raw is None:
+        return None
+    try:
+        value = _parse_price(raw)
+    except ValueError:
+        raise ValueError(f"invalid {label} '{raw}'")
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"invalid {label} '{raw}'")
+    return value
+
+
+def parse_product_record(record: dict) -> Tuple[str, str, float, Optional[str],
+                                                Optional[float], Optional[float]]:
+    """
+    Validates and normalizes one catalog record.
+
+    Returns:
+        (name, unit, price_per_unit, category, density, piece_weight) with the
+        price expressed in one of root_units.PRICE_UNITS. The category is None
+        if the record has none; density (kg/l) and piece_weight (kg) are None
+        unless given.
+
+    Raises:
+        ValueError: If the record cannot be imported. The message is the reject reason.
+    """
+    if "__error__" in record:
+        raise ValueError(record["__error__"])
+    record = {str(key).strip().casefold(): value for key, value in record.items() if key is not None}
+
+    name = " ".join(str(_field(record, "name") or "").split())
+    if not name:
+        raise ValueError("missing name")
+
+    raw_unit = _field(record, "unit")
+    unit = normalize_unit(raw_unit)
+    if unit is None:
+        raise ValueError(f"unknown unit '{raw_unit}'" if raw_unit else "missing unit")
+
+    raw_price = _field(record, "price_per_unit")
+    if raw_price is None:
+        raise ValueError("missing price")
+    try:
+        price = _parse_price(raw_price)
+    except ValueError:
+        raise ValueError(f"invalid price '{raw_price}'")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"invalid price '{raw_price}'")
+    price, unit = normalize_price(price, unit)
+
+    category = _field(record, "category")
+    category = str(category).strip() if category is not None else None
+    density = _parse_positive(record, "density", "density")
+    piece_weight = _parse_positive(record, "piece_weight", "piece weight")
+    return name, unit, price, category or None, density, piece_weight
+
+
+class ProductCatalogImporter:
+    """
+    Streams a product catalog into the products table.
+
+    Rows are validated and normalized one at a time, deduplicated by
+    normalize_name() (the last row for a name wins) and matched against
+    existing products by the same key. Matches are updated, the rest
+    inserted, with one executemany per batch inside a single transaction.
+    """
+
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = DatabaseManager.get_instance()
+        self.repo = ProductRepository()
+        self.batch_size = batch_size
+
+    @catch_errors
+    def import_file(self, path: str, fmt: str = None,
+                    progress: Callable[[CatalogImportReport], None] = None) -> CatalogImportReport:
+        fmt = fmt or detect_format(path)
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            records = iter_ndjson_records(stream) if fmt == "ndjson" else iter_csv_records(stream)
+            return self.import_records(records, progress)
+
+    @catch_errors
+    def import_records(self, records: Iterable[Tuple[int, dict]],
+                       progress: Callable[[CatalogImportReport], None] = None) -> CatalogImportReport:
+        report = CatalogImportReport()
+        start = time.perf_counter()
+        existing = self.repo.get_product_ids_by_normalized_name()
+        seen = set()
+        pending: Dict[str, tuple] = {}
+
+        with self.db.transaction():
+            for line_no, record in records:
+                report.rows_read += 1
+                try:
+                    product = parse_product_record(record)
+                except ValueError as e:
+                    report.rejected.append((line_no, str(e)))
+                    continue
+                key = normalize_name(product[0])
+                if key in seen:
+                    report.duplicates += 1
+                seen.add(key)
+                pending[key] = product
+                if len(pending) >= self.batch_size:
+                    self._flush(pending, existing, report)
+                    if progress:
+                        report.elapsed = time.perf_counter() - start
+                        progress(report)
+            self._flush(pending, existing, report)
+
+        report.elapsed = time.perf_counter() - start
+        if progress:
+            progress(report)
+        return report
+
+    def _flush(self, pending: Dict[str, tuple], existing: Dict[str, int], report: CatalogImportReport):
+        inserts = []
+        updates = []
+        for key, (name, unit, price, category, density, piece_weight) in pending.items():
+            product_id = existing.get(key)
+            if product_id is None:
+                inserts.append((name, unit, price, category or DEFAULT_CATEGORY,
+                                density, piece_weight))
+            else:
+                updates.append((unit, price, category, density, piece_weight, product_id))
+        if updates:
+            self.repo.update_products_many(updates)
+            report.updated += len(updates)
+        if inserts:
+            last_id = self.db.fetchone("SELECT COALESCE(MAX(id), 0) AS id FROM products")['id']
+            self.repo.insert_products_many(inserts)
+            report.inserted += len(inserts)
+            # Later batches repeating one of these names must update, not insert again.
+            for row in self.db.iter_query("SELECT id, name FROM products WHERE id > ?", (last_id,)):
+                existing.setdefault(normalize_name(row['name']), row['id'])
+        pending.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a product catalog (CSV or NDJSON).")
+    parser.add_argument("path", help="Catalog file")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="Defaults to the file extension")
+    parser.add_argument("--db", default="utils/cook_and_cart.db", help="Database path")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    DatabaseManager(args.db)
+    importer = ProductCatalogImporter(args.batch_size)
+    report = importer.import_file(
+        args.path, args.format,
+        progress=lambda r: print(f"{r.rows_read} rows, {r.upserted} upserted"))
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
 # File: root_controllers.py --------------------------------------------------------------------
 
-from typing import Dict, List
-
-from root_models import Recipe, RecipeIngredient, Product, ShoppingList, ShoppingListItem, ErrorLog
-from root_repositories import RecipeRepository, ProductRepository, ShoppingListRepository, ErrorRepository
+from dataclasses import replace
+from typing import Dict, Iterable, List, Tuple
+
+from root_models import (Recipe, RecipeIngredient, ScaledIngredient, Product, ShoppingList,
+                         ShoppingListItem, PricePoint, PantryItem, ErrorLog, DEFAULT_SERVINGS)
+from root_repositories import (RecipeRepository, ProductRepository, ShoppingListRepository,
+                               PriceHistoryRepository, ErrorRepository)
+from root_catalog_import import ProductCatalogImporter, CatalogImportReport
+from root_recipe_bundle import RecipeBundleIO, RecipeBundleReport
+from root_recipe_costs import RecipeCostEngine, RecipeCost
+from root_meal_plan import MealPlanner, MealPlanEntry, MealPlan
+from root_pantry import Pantry
+from root_recipe_matcher import matcher, RecipeMatch
+from root_recipe_similarity import RecipeSimilarity
+from root_menu_optimizer import menu_optimizer, MenuPlan
+from root_analytics import SpendingAnalytics, SpendRow, ProductSpend, PurchaseFrequency
+from root_units import item_prices
+from root_pricing import pricing
 from error_handler import catch_errors
-from datetime import datetime
+from datetime import datetime, timedelta
 
 CONFIG_FILE = "utils/config.json"
 
@@ -13,6 +27,11 @@ CONFIG_FILE = "utils/config.json"
 class RecipeController:
     def __init__(self):
         self.repo = RecipeRepository()
+        self.cost_engine = RecipeCostEngine()
+        self.matcher = matcher
+        self.similarity = RecipeSimilarity()
+        self.menu_optimizer = menu_optimizer
+        self.pantry = Pantry()
 
     @catch_errors
     def get_all_recipes(self) -> Dict[int, Recipe]:
@@ -22,6 +41,88 @@ class RecipeController:
     def get_recipe_by_id(self, recipe_id: int) -> Recipe:
         return self.repo.get_recipe_by_id(recipe_id)
 
+    @catch_errors
+    def get_recipes_by_ids(self, recipe_ids: List[int]) -> Dict[int, Recipe]:
+        return self.repo.get_recipes_by_ids(recipe_ids)
+
+    @catch_errors
+    def get_recipes_by_name(self, name: str) -> List[Recipe]:
+        return self.repo.get_recipes_by_name(name)
+
+    @catch_errors
+    def get_recipe_costs(self, recipe_ids: List[int] = None) -> Dict[int, RecipeCost]:
+        """
+        Returns the costs of the given recipes, or of all recipes. Costs are
+        read from recipe_costs and computed only for the missing ones.
+        """
+        return self.cost_engine.get_costs(recipe_ids)
+
+    @catch_errors
+    def match_recipes(self, product_ids: Iterable[int] = None, max_missing: int = 0,
+                      limit: int = None) -> List[RecipeMatch]:
+        """
+        Returns the recipes missing at most `max_missing` products, best
+        covered first. Without `product_ids` the pantry's products are used.
+        """
+        if product_ids is None:
+            product_ids = self.pantry.get_items().keys()
+        return self.matcher.match(product_ids, max_missing, limit)
+
+    @catch_errors
+    def get_similar_recipes(self, recipe_id: int, k: int = 5) -> List[Tuple[Recipe, float]]:
+        """
+        Returns up to `k` recipes sharing the most products with `recipe_id`,
+        each with its similarity (0-1).
+        """
+        similar = self.similarity.similar(recipe_id, k)
+        recipes = self.repo.get_recipes_by_ids([s.recipe_id for s in similar])
+        return [(recipes[s.recipe_id], s.similarity) for s in similar if s.recipe_id in recipes]
+
+    @catch_errors
+    def plan_menu(self, count: int = 7, budget: float = 60.0, candidate_ids: Iterable[int] = None,
+                  use_pantry: bool = True) -> MenuPlan:
+        """
+        Picks `count` varied recipes whose combined shopping list costs at
+        most `budget` euros, using what is in the pantry. The plan's
+        entries() can be passed to plan_meals() as is.
+        """
+        return self.menu_optimizer.optimize(count, budget, candidate_ids,
+                                            self.pantry if use_pantry else None)
+
+    @catch_errors
+    def get_recipe_cost(self, recipe_id: int, servings: int = None) -> RecipeCost:
+        """
+        Returns the cost of a recipe, scaled to `servings` if given.
+        """
+        cost = self.cost_engine.get_cost(recipe_id)
+        if cost is None or not servings:
+            return cost
+        recipe = self.repo.get_recipe_by_id(recipe_id)
+        return cost.scaled(servings / recipe.servings) if recipe and recipe.servings else cost
+
+    @catch_errors
+    def get_scaled_ingredients(self, recipe_id: int, servings: int) -> Tuple[ScaledIngredient, ...]:
+        """
+        Returns the ingredients of a recipe with quantities for `servings`
+        servings. Results are cached per (recipe, servings) until the recipe
+        changes; the tuples are immutable, so they are shared, not copied.
+        """
+        by_servings = self.repo.scaled_cache.get(recipe_id)
+        if by_servings is not None and servings in by_servings:
+            return by_servings[servings]
+        recipe = self.repo.get_recipe_by_id(recipe_id)
+        if recipe is None:
+            return ()
+        factor = servings / recipe.servings if recipe.servings else 1.0
+        scaled = tuple(
+            ScaledIngredient(ing.product_id, round(ing.quantity * factor, 3), ing.unit)
+            for ing in recipe.ingredients)
+        if by_servings is None:
+            by_servings = {}
+            self.repo.scaled_cache.put(recipe_id, by_servings)
+        by_servings[servings] = scaled
+        return scaled
+
     @catch_errors
     def get_all_tags(self) -> List[str]:
         return self.repo.get_all_tags()
@@ -31,7 +132,8 @@ class RecipeController:
         return self.repo.get_ingredients_by_recipe_id(recipe_id)
 
     @catch_errors
-    def add_recipe(self, name: str, instructions: str, tags: str, ingredients: List[dict]):
+    def add_recipe(self, name: str, instructions: str, tags: str, ingredients: List[dict],
+                   servings: int = DEFAULT_SERVINGS):
         # Create the Recipe without ingredients.
         recipe = Recipe(
             id=0,  # Database assigns this
@@ -40,60 +142,79 @@ class RecipeController:
             tags=tags,
             created_at=None,
             updated_at=None,
-            ingredients=[]
+            ingredients=[],
+            servings=servings
         )
-        # Add the recipe to the repository to get the assigned id.
-        recipe_id = self.repo.add_recipe(recipe)
-        recipe.id = recipe_id  # Update the recipe id.
-
-        # Now create RecipeIngredient instances with the correct recipe_id.
-        for ing in ingredients:
-            recipe_ingredient = RecipeIngredient(
-                product_id=ing['product_id'],
-                quantity=ing['quantity'],
-                unit=ing.get('unit', '')
-            )
-            self.repo.add_recipe_ingredient(recipe_id, recipe_ingredient)
+        with self.repo.db.transaction():
+            # Add the recipe to the repository to get the assigned id.
+            recipe_id = self.repo.add_recipe(recipe)
+            recipe.id = recipe_id  # Update the recipe id.
+            self.repo.add_recipe_ingredients(
+                recipe_id, self._ingredients_from_dicts(ingredients))
 
         # Optionally, fetch updated ingredients.
         recipe.ingredients = self.repo.get_ingredients_by_recipe_id(recipe_id)
         return recipe
 
     @catch_errors
-    def update_recipe(self, recipe_id: int, name: str = None, instructions: str = None, tags: str = None, ingredients: List[dict] = None):
+    def update_recipe(self, recipe_id: int, name: str = None, instructions: str = None, tags: str = None, ingredients: List[dict] = None,
+                      servings: int = None):
         recipe = self.repo.get_recipe_by_id(recipe_id)
         if not recipe:
             raise ValueError("Recipe not found")
         if name:
             recipe.name = name
+        if servings:
+            recipe.servings = servings
         if instructions:
             recipe.instructions = instructions
         if tags is not None:
             recipe.tags = tags
-        if ingredients is not None:
-            # Remove existing ingredients and add new ones.
-            self.repo.remove_ingredients_from_recipe(recipe_id)
-            for ing in ingredients:
-                recipe_ingredient = RecipeIngredient(
-                    product_id=ing['product_id'],
-                    quantity=ing['quantity'],
-                    unit=ing.get('unit', '')
-                )
-                self.repo.add_recipe_ingredient(recipe_id, recipe_ingredient)
-        self.repo.update_recipe(recipe_id, recipe)
+        with self.repo.db.transaction():
+            if ingredients is not None:
+                # Remove existing ingredients and add new ones.
+                self.repo.remove_ingredients_from_recipe(recipe_id)
+                self.repo.add_recipe_ingredients(
+                    recipe_id, self._ingredients_from_dicts(ingredients))
+            self.repo.update_recipe(recipe_id, recipe)
         return recipe
 
+    @catch_errors
+    def export_bundle(self, path: str, recipe_ids: List[int] = None, progress=None) -> int:
+        """Writes recipes to a recipe bundle, see root_recipe_bundle."""
+        return RecipeBundleIO().export_file(path, recipe_ids, progress)
+
+    @catch_errors
+    def import_bundle(self, path: str, skip_existing: bool = True, progress=None) -> RecipeBundleReport:
+        """Imports a recipe bundle in one transaction, see root_recipe_bundle."""
+        return RecipeBundleIO().import_file(path, skip_existing, progress)
+
+    @staticmethod
+    def _ingredients_from_dicts(ingredients: List[dict]) -> List[RecipeIngredient]:
+        return [
+            RecipeIngredient(
+                product_id=ing['product_id'],
+                quantity=ing['quantity'],
+                unit=ing.get('unit', '')
+            )
+            for ing in ingredients
+        ]
+
     @catch_errors
     def delete_recipe(self, recipe_id: int):
         # Remove ingredients first, then delete the recipe.
-        self.repo.remove_ingredients_from_recipe(recipe_id)
-        self.repo.delete_recipe(recipe_id)
+        with self.repo.db.transaction():
+            self.repo.remove_ingredients_from_recipe(recipe_id)
+            self.repo.delete_recipe(recipe_id)
 
 
 class ShoppingListController:
     def __init__(self):
         self.repo = ShoppingListRepository()
         self.product_repo = ProductRepository()
+        self.price_history = PriceHistoryRepository()
+        self.meal_planner = MealPlanner()
+        self.pantry = Pantry()
 
     @catch_errors
     def update_total_sum(self, shopping_list_id: int, total_sum: float):
@@ -104,11 +225,7 @@ class ShoppingListController:
 
     @catch_errors
     def get_all_shopping_lists(self) -> Dict[int, ShoppingList]:
-        shopping_lists = self.repo.get_all_shopping_lists()
-        for shopping_list in shopping_lists.values():
-            shopping_list.items = self.repo.get_items_by_shopping_list_id(
-                shopping_list.id)
-        return shopping_lists
+        return self.repo.get_all_shopping_lists()
 
     @catch_errors
     def get_shopping_list_with_prices(self, shopping_list_id: int):
@@ -116,16 +233,23 @@ class ShoppingListController:
         if not shopping_list:
             raise ValueError("Shopping list not found")
         items_with_prices = []
+        products = self.product_repo.get_products_by_ids(
+            [item.product_id for item in shopping_list.items])
+        purchase_prices = self.price_history.get_purchase_prices(shopping_list_id)
+        prices = self._price_items(shopping_list.items, products, purchase_prices)
         for item in shopping_list.items:
-            product = self.product_repo.get_product_by_id(item.product_id)
+            product = products.get(item.product_id)
             if product:
-                total_price = round(product.price_per_unit * item.quantity, 2)
+                total_price = round(prices[item.id], 2)
+                # Purchased items keep the price they were bought at.
+                price_point = purchase_prices.get(item.id) if item.is_purchased else None
                 items_with_prices.append({
                     "product_id": item.product_id,
                     "name": product.name,
                     # Use the unit from the shopping list item if available; otherwise use the product default.
                     "unit": item.unit if item.unit else product.unit,
-                    "price_per_unit": product.price_per_unit,
+                    "price_per_unit": (price_point.price_per_unit if price_point
+                                       else product.price_per_unit),
                     "quantity": item.quantity,
                     "total_price": total_price,
                     "is_purchased": item.is_purchased
@@ -149,6 +273,14 @@ class ShoppingListController:
     def get_purchased_count(self, shopping_list_id: int) -> int:
         return self.repo.get_purchased_count_by_shopping_list_id(shopping_list_id)
 
+    @catch_errors
+    def get_item_counts(self) -> Dict[int, tuple]:
+        """
+        Maps every shopping list to (total items, purchased items). Lists
+        without items are left out.
+        """
+        return self.repo.get_item_counts()
+
     @catch_errors
     def add_shopping_list(self, title: str, items: List[dict]):
         shopping_list = ShoppingList(
@@ -173,10 +305,9 @@ class ShoppingListController:
         if title:
             shopping_list.title = title
         if items:
-            # Delete existing shopping list items.
-            self.repo.delete_shopping_list_item(shopping_list_id)
-            for item in items:
-                shopping_list_item = ShoppingListItem(
+            # The repository replaces the existing items with these.
+            shopping_list.items = [
+                ShoppingListItem(
                     id=0,
                     shopping_list_id=shopping_list_id,
                     product_id=item['product_id'],
@@ -187,19 +318,155 @@ class ShoppingListController:
                     created_at=None,
                     updated_at=None,
                 )
-                self.repo.add_shopping_list_items(
-                    shopping_list_id, shopping_list_item)
-        shopping_list.total_sum = self.calculate_total_cost(shopping_list_id)
-        self.repo.update_shopping_list(shopping_list_id, shopping_list)
+                for item in items
+            ]
+        shopping_list.total_sum = self.calculate_total_cost(
+            shopping_list_id, shopping_list.items)
+        with self.repo.db.transaction():
+            ticked, unticked = self.repo.update_shopping_list(shopping_list_id, shopping_list)
+            self._move_purchased(ticked, unticked)
         return shopping_list
 
+    @catch_errors
+    def plan_meals(self, entries: Iterable[MealPlanEntry], round_up: bool = True,
+                   use_pantry: bool = True) -> MealPlan:
+        """
+        Consolidates the ingredients of several recipes, less what is in the
+        pantry; see root_meal_plan.
+        """
+        return self.meal_planner.build(entries, round_up, use_pantry)
+
+    @catch_errors
+    def add_meal_plan(self, shopping_list_id: int, entries: Iterable[MealPlanEntry] = None,
+                      plan: MealPlan = None) -> MealPlan:
+        """
+        Adds the consolidated ingredients of a meal plan to a shopping list:
+        one upsert for the items and one update for the total, in a single
+        transaction. Pass either the entries or a plan built earlier.
+        """
+        if plan is None:
+            plan = self.meal_planner.build(entries or [])
+        if not plan.items:
+            return plan
+        with self.repo.db.transaction():
+            current = {item.product_id: (item.quantity, item.unit, bool(item.is_purchased))
+                       for item in self.repo.get_items_by_shopping_list_id(shopping_list_id)}
+            products = self.product_repo.get_products_by_ids(list(plan.items))
+            rows = self.meal_planner.merge_into(plan, current, products)
+            if rows:
+                self.repo.upsert_items(shopping_list_id, rows)
+                self.repo.update_total_sum(
+                    shopping_list_id, self.calculate_total_cost(shopping_list_id))
+        return plan
+
+    @catch_errors
+    def calculate_total_cost(self, shopping_list_id: int, items: List[ShoppingListItem] = None) -> float:
+        """
+        Returns the cost of the unpurchased items of a shopping list, priced
+        the same way as the shopping list detail view.
+
+        Parameters:
+            items (List[ShoppingListItem]): Items to price instead of the stored ones.
+        """
+        if items is None:
+            return round(pricing.list_totals([shopping_list_id])[shopping_list_id], 2)
+        items = [item for item in items if not item.is_purchased]
+        return round(sum(pricing.item_prices(items).values()), 2)
+
+    @catch_errors
+    def calculate_purchased_cost(self, shopping_list_id: int) -> float:
+        """
+        Returns what the purchased items of a shopping list cost, each
+        priced as it was when the item was marked purchased.
+        """
+        items = [item for item in self.repo.get_items_by_shopping_list_id(shopping_list_id)
+                 if item.is_purchased]
+        products = self.product_repo.get_products_by_ids(
+            [item.product_id for item in items])
+        purchase_prices = self.price_history.get_purchase_prices(shopping_list_id)
+        return round(sum(self._price_items(items, products, purchase_prices).values()), 2)
+
+    @staticmethod
+    def _price_items(items: List[ShoppingListItem], products: Dict[int, Product],
+                     purchase_prices: Dict[int, PricePoint]) -> Dict[int, float]:
+        """
+        Prices items like item_prices(), except that purchased items with a
+        recorded purchase price use it instead of the current price.
+        """
+        current = [item for item in items
+                   if not (item.is_purchased and item.id in purchase_prices)
+                   and item.product_id in products]
+        prices = pricing.item_prices(current)
+        for item in items:
+            price_point = purchase_prices.get(item.id) if item.is_purchased else None
+            if price_point is None or item.product_id not in products:
+                continue
+            then = replace(products[item.product_id], price_per_unit=price_point.price_per_unit,
+                           unit=price_point.unit)
+            prices.update(item_prices([item], {item.product_id: then}))
+        return prices
+
     @catch_errors
     def update_purchased_status(self, item_id: int, is_purchased: bool):
-        if is_purchased:
-            is_purchased = 1
-        else:
-            is_purchased = 0
-        self.repo.update_purchased_status(item_id, is_purchased)
+        with self.repo.db.transaction():
+            self._write_purchased_statuses({item_id: is_purchased})
+
+    @catch_errors
+    def set_purchased_statuses(self, shopping_list_id: int, statuses: Dict[int, bool],
+                               total_sum: float = None):
+        """
+        Writes the purchase status of several items, and the list's total
+        if given, in one transaction.
+        """
+        with self.repo.db.transaction():
+            if statuses:
+                self._write_purchased_statuses(statuses)
+            if total_sum is not None:
+                self.repo.update_total_sum(shopping_list_id, total_sum)
+
+    def _write_purchased_statuses(self, statuses: Dict[int, bool]):
+        """
+        Writes the statuses that differ from the stored ones and moves those
+        items with _move_purchased(). Call inside a transaction.
+        """
+        stored = self.repo.get_purchased_states(list(statuses))
+        changed = {item_id: bool(is_purchased) for item_id, is_purchased in statuses.items()
+                   if item_id in stored and stored[item_id] != bool(is_purchased)}
+        if not changed:
+            return
+        self.repo.update_purchased_statuses(changed)
+        self._move_purchased(
+            [item_id for item_id, is_purchased in changed.items() if is_purchased],
+            [item_id for item_id, is_purchased in changed.items() if not is_purchased])
+
+    def _move_purchased(self, ticked: List[int], unticked: List[int]):
+        """
+        Moves items that became purchased into the pantry, and items that
+        became unpurchased out of it with their purchase undone. Call inside
+        a transaction.
+        """
+        self.pantry.add_purchased(ticked)
+        self.pantry.remove_purchased(unticked)
+        self.repo.undo_purchases(unticked)
+
+    @catch_errors
+    def set_all_purchased(self, shopping_list_id: int, is_purchased: bool = True,
+                          item_ids: List[int] = None) -> List[int]:
+        """
+        Marks every item of a list, or only `item_ids`, purchased or
+        unpurchased with one UPDATE and updates the total in the same
+        transaction. Returns the ids of the items that changed.
+        """
+        with self.repo.db.transaction():
+            changed = self.repo.set_purchased_for_list(shopping_list_id, is_purchased, item_ids)
+            if changed:
+                if is_purchased:
+                    self._move_purchased(changed, [])
+                else:
+                    self._move_purchased([], changed)
+                self.repo.update_total_sum(
+                    shopping_list_id, self.calculate_total_cost(shopping_list_id))
+        return changed
 
     @catch_errors
     def delete_shopping_list_by_id(self, shoplist_id: int):
@@ -226,6 +493,7 @@ class ShoppingListController:
 class ProductController:
     def __init__(self):
         self.repo = ProductRepository()
+        self.price_history = PriceHistoryRepository()
 
     @catch_errors
     def get_all_products(self) -> Dict[int, Product]:
@@ -235,6 +503,14 @@ class ProductController:
     def get_product_by_id(self, product_id: int):
         return self.repo.get_product_by_id(product_id)
 
+    @catch_errors
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[int, Product]:
+        return self.repo.get_products_by_ids(product_ids)
+
+    @catch_errors
+    def get_products_by_name(self, name: str) -> List[Product]:
+        return self.repo.get_products_by_name(name)
+
     @catch_errors
     def get_all_categories(self) -> List[str]:
         return self.repo.get_all_categories()
@@ -244,7 +520,8 @@ class ProductController:
         return self.repo.get_products_by_shoplist_id(shopping_list_id)
 
     @catch_errors
-    def add_product(self, name: str, unit: str, price_per_unit: float, category: str):
+    def add_product(self, name: str, unit: str, price_per_unit: float, category: str,
+                    density: float = None, piece_weight: float = None):
         product = Product(
             id=0,
             name=name,
@@ -252,12 +529,15 @@ class ProductController:
             price_per_unit=price_per_unit,
             category=category,
             created_at=None,
-            updated_at=None
+            updated_at=None,
+            density=density,
+            piece_weight=piece_weight
         )
         return self.repo.add_product(product)
 
     @catch_errors
-    def update_product(self, product_id: int, name: str = None, price_per_unit: float = None, category: str = None, unit: str = None):
+    def update_product(self, product_id: int, name: str = None, price_per_unit: float = None, category: str = None, unit: str = None,
+                       density: float = None, piece_weight: float = None):
         product = self.repo.get_product_by_id(product_id)
         if not product:
             raise ValueError("Product not found")
@@ -269,13 +549,108 @@ class ProductController:
             product.category = category
         if unit:
             product.unit = unit
+        if density:
+            product.density = density
+        if piece_weight:
+            product.piece_weight = piece_weight
         self.repo.update_product(product_id, product)
         return product
 
+    @catch_errors
+    def get_price_history(self, product_id: int) -> List[PricePoint]:
+        return self.price_history.get_price_history(product_id)
+
+    @catch_errors
+    def get_price_at(self, product_id: int, when) -> PricePoint:
+        """Returns the price in effect at `when` (a UTC datetime or timestamp)."""
+        return self.price_history.get_price_at(product_id, when)
+
+    @catch_errors
+    def get_prices_at(self, product_ids: List[int], when) -> Dict[int, PricePoint]:
+        return self.price_history.get_prices_at(product_ids, when)
+
+    @catch_errors
+    def compact_price_history(self, min_duration_s: float = 0.0) -> int:
+        """Removes redundant price history rows, see PriceHistoryRepository.compact."""
+        return self.price_history.compact(min_duration_s)
+
     @catch_errors
     def delete_product(self, product_id: int):
         self.repo.delete_product(product_id)
 
+    @catch_errors
+    def import_catalog(self, path: str, fmt: str = None, progress=None) -> CatalogImportReport:
+        """Imports a CSV or NDJSON product catalog, see root_catalog_import."""
+        return ProductCatalogImporter().import_file(path, fmt, progress)
+
+
+class PantryController:
+    def __init__(self):
+        self.pantry = Pantry()
+
+    @catch_errors
+    def get_pantry_items(self) -> Dict[int, PantryItem]:
+        return self.pantry.get_items()
+
+    @catch_errors
+    def get_stock(self, product_ids: Iterable[int]) -> Dict[int, Tuple[float, str]]:
+        return self.pantry.get_stock(product_ids)
+
+    @catch_errors
+    def get_expiring(self, days: int = 3) -> List[PantryItem]:
+        """Returns the items whose best-before date is within `days` days or past."""
+        before = (datetime.now() + timedelta(days=days + 1)).strftime("%Y-%m-%d")
+        return self.pantry.get_expiring(before)
+
+    @catch_errors
+    def add_to_pantry(self, product_id: int, quantity: float, unit: str, expires_at: str = None):
+        if quantity <= 0:
+            raise ValueError("Määrän on oltava positiivinen.")
+        self.pantry.add_item(product_id, quantity, unit, expires_at)
+
+    @catch_errors
+    def set_pantry_item(self, product_id: int, quantity: float, unit: str, expires_at: str = None):
+        self.pantry.set_item(product_id, quantity, unit, expires_at)
+
+    @catch_errors
+    def remove_from_pantry(self, product_id: int):
+        self.pantry.remove_item(product_id)
+
+    @catch_errors
+    def cook_recipe(self, recipe_id: int, servings: int = None) -> int:
+        """
+        Removes the ingredients of a cooked recipe, scaled to `servings`,
+        from the pantry. Returns the number of products reduced.
+        """
+        return self.pantry.cook(recipe_id, servings)
+
+
+class AnalyticsController:
+    def __init__(self):
+        self.analytics = SpendingAnalytics()
+
+    @catch_errors
+    def refresh(self) -> int:
+        return self.analytics.refresh()
+
+    @catch_errors
+    def get_spend_by_period(self, period: str = "month", since: str = None,
+                            limit: int = None) -> List[SpendRow]:
+        return self.analytics.spend_by_period(period, since, limit)
+
+    @catch_errors
+    def get_spend_by_category(self, since: str = None) -> List[SpendRow]:
+        return self.analytics.spend_by_category(since)
+
+    @catch_errors
+    def get_top_products(self, n: int = 10, since: str = None) -> List[ProductSpend]:
+        return self.analytics.top_products(n, since)
+
+    @catch_errors
+    def get_purchase_frequency(self, since: str = None,
+                               limit: int = None) -> List[PurchaseFrequency]:
+        return self.analytics.purchase_frequency(since, limit)
+
 
 class ErrorController:
     def __init__(self):
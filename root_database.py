@@ -1,9 +1,368 @@
 # File: root_database.py --------------------------------------------------------------------
 
 import sqlite3
-from typing import List
+import time
+from contextlib import contextmanager
+from typing import Iterable, List
 import os
 from error_handler import catch_errors
+import root_profiling as profiling
+from root_tracing import tracer
+
+# Default SQLITE_MAX_VARIABLE_NUMBER for SQLite builds older than 3.32,
+# which is the lowest limit we can meet on Android.
+SQLITE_MAX_VARIABLES = 999
+
+# Rows pulled from a cursor per fetchmany() call by the streaming APIs.
+FETCH_BATCH_SIZE = 500
+
+
+def chunked(values: Iterable, size: int):
+    """Yields consecutive lists of at most `size` items from `values`."""
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Schema migrations applied by migrate(), in order. PRAGMA user_version holds
+# the number of the last one applied: append new steps, never edit old ones.
+MIGRATIONS = [
+    ("indexes for hot shopping list, recipe and error log queries", """
+    -- Per-list purchased/total counts read only this index.
+    CREATE INDEX IF NOT EXISTS idx_shopping_list_items_list_purchased
+        ON shopping_list_items(shopping_list_id, is_purchased);
+    -- Covers the unpurchased items of a list for the cost calculation.
+    -- is_purchased is repeated as a column: older SQLite only treats a
+    -- partial index as covering if it holds every column the query reads.
+    CREATE INDEX IF NOT EXISTS idx_shopping_list_items_unpurchased
+        ON shopping_list_items(shopping_list_id, product_id, quantity, unit, is_purchased)
+        WHERE is_purchased = 0;
+    CREATE INDEX IF NOT EXISTS idx_products_name_nocase ON products(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_recipes_name_nocase ON recipes(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_error_logs_error_time ON error_logs(error_time);
+    """),
+    ("materialized recipe costs with invalidation triggers", """
+    CREATE TABLE IF NOT EXISTS recipe_costs (
+        recipe_id INTEGER PRIMARY KEY,
+        total_cost REAL NOT NULL,
+        unpriced_count INTEGER NOT NULL DEFAULT 0,
+        computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+    );
+
+    -- A price change drops the cost of the recipes using the product only
+    -- (idx_recipe_ingredients_product_id).
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_product_update
+    AFTER UPDATE OF price_per_unit, unit ON products
+    FOR EACH ROW
+    WHEN NEW.price_per_unit IS NOT OLD.price_per_unit OR NEW.unit IS NOT OLD.unit
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id IN (
+            SELECT recipe_id FROM recipe_ingredients WHERE product_id = NEW.id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_product_delete
+    AFTER DELETE ON products
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id IN (
+            SELECT recipe_id FROM recipe_ingredients WHERE product_id = OLD.id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_ingredient_insert
+    AFTER INSERT ON recipe_ingredients
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id = NEW.recipe_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_ingredient_update
+    AFTER UPDATE OF recipe_id, product_id, quantity, unit ON recipe_ingredients
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_ingredient_delete
+    AFTER DELETE ON recipe_ingredients
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id = OLD.recipe_id;
+    END;
+
+    -- The app connection does not enable foreign keys, so no cascade.
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_costs_recipe_delete
+    AFTER DELETE ON recipes
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id = OLD.id;
+    END;
+    """),
+    ("product density and piece weight for unit conversion", """
+    ALTER TABLE products ADD COLUMN density REAL;       -- kg/l
+    ALTER TABLE products ADD COLUMN piece_weight REAL;  -- kg/kpl
+
+    -- Both take part in pricing ingredients, so they invalidate costs too.
+    DROP TRIGGER IF EXISTS trg_recipe_costs_product_update;
+    CREATE TRIGGER trg_recipe_costs_product_update
+    AFTER UPDATE OF price_per_unit, unit, density, piece_weight ON products
+    FOR EACH ROW
+    WHEN NEW.price_per_unit IS NOT OLD.price_per_unit OR NEW.unit IS NOT OLD.unit
+        OR NEW.density IS NOT OLD.density OR NEW.piece_weight IS NOT OLD.piece_weight
+    BEGIN
+        DELETE FROM recipe_costs WHERE recipe_id IN (
+            SELECT recipe_id FROM recipe_ingredients WHERE product_id = NEW.id);
+    END;
+    """),
+    ("recipe servings", """
+    -- Existing recipes get root_models.DEFAULT_SERVINGS.
+    ALTER TABLE recipes ADD COLUMN servings INTEGER NOT NULL DEFAULT 4;
+    """),
+    ("append-only product price history", """
+    -- One row per price a product has had; valid_to is NULL for the
+    -- current one. Millisecond timestamps keep quick edits ordered.
+    CREATE TABLE IF NOT EXISTS product_prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL,
+        price_per_unit REAL,
+        unit TEXT NOT NULL,
+        valid_from TEXT NOT NULL,
+        valid_to TEXT
+    );
+    -- Point-in-time lookups: the last row with valid_from <= t.
+    CREATE INDEX IF NOT EXISTS idx_product_prices_product_valid_from
+        ON product_prices(product_id, valid_from);
+
+    INSERT INTO product_prices (product_id, price_per_unit, unit, valid_from)
+    SELECT id, price_per_unit, unit, COALESCE(created_at, CURRENT_TIMESTAMP) FROM products;
+
+    CREATE TRIGGER IF NOT EXISTS trg_product_prices_insert
+    AFTER INSERT ON products
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO product_prices (product_id, price_per_unit, unit, valid_from)
+        VALUES (NEW.id, NEW.price_per_unit, NEW.unit,
+                strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_product_prices_update
+    AFTER UPDATE OF price_per_unit, unit ON products
+    FOR EACH ROW
+    WHEN NEW.price_per_unit IS NOT OLD.price_per_unit OR NEW.unit IS NOT OLD.unit
+    BEGIN
+        UPDATE product_prices SET valid_to = strftime('%Y-%m-%d %H:%M:%f', 'now')
+        WHERE product_id = NEW.id AND valid_to IS NULL;
+        INSERT INTO product_prices (product_id, price_per_unit, unit, valid_from)
+        VALUES (NEW.id, NEW.price_per_unit, NEW.unit,
+                strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END;
+
+    -- History outlives the product; only the open range is closed.
+    CREATE TRIGGER IF NOT EXISTS trg_product_prices_delete
+    AFTER DELETE ON products
+    FOR EACH ROW
+    BEGIN
+        UPDATE product_prices SET valid_to = strftime('%Y-%m-%d %H:%M:%f', 'now')
+        WHERE product_id = OLD.id AND valid_to IS NULL;
+    END;
+    """),
+    ("purchase log and daily spend rollup", """
+    -- One row per purchase event with the price and unit data it was made
+    -- at. Undoing a purchase appends a copy of it with sign -1, so the log
+    -- is append-only and rollups only ever read the rows after their mark.
+    CREATE TABLE IF NOT EXISTS purchase_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        shopping_list_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        category TEXT NOT NULL DEFAULT '',
+        quantity REAL NOT NULL,
+        unit TEXT NOT NULL,
+        price_per_unit REAL,
+        price_unit TEXT,
+        density REAL,
+        piece_weight REAL,
+        sign INTEGER NOT NULL DEFAULT 1,
+        purchased_at TEXT NOT NULL
+    );
+    -- Standing purchases of a product on a list: SUM(sign) over these rows.
+    CREATE INDEX IF NOT EXISTS idx_purchase_log_list_product
+        ON purchase_log(shopping_list_id, product_id, sign);
+
+    -- Spend per local day and product, maintained by root_analytics.
+    CREATE TABLE IF NOT EXISTS spend_daily (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        category TEXT NOT NULL DEFAULT '',
+        amount REAL NOT NULL DEFAULT 0,
+        purchases INTEGER NOT NULL DEFAULT 0,
+        unpriced INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_id, category)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_spend_daily_product ON spend_daily(product_id, day);
+
+    -- Last purchase_log id folded into the rollups.
+    CREATE TABLE IF NOT EXISTS analytics_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO analytics_state (name, value) VALUES ('purchase_log', 0);
+
+    -- Items already purchased count from their last update.
+    INSERT INTO purchase_log (item_id, shopping_list_id, product_id, category, quantity, unit,
+                              price_per_unit, price_unit, density, piece_weight, purchased_at)
+    SELECT i.id, i.shopping_list_id, i.product_id, COALESCE(p.category, ''), i.quantity, i.unit,
+           p.price_per_unit, p.unit, p.density, p.piece_weight,
+           COALESCE(i.updated_at, CURRENT_TIMESTAMP)
+    FROM shopping_list_items i
+    LEFT JOIN products p ON p.id = i.product_id
+    WHERE i.is_purchased = 1;
+
+    CREATE TRIGGER IF NOT EXISTS trg_purchase_log_purchased
+    AFTER UPDATE OF is_purchased ON shopping_list_items
+    FOR EACH ROW
+    WHEN NEW.is_purchased = 1 AND OLD.is_purchased = 0
+    BEGIN
+        INSERT INTO purchase_log (item_id, shopping_list_id, product_id, category, quantity, unit,
+                                  price_per_unit, price_unit, density, piece_weight, purchased_at)
+        SELECT NEW.id, NEW.shopping_list_id, NEW.product_id, COALESCE(p.category, ''),
+               NEW.quantity, NEW.unit, p.price_per_unit, p.unit, p.density, p.piece_weight,
+               strftime('%Y-%m-%d %H:%M:%f', 'now')
+        FROM (SELECT 1) LEFT JOIN products p ON p.id = NEW.product_id;
+    END;
+
+    -- An item inserted as purchased is logged only if the list has no
+    -- standing purchase of the product, so an item that is deleted and
+    -- inserted again is not counted twice.
+    CREATE TRIGGER IF NOT EXISTS trg_purchase_log_insert_purchased
+    AFTER INSERT ON shopping_list_items
+    FOR EACH ROW
+    WHEN NEW.is_purchased = 1
+        AND COALESCE((SELECT SUM(sign) FROM purchase_log
+                      WHERE shopping_list_id = NEW.shopping_list_id
+                        AND product_id = NEW.product_id), 0) <= 0
+    BEGIN
+        INSERT INTO purchase_log (item_id, shopping_list_id, product_id, category, quantity, unit,
+                                  price_per_unit, price_unit, density, piece_weight, purchased_at)
+        SELECT NEW.id, NEW.shopping_list_id, NEW.product_id, COALESCE(p.category, ''),
+               NEW.quantity, NEW.unit, p.price_per_unit, p.unit, p.density, p.piece_weight,
+               strftime('%Y-%m-%d %H:%M:%f', 'now')
+        FROM (SELECT 1) LEFT JOIN products p ON p.id = NEW.product_id;
+    END;
+
+    -- Unticking is not a trigger: an item also becomes unpurchased when a
+    -- meal plan adds it again, and that purchase stands. The untick paths
+    -- append the reversal with ShoppingListRepository.undo_purchases().
+    """),
+    ("pantry inventory", """
+    -- What is at home: one row per product, maintained by root_pantry.
+    CREATE TABLE IF NOT EXISTS pantry_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL UNIQUE,
+        quantity REAL NOT NULL,
+        unit TEXT NOT NULL,
+        expires_at TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_pantry_items_expires_at
+        ON pantry_items(expires_at) WHERE expires_at IS NOT NULL;
+
+    CREATE TRIGGER IF NOT EXISTS trg_pantry_items_product_delete
+    AFTER DELETE ON products
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM pantry_items WHERE product_id = OLD.id;
+    END;
+    """),
+    ("minhash signatures and lsh buckets for similar recipes", """
+    -- One row per recipe, maintained by root_recipe_similarity. A NULL
+    -- signature is stale and is recomputed, with its buckets, on next use.
+    CREATE TABLE IF NOT EXISTS recipe_signatures (
+        recipe_id INTEGER PRIMARY KEY,
+        signature BLOB
+    );
+    CREATE INDEX IF NOT EXISTS idx_recipe_signatures_stale
+        ON recipe_signatures(recipe_id) WHERE signature IS NULL;
+    CREATE TABLE IF NOT EXISTS recipe_lsh_buckets (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        recipe_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, recipe_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_recipe_lsh_buckets_recipe ON recipe_lsh_buckets(recipe_id);
+
+    INSERT OR IGNORE INTO recipe_signatures (recipe_id) SELECT id FROM recipes;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_signatures_recipe_insert
+    AFTER INSERT ON recipes
+    FOR EACH ROW
+    BEGIN
+        INSERT OR IGNORE INTO recipe_signatures (recipe_id) VALUES (NEW.id);
+    END;
+
+    -- Only the set of products matters, so quantity and unit edits keep
+    -- the signature.
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_signatures_ingredient_insert
+    AFTER INSERT ON recipe_ingredients
+    FOR EACH ROW
+    BEGIN
+        UPDATE recipe_signatures SET signature = NULL
+        WHERE recipe_id = NEW.recipe_id AND signature IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_signatures_ingredient_update
+    AFTER UPDATE OF recipe_id, product_id ON recipe_ingredients
+    FOR EACH ROW
+    WHEN NEW.recipe_id IS NOT OLD.recipe_id OR NEW.product_id IS NOT OLD.product_id
+    BEGIN
+        UPDATE recipe_signatures SET signature = NULL
+        WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id) AND signature IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_signatures_ingredient_delete
+    AFTER DELETE ON recipe_ingredients
+    FOR EACH ROW
+    BEGIN
+        UPDATE recipe_signatures SET signature = NULL
+        WHERE recipe_id = OLD.recipe_id AND signature IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_recipe_signatures_recipe_delete
+    AFTER DELETE ON recipes
+    FOR EACH ROW
+    BEGIN
+        DELETE FROM recipe_signatures WHERE recipe_id = OLD.id;
+        DELETE FROM recipe_lsh_buckets WHERE recipe_id = OLD.id;
+    END;
+    """),
+]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """
+    Applies the pending MIGRATIONS to the database, each in its own
+    transaction, and returns the resulting schema version.
+    """
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    for number, (description, script) in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        try:
+            connection.executescript(
+                f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+        print(f"Migration {number} applied: {description}")
+        version = number
+    return version
 
 
 class DatabaseManager:
@@ -20,6 +379,8 @@ class DatabaseManager:
                 DatabaseManager.create_database(db_path)
             self.connection = sqlite3.connect(db_path)
             self.connection.row_factory = sqlite3.Row
+            migrate(self.connection)
+            self._transaction_depth = 0
             DatabaseManager._instance = self
 
     @staticmethod
@@ -29,34 +390,159 @@ class DatabaseManager:
             DatabaseManager()
         return DatabaseManager._instance
 
-    @catch_errors
-    def execute_query(self, query, params=()):
+    @staticmethod
+    def reset_instance():
+        """Closes the current connection so another database can be opened (tests, benchmarks)."""
+        if DatabaseManager._instance is not None:
+            DatabaseManager._instance.connection.close()
+            DatabaseManager._instance = None
+
+    def _execute(self, query, params=()):
         cursor = self.connection.cursor()
         cursor.execute(query, params)
-        self.connection.commit()
+        profiling.count_statement()
+        # Inside transaction() the outermost block commits.
+        if not self._transaction_depth:
+            self.connection.commit()
+        return cursor
+
+    @catch_errors
+    def execute_query(self, query, params=()):
+        if not tracer.enabled:
+            return self._execute(query, params)
+        start = time.perf_counter()
+        cursor = self._execute(query, params)
+        tracer.record(query, time.perf_counter() - start, max(cursor.rowcount, 0))
         return cursor
 
+    @contextmanager
+    def transaction(self):
+        """
+        Groups statements into a single transaction and yields a cursor.
+
+        While the block is open, execute_query() and executemany() skip their
+        own commits, so repository methods can be combined freely. Blocks may
+        be nested; only the outermost one commits, or rolls back on error.
+        A nested block runs inside a savepoint, so when it fails only its own
+        writes are undone, even if the caller catches the error and the
+        outer block goes on to commit.
+        """
+        depth = self._transaction_depth
+        savepoint = f"sp_{depth}"
+        if depth:
+            if not self.connection.in_transaction:
+                # A savepoint opened outside a transaction would commit
+                # everything when it is released.
+                self.connection.execute("BEGIN")
+            self.connection.execute(f"SAVEPOINT {savepoint}")
+        self._transaction_depth += 1
+        try:
+            yield self.connection.cursor()
+        except BaseException:
+            self._transaction_depth -= 1
+            if depth:
+                self.connection.execute(f"ROLLBACK TO {savepoint}")
+                self.connection.execute(f"RELEASE {savepoint}")
+            else:
+                self.connection.rollback()
+            raise
+        self._transaction_depth -= 1
+        if depth:
+            self.connection.execute(f"RELEASE {savepoint}")
+        else:
+            self.connection.commit()
+
     @catch_errors
     def fetchall(self, query, params=()):
-        cursor = self.execute_query(query, params)
-        return cursor.fetchall()
+        if not tracer.enabled:
+            return self._execute(query, params).fetchall()
+        start = time.perf_counter()
+        rows = self._execute(query, params).fetchall()
+        tracer.record(query, time.perf_counter() - start, len(rows))
+        return rows
 
     @catch_errors
     def fetchone(self, query, params=()):
-        cursor = self.execute_query(query, params)
-        return cursor.fetchone()
+        if not tracer.enabled:
+            return self._execute(query, params).fetchone()
+        start = time.perf_counter()
+        row = self._execute(query, params).fetchone()
+        tracer.record(query, time.perf_counter() - start, 1 if row is not None else 0)
+        return row
+
+    @catch_errors
+    def iter_batches(self, query, params=(), batch_size: int = FETCH_BATCH_SIZE):
+        """
+        Streams the result of `query` as lists of at most `batch_size` rows.
+        Uses its own cursor, so other queries may run between batches.
+        """
+        cursor = self.connection.cursor()
+        traced = tracer.enabled
+        elapsed = 0.0
+        row_count = 0
+        try:
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            profiling.count_statement()
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if traced:
+                    elapsed += time.perf_counter() - start
+                    row_count += len(rows)
+                if not rows:
+                    break
+                yield rows
+                start = time.perf_counter()
+        finally:
+            cursor.close()
+            if traced:
+                tracer.record(query, elapsed, row_count)
+
+    @catch_errors
+    def iter_query(self, query, params=(), batch_size: int = FETCH_BATCH_SIZE):
+        """Streams the result of `query` row by row without materialising it."""
+        for rows in self.iter_batches(query, params, batch_size):
+            yield from rows
+
+    @catch_errors
+    def fetchall_in(self, query: str, values: Iterable, params: tuple = (),
+                    chunk_size: int = SQLITE_MAX_VARIABLES):
+        """
+        Runs `query` once per chunk of `values` and returns all rows.
+
+        The query must contain a `{placeholders}` marker inside its IN clause,
+        e.g. "SELECT * FROM products WHERE id IN ({placeholders})". `params`
+        are bound before the chunk values, so they count towards the limit.
+        """
+        rows = []
+        for chunk in chunked(values, chunk_size - len(params)):
+            placeholders = ", ".join("?" * len(chunk))
+            rows.extend(self.fetchall(
+                query.format(placeholders=placeholders), (*params, *chunk)))
+        return rows
+
+    @catch_errors
+    def get_data_version(self) -> int:
+        """
+        Returns PRAGMA data_version. The value changes only when another
+        connection commits to the database file, so it can be used to
+        detect external writers cheaply.
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
 
     @catch_errors
     def executemany(self, query: str, params: List[tuple]):
-        with self.connection as conn:
-            cursor = conn.cursor()
+        start = time.perf_counter()
+        with self.transaction() as cursor:
             cursor.executemany(query, params)
-            conn.commit()
+        profiling.count_statement()
+        if tracer.enabled:
+            tracer.record(query, time.perf_counter() - start, max(cursor.rowcount, 0))
         return cursor
 
     @staticmethod
     @catch_errors
-    def create_database(db_path):
+    def create_database(db_path, with_sample_data: bool = True):
         # Ensure that the database directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
@@ -239,9 +725,11 @@ class DatabaseManager:
         ('Vesi', 'l', 0.00, 'Juomat');
         """
 
-        cursor.execute(insert_products)
+        if with_sample_data:
+            cursor.execute(insert_products)
 
         conn.commit()
+        migrate(conn)
         conn.close()
 
         if not db_exists:
@@ -0,0 +1,207 @@
+# File: root_meal_plan.py --------------------------------------------------------------------
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from root_database import DatabaseManager
+from root_repositories import ProductRepository
+from root_pantry import EMPTY_QUANTITY, Pantry, take_from_stock
+from root_units import engine, round_to_purchasable
+from error_handler import catch_errors
+
+
+@dataclass
+class MealPlanEntry:
+    recipe_id: int
+    # How many times the recipe's quantities are needed, e.g. 2.0 for a
+    # doubled recipe. The same recipe may appear in several entries.
+    multiplier: float = 1.0
+    # Servings to cook; scales the recipe from its own servings. Applied
+    # on top of the multiplier.
+    servings: Optional[int] = None
+
+
+@dataclass
+class PlannedItem:
+    product_id: int
+    quantity: float
+    unit: str
+
+
+@dataclass
+class MealPlan:
+    items: Dict[int, PlannedItem] = field(default_factory=OrderedDict)
+    # (product_id, quantity, unit) lines that could not be converted to the
+    # unit already chosen for the product; they are left out of `items`.
+    unconverted: List[Tuple[int, float, str]] = field(default_factory=list)
+    recipes: int = 0
+    # Quantities covered by the pantry by product id, in the item's unit.
+    # Products covered in full are not in `items`.
+    from_pantry: Dict[int, float] = field(default_factory=dict)
+
+    def as_dicts(self) -> List[dict]:
+        """The items in the format of ShoppingListController.update_shopping_list."""
+        return [{"product_id": item.product_id, "quantity": item.quantity, "unit": item.unit}
+                for item in self.items.values()]
+
+
+def consolidate(lines: Iterable[Tuple[int, float, str]], products: Dict,
+                items: Dict[int, PlannedItem] = None, normalize: bool = True,
+                unconverted: List[Tuple[int, float, str]] = None) -> Dict[int, PlannedItem]:
+    """
+    Sums (product_id, quantity, unit) lines per product.
+
+    A product's first line decides its unit: with `normalize` the product's
+    price unit when the line converts to it, otherwise the line's own unit.
+    Later lines are converted to that unit with the product's density and
+    piece weight. Lines that cannot be converted go to `unconverted`.
+
+    Parameters:
+        products (Dict[int, Product]): Products by id. Lines of unknown
+            products keep their unit and only merge with the same unit.
+        items (Dict[int, PlannedItem]): Items to add to, e.g. the products
+            already selected. Updated in place.
+    """
+    items = items if items is not None else OrderedDict()
+    for product_id, quantity, unit in lines:
+        product = products.get(product_id)
+        density = product.density if product else None
+        piece_weight = product.piece_weight if product else None
+        item = items.get(product_id)
+        if item is None:
+            if normalize and product is not None:
+                converted = engine.convert(quantity, unit, product.unit, density, piece_weight)
+                if converted is not None:
+                    quantity, unit = converted, product.unit
+            items[product_id] = PlannedItem(product_id, quantity, unit)
+            continue
+        converted = engine.convert(quantity, unit, item.unit, density, piece_weight)
+        if converted is None and unit == item.unit:
+            converted = quantity
+        if converted is None:
+            if unconverted is not None:
+                unconverted.append((product_id, quantity, unit))
+            continue
+        item.quantity += converted
+    return items
+
+
+class MealPlanner:
+    """
+    Turns a set of recipes into one consolidated shopping list.
+
+    The ingredients of every planned recipe are read with one query, their
+    products and their pantry stock with one more each, so planning a week
+    of meals costs the same handful of statements as planning one.
+    """
+
+    _INGREDIENTS_QUERY = """
+    SELECT ri.recipe_id, ri.product_id, ri.quantity, ri.unit, r.servings
+    FROM recipe_ingredients ri
+    JOIN recipes r ON r.id = ri.recipe_id
+    WHERE ri.recipe_id IN ({placeholders})
+    ORDER BY ri.recipe_id, ri.id
+    """
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+        self.product_repo = ProductRepository()
+        self.pantry = Pantry()
+
+    @catch_errors
+    def build(self, entries: Iterable[MealPlanEntry], round_up: bool = True,
+              use_pantry: bool = True) -> MealPlan:
+        """
+        Consolidates the ingredients of the planned recipes.
+
+        Parameters:
+            round_up (bool): Round the summed quantities up to purchasable
+                amounts (root_units.PURCHASE_STEPS).
+            use_pantry (bool): Leave out what is already at home.
+        """
+        # Per recipe: the summed multipliers of entries without servings and
+        # the summed servings of the others, resolved once the recipe's own
+        # servings are known.
+        multipliers: Dict[int, float] = OrderedDict()
+        servings: Dict[int, float] = {}
+        for entry in entries:
+            multipliers.setdefault(entry.recipe_id, 0.0)
+            if entry.servings:
+                servings[entry.recipe_id] = (servings.get(entry.recipe_id, 0.0)
+                                             + entry.servings * entry.multiplier)
+            else:
+                multipliers[entry.recipe_id] += entry.multiplier
+        plan = MealPlan()
+        if not multipliers:
+            return plan
+
+        rows = self.db.fetchall_in(self._INGREDIENTS_QUERY, list(multipliers))
+        plan.recipes = len({row['recipe_id'] for row in rows})
+        products = self.product_repo.get_products_by_ids(
+            list(dict.fromkeys(row['product_id'] for row in rows)))
+
+        def factor(row) -> float:
+            extra = servings.get(row['recipe_id'])
+            if extra and row['servings']:
+                return multipliers[row['recipe_id']] + extra / row['servings']
+            return multipliers[row['recipe_id']]
+
+        consolidate(
+            ((row['product_id'], row['quantity'] * factor(row), row['unit']) for row in rows),
+            products, plan.items, unconverted=plan.unconverted)
+        if use_pantry:
+            self._subtract_pantry(plan, products)
+        for item in plan.items.values():
+            item.quantity = (round_to_purchasable(item.quantity, item.unit) if round_up
+                             else round(item.quantity, 3))
+        return plan
+
+    def _subtract_pantry(self, plan: MealPlan, products: Dict):
+        stock = self.pantry.get_stock(plan.items)
+        for product_id, item in list(plan.items.items()):
+            taken = take_from_stock(stock, product_id, item.quantity, item.unit,
+                                    products.get(product_id))
+            if not taken:
+                continue
+            plan.from_pantry[product_id] = round(taken, 3)
+            item.quantity -= taken
+            if item.quantity <= EMPTY_QUANTITY:
+                del plan.items[product_id]
+
+    @staticmethod
+    def merge_into(plan: MealPlan, current: Dict[int, Tuple[float, str, bool]],
+                   products: Dict) -> List[Tuple[int, float, str]]:
+        """
+        Combines a plan with the items already on a shopping list.
+
+        Parameters:
+            current (Dict[int, Tuple[float, str, bool]]): (quantity, unit,
+                is_purchased) of the list's items by product id.
+
+        Returns:
+            (product_id, quantity, unit) rows to upsert. Unpurchased items
+            grow by the planned amount; purchased ones are bought again, so
+            they take the planned amount. A planned amount that cannot be
+            converted to an unpurchased item's unit is reported in
+            plan.unconverted and leaves the item as it is.
+        """
+        rows = []
+        for item in plan.items.values():
+            existing = current.get(item.product_id)
+            if existing is None or existing[2]:
+                rows.append((item.product_id, item.quantity, item.unit))
+                continue
+            quantity, unit, _ = existing
+            product = products.get(item.product_id)
+            converted = engine.convert(item.quantity, item.unit, unit,
+                                       product.density if product else None,
+                                       product.piece_weight if product else None)
+            if converted is None and item.unit == unit:
+                converted = item.quantity
+            if converted is None:
+                plan.unconverted.append((item.product_id, item.quantity, item.unit))
+                continue
+            rows.append((item.product_id, round(quantity + converted, 3), unit))
+        return rows
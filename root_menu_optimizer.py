@@ -0,0 +1,351 @@
+# File: root_menu_optimizer.py --------------------------------------------------------------------
+
+import heapq
+import math
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from root_cache import get_entity_cache
+from root_database import DatabaseManager
+from root_meal_plan import MealPlanEntry
+from root_pantry import Pantry
+from root_units import engine, PURCHASE_STEPS
+from error_handler import catch_errors
+
+# Seconds optimize() may spend on local search after the greedy start.
+TIME_BUDGET = 0.15
+# Score lost per euro over the budget; large enough that any plan within
+# the budget beats one over it.
+OVER_BUDGET_PENALTY = 100.0
+# Best-scoring and cheapest recipes the local search swaps in, each.
+SHORTLIST = 150
+
+
+@dataclass
+class MenuPlan:
+    recipe_ids: List[int] = field(default_factory=list)
+    # Cost of the consolidated shopping list: shared products are bought
+    # once, rounded up to purchasable amounts, less the pantry.
+    cost: float = 0.0
+    # Cost of buying every recipe's ingredients separately.
+    separate_cost: float = 0.0
+    # Distinct recipe tags in the plan.
+    variety: int = 0
+    # Pantry products the plan uses.
+    pantry_products: int = 0
+    score: float = 0.0
+    budget: float = 0.0
+    # Swaps tried by the local search.
+    iterations: int = 0
+
+    @property
+    def within_budget(self) -> bool:
+        return self.cost <= self.budget + 1e-9
+
+    @property
+    def savings(self) -> float:
+        return round(self.separate_cost - self.cost, 2)
+
+    def entries(self) -> List[MealPlanEntry]:
+        """The plan as input for ShoppingListController.plan_meals()."""
+        return [MealPlanEntry(recipe_id) for recipe_id in self.recipe_ids]
+
+
+def _split_tags(tags: Optional[str]) -> frozenset:
+    return frozenset(tag.strip() for tag in (tags or "").split(',') if tag.strip())
+
+
+class _PlanState:
+    """
+    Running totals of a plan: the summed amount of each product and the
+    tag counts. Adding, removing or pricing a recipe touches only the
+    recipe's own products.
+    """
+
+    def __init__(self, optimizer: 'MenuOptimizer', pantry: Dict[int, float],
+                 variety_weight: float, pantry_weight: float, cost_weight: float, budget: float):
+        self.optimizer = optimizer
+        self.pantry = pantry
+        self.variety_weight = variety_weight
+        self.pantry_weight = pantry_weight
+        self.cost_weight = cost_weight
+        self.budget = budget
+        self.totals: Dict[int, float] = {}
+        self.tags = Counter()
+        self.recipe_ids: List[int] = []
+        self.cost = 0.0
+        self.pantry_products = 0
+
+    def _product_cost(self, product_id: int, amount: float) -> float:
+        amount -= self.pantry.get(product_id, 0.0)
+        if amount <= 1e-9:
+            return 0.0
+        price, step = self.optimizer.prices[product_id]
+        if step:
+            amount = math.ceil(amount / step - 1e-9) * step
+        return amount * price
+
+    def _change(self, recipe_id: int, sign: int) -> Tuple[float, int, int]:
+        """(cost, pantry products, tags) added by adding (1) or removing (-1) a recipe."""
+        products, amounts = self.optimizer.lines[recipe_id]
+        cost = 0.0
+        pantry_products = 0
+        for product_id, amount in zip(products, amounts):
+            current = self.totals.get(product_id, 0.0)
+            updated = current + sign * amount
+            cost += self._product_cost(product_id, updated) - self._product_cost(product_id, current)
+            if product_id in self.pantry and (current <= 1e-9) != (updated <= 1e-9):
+                pantry_products += sign
+        tags = sum(1 for tag in self.optimizer.tags[recipe_id]
+                   if self.tags[tag] == (0 if sign > 0 else 1))
+        return cost, pantry_products, sign * tags
+
+    def score(self, cost: float = None, pantry_products: int = None, variety: int = None) -> float:
+        cost = self.cost if cost is None else cost
+        pantry_products = self.pantry_products if pantry_products is None else pantry_products
+        variety = len(self.tags) if variety is None else variety
+        return (self.variety_weight * variety + self.pantry_weight * pantry_products
+                - self.cost_weight * cost - OVER_BUDGET_PENALTY * max(cost - self.budget, 0.0))
+
+    def gain(self, recipe_id: int) -> Tuple[float, float]:
+        """(score gain, cost increase) of adding a recipe."""
+        cost, pantry_products, tags = self._change(recipe_id, 1)
+        return (self.score(self.cost + cost, self.pantry_products + pantry_products,
+                           len(self.tags) + tags) - self.score(), cost)
+
+    def apply(self, recipe_id: int, sign: int):
+        products, amounts = self.optimizer.lines[recipe_id]
+        cost, pantry_products, _ = self._change(recipe_id, sign)
+        self.cost += cost
+        self.pantry_products += pantry_products
+        for product_id, amount in zip(products, amounts):
+            updated = self.totals.get(product_id, 0.0) + sign * amount
+            if updated <= 1e-9:
+                self.totals.pop(product_id, None)
+            else:
+                self.totals[product_id] = updated
+        for tag in self.optimizer.tags[recipe_id]:
+            self.tags[tag] += sign
+            if not self.tags[tag]:
+                del self.tags[tag]
+        if sign > 0:
+            self.recipe_ids.append(recipe_id)
+        else:
+            self.recipe_ids.remove(recipe_id)
+
+
+class MenuOptimizer:
+    """
+    Picks a set of recipes under a budget, e.g. seven dinners for 60 €.
+
+    The plan maximises the number of distinct tags (variety) and of pantry
+    products used, less a small weight per euro. Its cost is that of the
+    consolidated shopping list, as root_meal_plan would build it: shared
+    products are bought once and rounded up to purchasable amounts, and
+    stock at home is free. Sharing a product is therefore cheaper than
+    buying it for each recipe.
+
+    Each recipe's products and amounts in the product's price unit are
+    kept in memory as parallel arrays, so evaluating a plan change touches
+    only the recipes involved. They follow the "recipes" and "products"
+    entity caches, like root_recipe_matcher. optimize() fills the plan
+    greedily, best gain first and keeping enough budget for the remaining
+    picks, and then swaps recipes in and out while that improves the score
+    and the time budget lasts.
+    """
+
+    _LINES_QUERY = """
+    SELECT ri.recipe_id, ri.product_id, ri.quantity, ri.unit,
+           p.price_per_unit, p.unit AS price_unit, p.density, p.piece_weight
+    FROM recipe_ingredients ri
+    JOIN recipes r ON r.id = ri.recipe_id
+    LEFT JOIN products p ON p.id = ri.product_id
+    """
+
+    def __init__(self):
+        # Per recipe: product ids and their amounts in the price unit.
+        self.lines: Dict[int, Tuple[array, array]] = {}
+        self.tags: Dict[int, frozenset] = {}
+        # Recipes with an ingredient that cannot be priced.
+        self.unpriced: set = set()
+        # Cost of each recipe bought on its own, without the pantry.
+        self.separate_costs: Dict[int, float] = {}
+        # (price per unit, purchase step) by product id.
+        self.prices: Dict[int, Tuple[float, Optional[float]]] = {}
+        self._units: Dict[int, Tuple[str, Optional[float], Optional[float]]] = {}
+        self._stale = True
+        self._caches = [get_entity_cache("recipes"), get_entity_cache("products")]
+        for cache in self._caches:
+            cache.add_listener(self._on_invalidate)
+
+    def _on_invalidate(self, key):
+        self._stale = True
+
+    def _sync(self):
+        for cache in self._caches:
+            cache.validate()
+        if not self._stale:
+            return
+        self._stale = False
+        db = DatabaseManager.get_instance()
+        rows = db.fetchall(self._LINES_QUERY)
+        amounts = engine.convert_many(
+            [row['quantity'] for row in rows], [row['unit'] for row in rows],
+            [row['price_unit'] or row['unit'] for row in rows],
+            [row['density'] for row in rows], [row['piece_weight'] for row in rows])
+        lines: Dict[int, Dict[int, float]] = {}
+        self.unpriced = set()
+        self.prices = {}
+        self._units = {}
+        for row, amount in zip(rows, amounts):
+            recipe_id = row['recipe_id']
+            shared = lines.setdefault(recipe_id, {})
+            if row['price_per_unit'] is None or amount is None:
+                self.unpriced.add(recipe_id)
+                continue
+            product_id = row['product_id']
+            shared[product_id] = shared.get(product_id, 0.0) + amount
+            self.prices[product_id] = (row['price_per_unit'], PURCHASE_STEPS.get(row['price_unit']))
+            self._units[product_id] = (row['price_unit'], row['density'], row['piece_weight'])
+        self.lines = {recipe_id: (array('q', shared), array('d', shared.values()))
+                      for recipe_id, shared in lines.items()}
+        self.tags = {row['id']: _split_tags(row['tags'])
+                     for row in db.iter_query("SELECT id, tags FROM recipes")}
+        empty = _PlanState(self, {}, 0.0, 0.0, 0.0, 0.0)
+        self.separate_costs = {recipe_id: empty._change(recipe_id, 1)[0] for recipe_id in self.lines}
+
+    def _pantry_amounts(self, pantry: Pantry) -> Dict[int, float]:
+        """Pantry stock in the price unit of each product used by a recipe."""
+        amounts = {}
+        for product_id, (quantity, unit) in pantry.get_stock(self._units).items():
+            price_unit, density, piece_weight = self._units[product_id]
+            converted = engine.convert(quantity, unit, price_unit, density, piece_weight)
+            if converted:
+                amounts[product_id] = converted
+        return amounts
+
+    @catch_errors
+    def optimize(self, count: int = 7, budget: float = 60.0, candidate_ids: Iterable[int] = None,
+                 pantry: Pantry = None, variety_weight: float = 1.0, pantry_weight: float = 1.0,
+                 cost_weight: float = 0.05, time_budget: float = TIME_BUDGET) -> MenuPlan:
+        """
+        Picks `count` different recipes costing at most `budget` in total.
+
+        If no such set exists, the cheapest plan found is returned with
+        within_budget False. Recipes with an ingredient that cannot be
+        priced are left out, since their cost is unknown.
+
+        Parameters:
+            candidate_ids: Recipes to choose from, e.g. those tagged for
+                dinner; every recipe by default.
+            pantry: Stock at home to use first; none by default.
+            time_budget (float): Seconds for the whole call; the local
+                search stops when they run out.
+        """
+        deadline = time.perf_counter() + time_budget
+        self._sync()
+        candidates = [recipe_id for recipe_id in (self.lines if candidate_ids is None
+                                                  else dict.fromkeys(candidate_ids))
+                      if recipe_id in self.lines and recipe_id not in self.unpriced]
+        state = _PlanState(self, self._pantry_amounts(pantry) if pantry else {},
+                           variety_weight, pantry_weight, cost_weight, budget)
+        count = min(count, len(candidates))
+        if not count:
+            return MenuPlan(budget=budget)
+
+        gains = self._initial_gains(state, candidates)
+        # Swaps are drawn from the best and the cheapest recipes only.
+        shortlist = list(dict.fromkeys(
+            [recipe_id for _, recipe_id in heapq.nsmallest(SHORTLIST, gains)]
+            + heapq.nsmallest(SHORTLIST, candidates, key=self.separate_costs.__getitem__)))
+        cheapest = heapq.nsmallest(count, (self.separate_costs[recipe_id] for recipe_id in candidates))
+        self._greedy(state, gains, count, cheapest)
+        iterations = self._local_search(state, shortlist, deadline)
+
+        return MenuPlan(list(state.recipe_ids), round(state.cost, 2),
+                        round(sum(self.separate_costs[recipe_id] for recipe_id in state.recipe_ids), 2),
+                        len(state.tags), state.pantry_products, round(state.score(), 3),
+                        budget, iterations)
+
+    def _initial_gains(self, state: _PlanState, candidates: List[int]) -> List[Tuple[float, int]]:
+        """
+        (-gain, recipe id) of adding each candidate to the empty plan.
+        Without pantry products the gain follows from the precomputed
+        separate cost and tags, so only recipes using the pantry are priced.
+        """
+        gains = []
+        pantry = state.pantry
+        for recipe_id in candidates:
+            if pantry and any(product_id in pantry for product_id in self.lines[recipe_id][0]):
+                gain = state.gain(recipe_id)[0]
+            else:
+                gain = state.score(self.separate_costs[recipe_id], 0, len(self.tags[recipe_id]))
+            gains.append((-gain, recipe_id))
+        return gains
+
+    @staticmethod
+    def _greedy(state: _PlanState, gains: List[Tuple[float, int]], count: int, cheapest: List[float]):
+        """
+        Adds the recipe with the best gain until `count` are picked. A pick
+        must leave enough budget for the cheapest recipes in the remaining
+        slots. Gains are re-evaluated lazily: a recipe is only rescored when
+        it reaches the top of the heap.
+        """
+        heap = list(gains)
+        heapq.heapify(heap)
+        skipped = []
+        while len(state.recipe_ids) < count and heap:
+            _, recipe_id = heapq.heappop(heap)
+            gain, cost = state.gain(recipe_id)
+            if heap and -heap[0][0] > gain + 1e-9:
+                heapq.heappush(heap, (-gain, recipe_id))
+                continue
+            remaining = count - len(state.recipe_ids) - 1
+            if (state.cost + cost + sum(cheapest[:remaining]) > state.budget
+                    and len(heap) > remaining):
+                skipped.append(recipe_id)
+                continue
+            state.apply(recipe_id, 1)
+        # Too little budget for every slot: fill them as cheaply as possible.
+        while len(state.recipe_ids) < count and skipped:
+            recipe_id = min(skipped, key=lambda candidate: state.gain(candidate)[1])
+            skipped.remove(recipe_id)
+            state.apply(recipe_id, 1)
+
+    @staticmethod
+    def _local_search(state: _PlanState, shortlist: List[int], deadline: float) -> int:
+        """
+        Replaces each picked recipe with the shortlisted one that raises the
+        score most, pass after pass, until a pass changes nothing or the
+        deadline passes. Returns the number of swaps evaluated.
+        """
+        iterations = 0
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for out_id in list(state.recipe_ids):
+                before = state.score()
+                state.apply(out_id, -1)
+                base = state.score()
+                best_id, best_score = out_id, before
+                for in_id in shortlist:
+                    if in_id in state.recipe_ids or in_id == out_id:
+                        continue
+                    iterations += 1
+                    score = base + state.gain(in_id)[0]
+                    if score > best_score + 1e-9:
+                        best_id, best_score = in_id, score
+                    if not iterations % 64 and time.perf_counter() >= deadline:
+                        break
+                state.apply(best_id, 1)
+                improved = improved or best_id != out_id
+                if time.perf_counter() >= deadline:
+                    return iterations
+        return iterations
+
+
+# Shared by the controllers; follows the "recipes" and "products" caches.
+menu_optimizer = MenuOptimizer()
@@ -4,6 +4,9 @@ from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime
 
+# Servings of recipes saved before servings were recorded.
+DEFAULT_SERVINGS = 4
+
 
 @dataclass
 class Product:
@@ -14,6 +17,9 @@ class Product:
     category: str
     created_at: datetime
     updated_at: datetime
+    # Optional, for converting between mass, volume and pieces (root_units).
+    density: Optional[float] = None       # kg/l
+    piece_weight: Optional[float] = None  # kg/kpl
 
 
 @dataclass
@@ -25,6 +31,8 @@ class Recipe:
     created_at: datetime
     updated_at: datetime
     ingredients: List['RecipeIngredient']
+    # Servings the ingredient quantities are for.
+    servings: int = DEFAULT_SERVINGS
 
 
 @dataclass
@@ -38,6 +46,14 @@ class RecipeIngredient:
     updated_at: Optional[datetime] = field(default=None)
 
 
+@dataclass(frozen=True)
+class ScaledIngredient:
+    """An ingredient quantity scaled to a number of servings; shared by caches."""
+    product_id: int
+    quantity: float
+    unit: str
+
+
 @dataclass
 class ShoppingList:
     id: int
@@ -61,6 +77,28 @@ class ShoppingListItem:
     updated_at: Optional[datetime] = None
 
 
+@dataclass
+class PricePoint:
+    id: int
+    product_id: int
+    price_per_unit: Optional[float]
+    unit: str
+    valid_from: str
+    # None while the price is still in effect.
+    valid_to: Optional[str] = None
+
+
+@dataclass
+class PantryItem:
+    id: int
+    product_id: int
+    quantity: float
+    unit: str
+    # YYYY-MM-DD of the earliest expiring stock, None if not known.
+    expires_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
 @dataclass
 class ErrorLog:
     id: int
@@ -0,0 +1,220 @@
+# File: root_pantry.py --------------------------------------------------------------------
+
+from typing import Dict, Iterable, List, Tuple
+
+from root_database import DatabaseManager, SQLITE_MAX_VARIABLES, chunked
+from root_models import PantryItem
+from root_units import engine
+from error_handler import catch_errors
+
+# Stock at or below this is used up and its row is removed.
+EMPTY_QUANTITY = 1e-6
+
+
+def _pantry_item_from_row(row) -> PantryItem:
+    return PantryItem(
+        id=row['id'],
+        product_id=row['product_id'],
+        quantity=row['quantity'],
+        unit=row['unit'],
+        expires_at=row['expires_at'],
+        updated_at=row['updated_at']
+    )
+
+
+def take_from_stock(stock: Dict[int, Tuple[float, str]], product_id: int, quantity: float,
+                    unit: str, product=None) -> float:
+    """
+    Takes up to `quantity` `unit`s of a product from `stock` and returns
+    the amount taken, in `unit`. `stock` maps product ids to (quantity,
+    unit) as returned by Pantry.get_stock() and is updated in place, so
+    several lines of one product share its stock.
+    """
+    entry = stock.get(product_id)
+    if entry is None or quantity <= 0:
+        return 0.0
+    available, stock_unit = entry
+    density = product.density if product else None
+    piece_weight = product.piece_weight if product else None
+    factor = 1.0 if unit == stock_unit else engine.factor(stock_unit, unit, density, piece_weight)
+    if not factor:
+        return 0.0
+    taken = min(quantity, available * factor)
+    remaining = available - taken / factor
+    if remaining <= EMPTY_QUANTITY:
+        del stock[product_id]
+    else:
+        stock[product_id] = (remaining, stock_unit)
+    return taken
+
+
+class Pantry:
+    """
+    What is already at home, one pantry_items row per product.
+
+    Stock is kept in the unit it was first added in. Purchases, cooking
+    and the shopping list subtraction are single set-based statements:
+    quantities are converted inside SQLite with UnitEngine.sql_factor(),
+    so marking a whole list purchased or cooking a long recipe costs the
+    same few statements as a single item. Amounts that cannot be converted
+    to the stock's unit leave the stock as it is.
+    """
+
+    _ADD_QUERY = """
+    INSERT INTO pantry_items (product_id, quantity, unit, expires_at)
+    SELECT * FROM (
+        SELECT p.id, :quantity * {factor} AS quantity, COALESCE(pi.unit, :unit), :expires_at
+        FROM products p
+        LEFT JOIN pantry_items pi ON pi.product_id = p.id
+        WHERE p.id = :product_id
+    ) WHERE quantity IS NOT NULL
+    ON CONFLICT(product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        expires_at = COALESCE(MIN(expires_at, excluded.expires_at), expires_at, excluded.expires_at),
+        updated_at = CURRENT_TIMESTAMP
+    """
+
+    _ADD_PURCHASED_QUERY = """
+    INSERT INTO pantry_items (product_id, quantity, unit)
+    SELECT * FROM (
+        SELECT i.product_id, SUM(i.quantity * {factor}) AS quantity, COALESCE(pi.unit, i.unit)
+        FROM shopping_list_items i
+        LEFT JOIN products p ON p.id = i.product_id
+        LEFT JOIN pantry_items pi ON pi.product_id = i.product_id
+        WHERE i.id IN ({{placeholders}})
+        GROUP BY i.product_id
+    ) WHERE quantity IS NOT NULL
+    ON CONFLICT(product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity, updated_at = CURRENT_TIMESTAMP
+    """
+
+    _REMOVE_PURCHASED_QUERY = """
+    UPDATE pantry_items
+    SET quantity = quantity - COALESCE((
+            SELECT SUM(i.quantity * {factor})
+            FROM shopping_list_items i
+            LEFT JOIN products p ON p.id = i.product_id
+            WHERE i.id IN ({{placeholders}}) AND i.product_id = pantry_items.product_id), 0),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE product_id IN (SELECT product_id FROM shopping_list_items WHERE id IN ({{placeholders}}))
+    """
+
+    # The scale is :servings over the recipe's own servings, 1 without :servings.
+    _COOK_QUERY = """
+    UPDATE pantry_items
+    SET quantity = quantity - COALESCE(
+            :servings * 1.0 / NULLIF((SELECT servings FROM recipes WHERE id = :recipe_id), 0), 1.0)
+        * COALESCE((
+            SELECT SUM(ri.quantity * {factor})
+            FROM recipe_ingredients ri
+            LEFT JOIN products p ON p.id = ri.product_id
+            WHERE ri.recipe_id = :recipe_id AND ri.product_id = pantry_items.product_id), 0),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE product_id IN (SELECT product_id FROM recipe_ingredients WHERE recipe_id = :recipe_id)
+    """
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+        self._add_query = self._ADD_QUERY.format(factor=engine.sql_factor(
+            ":unit", "COALESCE(pi.unit, :unit)", "p.density", "p.piece_weight"))
+        self._add_purchased_query = self._ADD_PURCHASED_QUERY.format(factor=engine.sql_factor(
+            "i.unit", "COALESCE(pi.unit, i.unit)", "p.density", "p.piece_weight"))
+        self._remove_purchased_query = self._REMOVE_PURCHASED_QUERY.format(factor=engine.sql_factor(
+            "i.unit", "pantry_items.unit", "p.density", "p.piece_weight"))
+        self._cook_query = self._COOK_QUERY.format(factor=engine.sql_factor(
+            "ri.unit", "pantry_items.unit", "p.density", "p.piece_weight"))
+
+    @catch_errors
+    def get_items(self) -> Dict[int, PantryItem]:
+        """Returns the stock by product id."""
+        return {row['product_id']: _pantry_item_from_row(row)
+                for row in self.db.iter_query("SELECT * FROM pantry_items")}
+
+    @catch_errors
+    def get_stock(self, product_ids: Iterable[int]) -> Dict[int, Tuple[float, str]]:
+        """Returns (quantity, unit) of the given products that are at home."""
+        rows = self.db.fetchall_in(
+            "SELECT product_id, quantity, unit FROM pantry_items WHERE product_id IN ({placeholders})",
+            list(dict.fromkeys(product_ids)))
+        return {row['product_id']: (row['quantity'], row['unit']) for row in rows}
+
+    @catch_errors
+    def get_expiring(self, before: str) -> List[PantryItem]:
+        """Stock that expires before `before` (YYYY-MM-DD), soonest first."""
+        rows = self.db.fetchall(
+            "SELECT * FROM pantry_items WHERE expires_at IS NOT NULL AND expires_at < ? "
+            "ORDER BY expires_at", (before,))
+        return [_pantry_item_from_row(row) for row in rows]
+
+    @catch_errors
+    def add_item(self, product_id: int, quantity: float, unit: str, expires_at: str = None):
+        """
+        Adds stock of a product. An earlier expiry date replaces a later one,
+        since the oldest stock is used first.
+        """
+        self.db.execute_query(self._add_query, {
+            "product_id": product_id, "quantity": quantity, "unit": unit, "expires_at": expires_at})
+
+    @catch_errors
+    def set_item(self, product_id: int, quantity: float, unit: str, expires_at: str = None):
+        """Replaces the stock of a product; a quantity of 0 removes it."""
+        if quantity <= EMPTY_QUANTITY:
+            self.remove_item(product_id)
+            return
+        query = """
+        INSERT INTO pantry_items (product_id, quantity, unit, expires_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(product_id) DO UPDATE SET
+            quantity = excluded.quantity, unit = excluded.unit,
+            expires_at = excluded.expires_at, updated_at = CURRENT_TIMESTAMP
+        """
+        self.db.execute_query(query, (product_id, quantity, unit, expires_at))
+
+    @catch_errors
+    def remove_item(self, product_id: int):
+        self.db.execute_query("DELETE FROM pantry_items WHERE product_id = ?", (product_id,))
+
+    @catch_errors
+    def add_purchased(self, item_ids: Iterable[int]):
+        """Adds shopping list items to the stock, e.g. when they are marked purchased."""
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            return
+        with self.db.transaction():
+            for chunk in chunked(item_ids, SQLITE_MAX_VARIABLES):
+                placeholders = ", ".join("?" * len(chunk))
+                self.db.execute_query(
+                    self._add_purchased_query.format(placeholders=placeholders), tuple(chunk))
+
+    @catch_errors
+    def remove_purchased(self, item_ids: Iterable[int]):
+        """Takes shopping list items back out of the stock when a purchase is undone."""
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            return
+        with self.db.transaction():
+            for chunk in chunked(item_ids, SQLITE_MAX_VARIABLES // 2):
+                placeholders = ", ".join("?" * len(chunk))
+                self.db.execute_query(
+                    self._remove_purchased_query.format(placeholders=placeholders),
+                    (*chunk, *chunk))
+                self.db.execute_query(
+                    "DELETE FROM pantry_items WHERE product_id IN ("
+                    f"SELECT product_id FROM shopping_list_items WHERE id IN ({placeholders})) "
+                    "AND quantity <= ?", (*chunk, EMPTY_QUANTITY))
+
+    @catch_errors
+    def cook(self, recipe_id: int, servings: int = None) -> int:
+        """
+        Deducts the ingredients of a cooked recipe, scaled to `servings`,
+        and returns how many products were deducted. Used up stock is removed.
+        """
+        with self.db.transaction():
+            cursor = self.db.execute_query(
+                self._cook_query, {"recipe_id": recipe_id, "servings": servings})
+            deducted = max(cursor.rowcount, 0)
+            self.db.execute_query(
+                "DELETE FROM pantry_items WHERE product_id IN ("
+                "SELECT product_id FROM recipe_ingredients WHERE recipe_id = ?) AND quantity <= ?",
+                (recipe_id, EMPTY_QUANTITY))
+        return deducted
@@ -0,0 +1,247 @@
+# File: root_pricing.py --------------------------------------------------------------------
+
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from root_cache import get_entity_cache
+from root_database import DatabaseManager
+from root_units import engine, UNITS
+from error_handler import catch_errors
+
+try:
+    import numpy
+except ImportError:  # Not bundled in the Android build.
+    numpy = None
+
+_NAN = math.nan
+# Item units by position in the factor vectors.
+_UNIT_NAMES = tuple(UNITS)
+_UNIT_CODES = {name: code for code, name in enumerate(_UNIT_NAMES)}
+_UNIT_FACTORS = tuple(UNITS[name].factor for name in _UNIT_NAMES)
+
+
+class PricingKernel:
+    """
+    Prices many (product, quantity, unit) rows against the current products.
+
+    The products are kept as array('d') vectors indexed by product id:
+    the price, and for every unit in root_units.UNITS the factor from that
+    unit to the product's price unit, as UnitEngine.factor() gives it (NaN
+    where it gives None). Pricing a row is then two lookups and two
+    multiplications in the same order as UnitEngine.price(), so the results
+    are identical to item_prices() and RecipeCostEngine, only without
+    building Product objects or resolving units per row. With NumPy the
+    rows are priced as whole vectors; without it, in a plain loop.
+
+    The vectors follow the "products" entity cache: a product invalidated
+    by a local write is re-read on the next call, and a change by another
+    connection reloads every product.
+    """
+
+    _PRODUCTS_QUERY = "SELECT id, unit, price_per_unit, density, piece_weight FROM products"
+
+    def __init__(self):
+        self._reset()
+        self._dirty: Set[int] = set()
+        self._stale = True
+        self._cache = get_entity_cache("products")
+        self._cache.add_listener(self._on_invalidate)
+
+    def _reset(self):
+        self._prices = array('d')
+        self._factors = [array('d') for _ in _UNIT_NAMES]
+        # 1 where a product with the id exists.
+        self._exists = array('b')
+
+    def _on_invalidate(self, product_id: Optional[int]):
+        if product_id is None:
+            self._stale = True
+        else:
+            self._dirty.add(product_id)
+
+    def _grow(self, size: int):
+        missing = size - len(self._exists)
+        if missing <= 0:
+            return
+        # Grow geometrically so that adding products one by one stays cheap.
+        missing = max(missing, len(self._exists) // 2)
+        self._exists.extend(bytes(missing))
+        self._prices.extend(array('d', (_NAN,)) * missing)
+        for factors in self._factors:
+            factors.extend(array('d', (_NAN,)) * missing)
+
+    def _store(self, rows):
+        resolved: Dict[tuple, Tuple[float, ...]] = {}
+        for row in rows:
+            product_id = row['id']
+            key = (row['unit'], row['density'], row['piece_weight'])
+            factors = resolved.get(key)
+            if factors is None:
+                factors = resolved[key] = tuple(
+                    _NAN if factor is None else factor
+                    for factor in (engine.factor(unit, row['unit'], row['density'], row['piece_weight'])
+                                   for unit in _UNIT_NAMES))
+            self._grow(product_id + 1)
+            self._exists[product_id] = 1
+            price = row['price_per_unit']
+            self._prices[product_id] = _NAN if price is None else price
+            for vector, factor in zip(self._factors, factors):
+                vector[product_id] = factor
+
+    def _forget(self, product_ids: Iterable[int]):
+        for product_id in product_ids:
+            if 0 <= product_id < len(self._exists):
+                self._exists[product_id] = 0
+                self._prices[product_id] = _NAN
+
+    def _sync(self, product_ids: Iterable[int] = ()):
+        """Brings the vectors up to date for `product_ids` before pricing."""
+        self._cache.validate()
+        db = DatabaseManager.get_instance()
+        if self._stale:
+            self._stale = False
+            self._dirty.clear()
+            self._reset()
+            self._store(db.iter_query(self._PRODUCTS_QUERY))
+            return
+        # Products added since the last load are not in the vectors yet;
+        # adding a product does not invalidate anything in the cache.
+        size, exists = len(self._exists), self._exists
+        reload = set(self._dirty)
+        reload.update(product_id for product_id in product_ids
+                      if product_id is not None and not (0 <= product_id < size and exists[product_id]))
+        self._dirty.clear()
+        if not reload:
+            return
+        self._forget(reload)
+        self._store(db.fetchall_in(self._PRODUCTS_QUERY + " WHERE id IN ({placeholders})",
+                                   list(reload)))
+
+    def _price_python(self, product_ids: Sequence[int], quantities: Sequence[float],
+                      units: Sequence[str], fallback: bool) -> List[Optional[float]]:
+        size = len(self._exists)
+        exists, prices, vectors = self._exists, self._prices, self._factors
+        priced: List[Optional[float]] = []
+        for product_id, quantity, unit in zip(product_ids, quantities, units):
+            if product_id is None or not 0 <= product_id < size or not exists[product_id] \
+                    or quantity is None:
+                priced.append(None)
+                continue
+            price = prices[product_id]
+            code = _UNIT_CODES.get(unit)
+            factor = vectors[code][product_id] if code is not None else _NAN
+            if factor == factor and price == price:
+                priced.append(quantity * factor * price)
+            elif fallback:
+                # item_price(): the price per kpl/kg/l times the unit's size.
+                priced.append((price if price == price else 0.0) * quantity * _UNIT_FACTORS[code]
+                              if code is not None else 0.0)
+            else:
+                priced.append(None)
+        return priced
+
+    def _price_numpy(self, product_ids: Sequence[int], quantities: Sequence[float],
+                     units: Sequence[str], fallback: bool) -> List[Optional[float]]:
+        count = len(product_ids)
+        size = len(self._exists)
+        ids = numpy.fromiter((-1 if product_id is None else product_id for product_id in product_ids),
+                             dtype=numpy.int64, count=count)
+        amounts = numpy.fromiter((_NAN if quantity is None else quantity for quantity in quantities),
+                                 dtype=numpy.float64, count=count)
+        codes = numpy.fromiter((_UNIT_CODES.get(unit, -1) for unit in units),
+                               dtype=numpy.int64, count=count)
+        in_range = (ids >= 0) & (ids < size)
+        safe_ids = numpy.where(in_range, ids, 0)
+        found = in_range & (numpy.frombuffer(self._exists, dtype=numpy.int8)[safe_ids] == 1) \
+            & ~numpy.isnan(amounts)
+        prices = numpy.frombuffer(self._prices, dtype=numpy.float64)[safe_ids]
+        factors = numpy.full(count, _NAN)
+        for code, vector in enumerate(self._factors):
+            rows = codes == code
+            factors[rows] = numpy.frombuffer(vector, dtype=numpy.float64)[safe_ids[rows]]
+
+        priceable = ~numpy.isnan(factors) & ~numpy.isnan(prices)
+        # Same operation order as UnitEngine.price(): (quantity * factor) * price.
+        priced = amounts * factors * prices
+        if fallback:
+            unit_factors = numpy.asarray(_UNIT_FACTORS)[numpy.maximum(codes, 0)]
+            backup = numpy.where(codes >= 0,
+                                 numpy.where(numpy.isnan(prices), 0.0, prices) * amounts * unit_factors,
+                                 0.0)
+            priced = numpy.where(priceable, priced, backup)
+            valid = found
+        else:
+            valid = found & priceable
+        return [price if ok else None for price, ok in zip(priced.tolist(), valid.tolist())]
+
+    @catch_errors
+    def price(self, product_ids: Sequence[int], quantities: Sequence[float], units: Sequence[str],
+              fallback: bool = False) -> List[Optional[float]]:
+        """
+        Prices parallel sequences of rows; None for a row whose product does
+        not exist.
+
+        Parameters:
+            fallback (bool): Price rows that cannot be converted to the
+                price unit like item_price() does, as the shopping lists do.
+                Without it such rows are None, as in the recipe costs.
+        """
+        self._sync(product_ids)
+        if numpy is not None and len(product_ids) > 1 and len(self._exists):
+            return self._price_numpy(product_ids, quantities, units, fallback)
+        return self._price_python(product_ids, quantities, units, fallback)
+
+    @catch_errors
+    def item_prices(self, items) -> Dict[int, float]:
+        """item_prices() against the current products: price by item id."""
+        items = list(items)
+        prices = self.price([item.product_id for item in items], [item.quantity for item in items],
+                            [item.unit for item in items], fallback=True)
+        return {item.id: price for item, price in zip(items, prices) if price is not None}
+
+    @catch_errors
+    def list_totals(self, shopping_list_ids: Iterable[int] = None) -> Dict[int, float]:
+        """
+        Unrounded cost of the unpurchased items of the given shopping lists,
+        or of every list, read with one query and priced in one pass. Items
+        are summed in the order calculate_total_cost() reads them.
+        """
+        query = ("SELECT shopping_list_id, product_id, quantity, unit FROM shopping_list_items "
+                 "WHERE is_purchased = 0")
+        db = DatabaseManager.get_instance()
+        if shopping_list_ids is None:
+            rows = db.fetchall(query)
+        else:
+            rows = db.fetchall_in(query + " AND shopping_list_id IN ({placeholders})",
+                                  list(dict.fromkeys(shopping_list_ids)))
+        prices = self.price([row['product_id'] for row in rows], [row['quantity'] for row in rows],
+                            [row['unit'] for row in rows], fallback=True)
+        totals: Dict[int, float] = {} if shopping_list_ids is None else dict.fromkeys(shopping_list_ids, 0)
+        for row, price in zip(rows, prices):
+            if price is not None:
+                totals[row['shopping_list_id']] = totals.get(row['shopping_list_id'], 0) + price
+        return totals
+
+    @catch_errors
+    def recipe_totals(self, rows) -> Dict[int, Tuple[float, int]]:
+        """
+        (unrounded total, unpriced ingredients) by recipe for recipe_ingredients
+        rows with recipe_id, product_id, quantity and unit, summed in row
+        order like RecipeCostEngine.
+        """
+        rows = list(rows)
+        prices = self.price([row['product_id'] for row in rows], [row['quantity'] for row in rows],
+                            [row['unit'] for row in rows])
+        totals: Dict[int, list] = {}
+        for row, price in zip(rows, prices):
+            total = totals.setdefault(row['recipe_id'], [0.0, 0])
+            if price is None:
+                total[1] += 1
+            else:
+                total[0] += price
+        return {recipe_id: (total, unpriced) for recipe_id, (total, unpriced) in totals.items()}
+
+
+# Shared by the controllers, the views and the recipe cost engine.
+pricing = PricingKernel()
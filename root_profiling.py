@@ -0,0 +1,165 @@
+# File: root_profiling.py --------------------------------------------------------------------
+
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, List
+
+# Set to 1 to start the app with profiling enabled.
+PROFILE_ENV = "COOKNCART_PROFILE"
+
+# Wall times kept per function for the percentiles.
+PROFILE_SAMPLE_SIZE = 512
+
+# Read on every decorated call; change it through set_enabled().
+enabled = os.environ.get(PROFILE_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+# Statements executed by DatabaseManager since start-up. Always counted:
+# a global increment is cheaper than checking whether anyone is listening.
+_statement_count = 0
+
+_LAYERS = (
+    ("root_repositories", "repository"),
+    ("root_controllers", "controller"),
+    ("root_database", "database"),
+    ("views_", "view"),
+    ("widgets_", "widget"),
+    ("qml", "qml"),
+)
+
+
+def count_statement(count: int = 1):
+    """Called by DatabaseManager for every statement it executes."""
+    global _statement_count
+    _statement_count += count
+
+
+def statement_count() -> int:
+    return _statement_count
+
+
+def set_enabled(flag: bool):
+    global enabled
+    enabled = bool(flag)
+
+
+def is_enabled() -> bool:
+    return enabled
+
+
+def _layer(module: str) -> str:
+    for prefix, layer in _LAYERS:
+        if module.startswith(prefix):
+            return layer
+    return "other"
+
+
+class FunctionStats:
+    """Timing and statement counts of one decorated function."""
+
+    __slots__ = ("name", "layer", "calls", "errors", "total_time",
+                 "max_time", "statements", "samples")
+
+    def __init__(self, name: str, layer: str):
+        self.name = name
+        self.layer = layer
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.statements = 0
+        self.samples = deque(maxlen=PROFILE_SAMPLE_SIZE)
+
+    def record(self, elapsed: float, statements: int, failed: bool):
+        self.calls += 1
+        self.total_time += elapsed
+        self.statements += statements
+        self.samples.append(elapsed)
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.errors += 1
+
+    def to_dict(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000.0
+
+        return {
+            "layer": self.layer,
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_time * 1000.0, 3),
+            "mean_ms": round(self.total_time * 1000.0 / self.calls, 3),
+            "p50_ms": round(pct(50), 3),
+            "p95_ms": round(pct(95), 3),
+            "p99_ms": round(pct(99), 3),
+            "max_ms": round(self.max_time * 1000.0, 3),
+            "statements": self.statements,
+            "statements_per_call": round(self.statements / self.calls, 2),
+        }
+
+
+_registry: Dict[str, FunctionStats] = {}
+
+
+def function_key(func) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def record(func, elapsed: float, statements: int, failed: bool = False):
+    """
+    Adds one call of `func` to the registry. Times and statements are
+    inclusive: a controller call also counts the repository calls it makes.
+    """
+    key = function_key(func)
+    stats = _registry.get(key)
+    if stats is None:
+        stats = FunctionStats(key, _layer(func.__module__))
+        _registry[key] = stats
+    stats.record(elapsed, statements, failed)
+
+
+def reset():
+    _registry.clear()
+
+
+def snapshot() -> Dict[str, dict]:
+    """Returns the statistics of every profiled function, slowest total first."""
+    stats = sorted(_registry.values(), key=lambda s: s.total_time, reverse=True)
+    return {s.name: s.to_dict() for s in stats}
+
+
+def dump_json(path: str) -> str:
+    """Writes the registry to `path` as JSON and returns the path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "enabled": enabled,
+        "statements_total": _statement_count,
+        "functions": snapshot(),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def format_report(limit: int = 40) -> str:
+    """Returns the registry as a plain-text table for the Asetukset page."""
+    rows: List[str] = []
+    functions = snapshot()
+    if not functions:
+        return ""
+    for name, s in list(functions.items())[:limit]:
+        short_name = name.split(".", 1)[-1]
+        rows.append(
+            f"{short_name}  [{s['layer']}]\n"
+            f"  kutsut {s['calls']}, yht. {s['total_ms']:.1f} ms, "
+            f"p50 {s['p50_ms']:.2f} ms, p95 {s['p95_ms']:.2f} ms, "
+            f"SQL/kutsu {s['statements_per_call']}"
+        )
+    return "\n".join(rows)
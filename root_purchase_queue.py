@@ -0,0 +1,100 @@
+# File: root_purchase_queue.py --------------------------------------------------------------------
+
+from typing import Dict, Optional
+
+from PySide6.QtCore import QObject, QTimer, QCoreApplication, Signal
+
+from root_controllers import ShoppingListController
+from error_handler import catch_errors
+
+# Pending toggles are written once the user has been idle this long.
+FLUSH_DELAY_MS = 500
+
+
+class PurchaseStatusQueue(QObject):
+    """
+    Write-behind queue for the purchase status of shopping list items.
+
+    The UI applies a toggle to its own state at once and calls set_status();
+    the queue only remembers the latest state per item. Toggling an item
+    back to its stored state drops it from the queue, so tapping an item
+    twice writes nothing. flush() writes the pending states and the list
+    total in one transaction; it runs after FLUSH_DELAY_MS of inactivity,
+    when the application quits, and whenever the owner navigates away.
+    """
+    flushed = Signal(int, int)  # shopping_list_id, items written
+
+    def __init__(self, shopping_list_id: int, controller: ShoppingListController = None,
+                 delay_ms: int = FLUSH_DELAY_MS, parent=None):
+        super().__init__(parent)
+        self.shopping_list_id = shopping_list_id
+        self.controller = controller or ShoppingListController()
+        self._stored: Dict[int, bool] = {}
+        self._pending: Dict[int, bool] = {}
+        self._total_sum: Optional[float] = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def pending(self) -> Dict[int, bool]:
+        return dict(self._pending)
+
+    def set_status(self, item_id: int, is_purchased: bool, stored: bool = None,
+                   total_sum: float = None):
+        """
+        Queues the new state of an item.
+
+        Parameters:
+            stored (bool): The state in the database, needed the first time
+                the item is queued so that a toggle back can be dropped.
+            total_sum (float): The list total after this change, written
+                with the next flush.
+        """
+        is_purchased = bool(is_purchased)
+        if item_id not in self._stored:
+            self._stored[item_id] = bool(stored) if stored is not None else not is_purchased
+        if self._stored[item_id] == is_purchased:
+            self._pending.pop(item_id, None)
+        else:
+            self._pending[item_id] = is_purchased
+        if total_sum is not None:
+            self._total_sum = total_sum
+        self._timer.start()
+
+    @catch_errors
+    def flush(self) -> int:
+        """Writes the pending states and returns how many items were written."""
+        self._timer.stop()
+        if not self._pending and self._total_sum is None:
+            return 0
+        pending = dict(self._pending)
+        self.controller.set_purchased_statuses(
+            self.shopping_list_id, pending, total_sum=self._total_sum)
+        # Cleared only after a successful write, so a failed flush is retried.
+        for item_id, is_purchased in pending.items():
+            self._stored[item_id] = is_purchased
+            if self._pending.get(item_id) == is_purchased:
+                del self._pending[item_id]
+        self._total_sum = None
+        self.flushed.emit(self.shopping_list_id, len(pending))
+        return len(pending)
+
+    def mark_stored(self, item_ids, is_purchased: bool):
+        """Records states written to the database outside the queue."""
+        for item_id in item_ids:
+            self._stored[item_id] = bool(is_purchased)
+            self._pending.pop(item_id, None)
+
+    def discard(self):
+        """Drops the pending changes, e.g. when the list itself is deleted."""
+        self._timer.stop()
+        self._pending.clear()
+        self._total_sum = None
@@ -0,0 +1,384 @@
+# File: root_recipe_bundle.py --------------------------------------------------------------------
+
+import argparse
+import gzip
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from root_database import DatabaseManager, chunked
+from root_repositories import RecipeRepository, ProductRepository, normalize_name
+from root_catalog_import import parse_product_record, DEFAULT_CATEGORY
+from root_models import Recipe, DEFAULT_SERVINGS
+from root_units import engine, normalize_unit
+from error_handler import catch_errors
+
+BUNDLE_FORMAT = "cookncart-recipes"
+BUNDLE_VERSION = 1
+
+# Recipes resolved and written per round. All rounds share one transaction.
+BUNDLE_BATCH_SIZE = 500
+
+# progress(done, total); total is None when the bundle header has no count.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+@dataclass
+class RecipeBundleReport:
+    recipes_read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    ingredients: int = 0
+    products_created: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def recipes_per_second(self) -> float:
+        return self.recipes_read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"Recipes read: {self.recipes_read} ({self.recipes_per_second:.0f} recipes/s, {self.elapsed:.2f} s)",
+            f"Imported: {self.imported}, skipped (already exist): {self.skipped}",
+            f"Ingredients: {self.ingredients}, products created: {self.products_created}",
+            f"Rejected: {len(self.rejected)}",
+        ]
+        for line_no, reason in self.rejected[:20]:
+            lines.append(f"  line {line_no}: {reason}")
+        if len(self.rejected) > 20:
+            lines.append(f"  ... and {len(self.rejected) - 20} more")
+        return "\n".join(lines)
+
+
+def open_bundle(path: str, mode: str = "r") -> TextIO:
+    """Opens a bundle as text; files ending in .gz are gzip-compressed."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _recipe_to_record(recipe: Recipe, products: Dict) -> dict:
+    ingredients = []
+    for ing in recipe.ingredients:
+        product = products.get(ing.product_id)
+        if product is None:
+            continue
+        ingredients.append({
+            "product": {
+                "name": product.name,
+                "unit": product.unit,
+                "price_per_unit": product.price_per_unit,
+                "category": product.category,
+                "density": product.density,
+                "piece_weight": product.piece_weight,
+            },
+            "quantity": ing.quantity,
+            "unit": ing.unit,
+        })
+    return {
+        "name": recipe.name,
+        "instructions": recipe.instructions,
+        "tags": recipe.tags,
+        "servings": recipe.servings,
+        "ingredients": ingredients,
+    }
+
+
+def _parse_recipe_record(record) -> dict:
+    """
+    Validates one recipe line.
+
+    Raises:
+        ValueError: If the recipe cannot be imported. The message is the reject reason.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    name = " ".join(str(record.get("name") or "").split())
+    if not name:
+        raise ValueError("missing recipe name")
+    ingredients = record.get("ingredients") or []
+    if not isinstance(ingredients, list):
+        raise ValueError("ingredients must be a list")
+    for ing in ingredients:
+        product = ing.get("product") if isinstance(ing, dict) else None
+        if not isinstance(product, dict) or not str(product.get("name") or "").strip():
+            raise ValueError("ingredient without a product name")
+        try:
+            quantity = float(ing.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid quantity '{ing.get('quantity')}'")
+        if not math.isfinite(quantity) or quantity < 0:
+            raise ValueError(f"invalid quantity '{ing.get('quantity')}'")
+        ing["quantity"] = quantity
+    servings = record.get("servings", DEFAULT_SERVINGS)
+    if isinstance(servings, bool) or not isinstance(servings, int) or servings < 1:
+        raise ValueError(f"invalid servings '{servings}'")
+    instructions = record.get("instructions") or ""
+    tags = record.get("tags") or ""
+    if not isinstance(instructions, str):
+        raise ValueError("instructions must be a string")
+    if not isinstance(tags, str):
+        raise ValueError("tags must be a string")
+    return {
+        "name": name,
+        "instructions": instructions,
+        "tags": tags,
+        "servings": servings,
+        "ingredients": ingredients,
+    }
+
+
+class RecipeBundleIO:
+    """
+    Exports and imports recipe bundles.
+
+    A bundle is a JSON lines file, gzip-compressed if the name ends in .gz.
+    The first line is a header {"format": "cookncart-recipes", "version": 1,
+    "recipes": <count>}; every following line is one recipe with its tags
+    and ingredients. Ingredients refer to products by name and carry the
+    product's unit, price and category so that missing products can be
+    created on import.
+    """
+
+    def __init__(self, batch_size: int = BUNDLE_BATCH_SIZE):
+        self.db = DatabaseManager.get_instance()
+        self.recipe_repo = RecipeRepository()
+        self.product_repo = ProductRepository()
+        self.batch_size = batch_size
+
+    @catch_errors
+    def export_file(self, path: str, recipe_ids: List[int] = None,
+                    progress: ProgressCallback = None) -> int:
+        """Writes the given recipes (all if None) to `path`. Returns the number written."""
+        if recipe_ids is None:
+            total = self.db.fetchone("SELECT COUNT(*) AS n FROM recipes")['n']
+            recipes = self.recipe_repo.iter_recipes(batch_size=self.batch_size)
+        else:
+            total = len(recipe_ids)
+            recipes = self._iter_recipes_by_ids(recipe_ids)
+        products = self.product_repo.get_all_products()
+
+        written = 0
+        with open_bundle(path, "w") as stream:
+            header = {
+                "format": BUNDLE_FORMAT,
+                "version": BUNDLE_VERSION,
+                "recipes": total,
+                "exported_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            stream.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for recipe in recipes:
+                record = _recipe_to_record(recipe, products)
+                stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += 1
+                if progress and written % self.batch_size == 0:
+                    progress(written, total)
+        if progress:
+            progress(written, total)
+        return written
+
+    def _iter_recipes_by_ids(self, recipe_ids: List[int]) -> Iterator[Recipe]:
+        for chunk in chunked(recipe_ids, self.batch_size):
+            yield from self.recipe_repo.get_recipes_by_ids(chunk).values()
+
+    @catch_errors
+    def import_file(self, path: str, skip_existing: bool = True,
+                    progress: ProgressCallback = None) -> RecipeBundleReport:
+        """
+        Imports every recipe of a bundle in a single transaction.
+
+        Products are matched by normalize_name(); missing ones are created in
+        bulk. With `skip_existing`, recipes whose name already exists are
+        skipped so the same bundle can be imported twice safely.
+        """
+        report = RecipeBundleReport()
+        start = time.perf_counter()
+        with open_bundle(path) as stream:
+            total = self._read_header(stream)
+            product_ids = self.product_repo.get_product_ids_by_normalized_name()
+            recipe_names = None
+            if skip_existing:
+                recipe_names = {normalize_name(row['name'])
+                                for row in self.db.iter_query("SELECT name FROM recipes")}
+
+            with self.db.transaction():
+                batch = []
+                for line_no, line in enumerate(stream, start=2):
+                    if not line.strip():
+                        continue
+                    report.recipes_read += 1
+                    try:
+                        recipe = _parse_recipe_record(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        report.rejected.append((line_no, f"invalid JSON: {e.msg}"))
+                        continue
+                    except ValueError as e:
+                        report.rejected.append((line_no, str(e)))
+                        continue
+                    if recipe_names is not None and normalize_name(recipe["name"]) in recipe_names:
+                        report.skipped += 1
+                        continue
+                    batch.append((line_no, recipe))
+                    if len(batch) >= self.batch_size:
+                        self._write_batch(batch, product_ids, report, recipe_names)
+                        if progress:
+                            progress(report.recipes_read, total)
+                self._write_batch(batch, product_ids, report, recipe_names)
+
+        report.elapsed = time.perf_counter() - start
+        if progress:
+            progress(report.recipes_read, total)
+        return report
+
+    @staticmethod
+    def _read_header(stream: TextIO) -> Optional[int]:
+        try:
+            header = json.loads(stream.readline())
+        except json.JSONDecodeError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != BUNDLE_FORMAT:
+            raise ValueError("Not a recipe bundle: missing header line")
+        if header.get("version", 0) > BUNDLE_VERSION:
+            raise ValueError(
+                f"Unsupported recipe bundle version {header.get('version')}")
+        return header.get("recipes")
+
+    def _write_batch(self, batch: List[Tuple[int, dict]], product_ids: Dict[str, int],
+                     report: RecipeBundleReport, recipe_names: Optional[Set[str]]):
+        self._resolve_batch(batch, product_ids, report, recipe_names)
+
+        ingredient_rows = []
+        for line_no, recipe in batch:
+            recipe_id = self.recipe_repo.add_recipe(Recipe(
+                id=0, name=recipe["name"], instructions=recipe["instructions"],
+                tags=recipe["tags"], created_at=None, updated_at=None, ingredients=[],
+                servings=recipe["servings"]))
+            ingredient_rows.extend((recipe_id, product_ids[key], quantity, unit)
+                                   for key, quantity, unit in recipe["merged"])
+            report.imported += 1
+        if ingredient_rows:
+            self.recipe_repo.insert_recipe_ingredients_many(ingredient_rows)
+            report.ingredients += len(ingredient_rows)
+        batch.clear()
+
+    def _resolve_batch(self, batch: List[Tuple[int, dict]], product_ids: Dict[str, int],
+                       report: RecipeBundleReport, recipe_names: Optional[Set[str]]):
+        """
+        Creates the products missing from `product_ids` and merges each
+        recipe's ingredients. Recipes that cannot be imported are rejected
+        and removed from `batch`.
+
+        With `recipe_names`, a recipe whose name is already there is skipped,
+        and the name of each recipe that resolves is added to it. A rejected
+        recipe therefore does not stop a later one of the same name.
+        """
+        missing: Dict[str, tuple] = {}
+        dropped_lines = set()
+        for line_no, recipe in batch:
+            name_key = normalize_name(recipe["name"])
+            if recipe_names is not None and name_key in recipe_names:
+                report.skipped += 1
+                dropped_lines.add(line_no)
+                continue
+            # Merged into `missing` only once the whole recipe has resolved,
+            # so a rejected recipe leaves no products behind.
+            products: Dict[str, tuple] = {}
+            try:
+                for ing in recipe["ingredients"]:
+                    key = normalize_name(ing["product"]["name"])
+                    if key in product_ids or key in missing or key in products:
+                        continue
+                    try:
+                        name, unit, price, category, density, piece_weight = parse_product_record(
+                            {"price_per_unit": 0, **ing["product"]})
+                    except ValueError as e:
+                        raise ValueError(f"product '{ing['product']['name']}': {e}")
+                    products[key] = (name, unit, price, category or DEFAULT_CATEGORY,
+                                     density, piece_weight)
+                recipe["merged"] = self._merge_ingredients(
+                    recipe["ingredients"], product_ids, (products, missing))
+            except ValueError as e:
+                report.rejected.append((line_no, str(e)))
+                dropped_lines.add(line_no)
+                continue
+            missing.update(products)
+            if recipe_names is not None:
+                recipe_names.add(name_key)
+        if dropped_lines:
+            batch[:] = [entry for entry in batch if entry[0] not in dropped_lines]
+        if not missing:
+            return
+
+        last_id = self.db.fetchone("SELECT COALESCE(MAX(id), 0) AS id FROM products")['id']
+        self.product_repo.insert_products_many(list(missing.values()))
+        report.products_created += len(missing)
+        for row in self.db.iter_query("SELECT id, name FROM products WHERE id > ?", (last_id,)):
+            product_ids.setdefault(normalize_name(row['name']), row['id'])
+
+    def _merge_ingredients(self, ingredients: List[dict], product_ids: Dict[str, int],
+                           new_products: Tuple[Dict[str, tuple], ...]) -> List[Tuple[str, float, str]]:
+        """
+        The ingredients as (product key, quantity, unit), one per product.
+
+        recipe_ingredients is unique per (recipe, product), so lines that
+        resolve to the same product are summed in the unit of the first one,
+        converting through the product's density and piece weight.
+        `new_products` are the parsed products not yet in `product_ids`.
+
+        Raises:
+            ValueError: If a line cannot be converted to the first line's unit.
+        """
+        merged: Dict[str, list] = {}
+        for ing in ingredients:
+            key = normalize_name(ing["product"]["name"])
+            unit = ing.get("unit") or ""
+            row = merged.get(key)
+            if row is None:
+                merged[key] = [key, ing["quantity"], unit]
+                continue
+            if row[2] == unit:
+                row[1] += ing["quantity"]
+                continue
+            new = next((products[key] for products in new_products if key in products), None)
+            if new is not None:
+                density, piece_weight = new[4:6]
+            else:
+                product = self.db.fetchone(
+                    "SELECT density, piece_weight FROM products WHERE id = ?", (product_ids[key],))
+                density, piece_weight = product['density'], product['piece_weight']
+            quantity = engine.convert(ing["quantity"], normalize_unit(unit) or unit,
+                                      normalize_unit(row[2]) or row[2], density, piece_weight)
+            if quantity is None:
+                raise ValueError(f"ingredient '{ing['product']['name']}': cannot convert "
+                                 f"'{unit}' to '{row[2]}'")
+            row[1] += quantity
+        return [tuple(row) for row in merged.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a recipe bundle.")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="Bundle file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--db", default="utils/cook_and_cart.db", help="Database path")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="Import recipes even if one with the same name exists")
+    args = parser.parse_args()
+
+    DatabaseManager(args.db)
+    bundle = RecipeBundleIO()
+    if args.command == "export":
+        count = bundle.export_file(args.path)
+        print(f"Exported {count} recipes to {args.path}")
+    else:
+        report = bundle.import_file(
+            args.path, skip_existing=not args.keep_duplicates,
+            progress=lambda done, total: print(f"{done}/{total if total is not None else '?'} recipes"))
+        print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# File: root_recipe_costs.py --------------------------------------------------------------------
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from root_database import DatabaseManager
+from root_units import engine
+from root_pricing import pricing
+from error_handler import catch_errors
+
+
+@dataclass
+class RecipeCost:
+    recipe_id: int
+    total: float
+    # Ingredients left out of the total: the product is missing, has no
+    # price, or its price unit cannot be converted to the ingredient unit.
+    unpriced_count: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.unpriced_count == 0
+
+    def per_serving(self, servings: int) -> float:
+        return round(self.total / servings, 2) if servings and servings > 0 else self.total
+
+    def scaled(self, factor: float) -> 'RecipeCost':
+        """The cost of the recipe with every quantity multiplied by `factor`."""
+        return RecipeCost(self.recipe_id, round(self.total * factor, 2), self.unpriced_count)
+
+
+def ingredient_cost(quantity: float, unit: str, price_per_unit: Optional[float],
+                    price_unit: Optional[str], density: float = None,
+                    piece_weight: float = None) -> Optional[float]:
+    """
+    Cost of `quantity` `unit`s of a product priced `price_per_unit` per
+    `price_unit`, or None if it cannot be priced.
+    """
+    return engine.price(quantity, unit, price_per_unit, price_unit, density, piece_weight)
+
+
+class RecipeCostEngine:
+    """
+    Computes recipe costs and keeps them in the recipe_costs table.
+
+    A cost row is computed on first use and stays until a trigger drops
+    it: a change of the price, unit, density or piece weight of a product
+    used by the recipe, or any change to the recipe's ingredients. Reading the costs of every
+    recipe is then a single query, so lists can sort by cost.
+    """
+
+    # Prices come from root_pricing, which holds the current products.
+    _INGREDIENTS_QUERY = """
+    SELECT ri.recipe_id, ri.product_id, ri.quantity, ri.unit
+    FROM recipe_ingredients ri
+    """
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+
+    @catch_errors
+    def get_costs(self, recipe_ids: Iterable[int] = None) -> Dict[int, RecipeCost]:
+        """
+        Returns the cost of the given recipes, or of every recipe. Missing
+        cost rows are computed and stored in one transaction.
+        """
+        if recipe_ids is None:
+            rows = self.db.fetchall("SELECT * FROM recipe_costs")
+            missing = [row['id'] for row in self.db.fetchall(
+                "SELECT r.id FROM recipes r "
+                "LEFT JOIN recipe_costs c ON c.recipe_id = r.id "
+                "WHERE c.recipe_id IS NULL")]
+        else:
+            recipe_ids = list(dict.fromkeys(recipe_ids))
+            rows = self.db.fetchall_in(
+                "SELECT * FROM recipe_costs WHERE recipe_id IN ({placeholders})", recipe_ids)
+            found = {row['recipe_id'] for row in rows}
+            missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in found]
+            if missing:
+                # Unknown ids would otherwise be stored with a cost of 0.
+                existing = {row['id'] for row in self.db.fetchall_in(
+                    "SELECT id FROM recipes WHERE id IN ({placeholders})", missing)}
+                missing = [recipe_id for recipe_id in missing if recipe_id in existing]
+
+        costs = {row['recipe_id']: RecipeCost(row['recipe_id'], row['total_cost'],
+                                              row['unpriced_count'])
+                 for row in rows}
+        if missing:
+            costs.update(self._compute_and_store(missing, every_recipe=recipe_ids is None))
+        return costs
+
+    @catch_errors
+    def get_cost(self, recipe_id: int) -> Optional[RecipeCost]:
+        return self.get_costs([recipe_id]).get(recipe_id)
+
+    @catch_errors
+    def invalidate(self, recipe_ids: List[int] = None):
+        """Drops stored costs; they are recomputed on the next read."""
+        if recipe_ids is None:
+            self.db.execute_query("DELETE FROM recipe_costs")
+        else:
+            self.db.executemany("DELETE FROM recipe_costs WHERE recipe_id = ?",
+                                [(recipe_id,) for recipe_id in recipe_ids])
+
+    def compute(self, recipe_ids: List[int], every_recipe: bool = False) -> Dict[int, RecipeCost]:
+        """Computes costs from the current prices without touching recipe_costs."""
+        costs = {recipe_id: RecipeCost(recipe_id, 0.0) for recipe_id in recipe_ids}
+        if every_recipe:
+            rows = self.db.iter_query(self._INGREDIENTS_QUERY)
+        else:
+            rows = self.db.fetchall_in(
+                self._INGREDIENTS_QUERY + " WHERE ri.recipe_id IN ({placeholders})", recipe_ids)
+        totals = pricing.recipe_totals(row for row in rows if row['recipe_id'] in costs)
+        for recipe_id, (total, unpriced_count) in totals.items():
+            costs[recipe_id] = RecipeCost(recipe_id, round(total, 2), unpriced_count)
+        return costs
+
+    def _compute_and_store(self, recipe_ids: List[int], every_recipe: bool) -> Dict[int, RecipeCost]:
+        with self.db.transaction():
+            costs = self.compute(recipe_ids, every_recipe)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO recipe_costs (recipe_id, total_cost, unpriced_count) "
+                "VALUES (?, ?, ?)",
+                [(cost.recipe_id, cost.total, cost.unpriced_count) for cost in costs.values()])
+        return costs
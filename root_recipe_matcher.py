@@ -0,0 +1,172 @@
+# File: root_recipe_matcher.py --------------------------------------------------------------------
+
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from root_cache import get_entity_cache
+from root_database import DatabaseManager
+from error_handler import catch_errors
+
+
+@dataclass
+class RecipeMatch:
+    recipe_id: int
+    matched: int
+    total: int
+    # Products of the recipe that are not available.
+    missing: Tuple[int, ...] = ()
+
+    @property
+    def coverage(self) -> float:
+        return self.matched / self.total if self.total else 0.0
+
+
+def _insert_sorted(ids: array, value: int):
+    index = bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        ids.insert(index, value)
+
+
+def _remove_sorted(ids: array, value: int):
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+
+
+class RecipeMatcher:
+    """
+    Answers "what can I cook with these products" without loading recipes.
+
+    An in-memory inverted index maps each product id to the sorted array
+    of recipes that use it, and each recipe to the sorted array of its
+    products. A query counts, per recipe, how many of its products are
+    available by walking only the postings of the available products;
+    the rest follows from the recipe's size. The cost grows with the
+    postings touched, not with the number of recipes.
+
+    The index follows the "recipes" entity cache: a recipe invalidated by
+    a local write is re-read on the next query, and a change by another
+    connection rebuilds the index.
+    """
+
+    _INGREDIENTS_QUERY = """
+    SELECT ri.recipe_id, ri.product_id
+    FROM recipe_ingredients ri
+    JOIN recipes r ON r.id = ri.recipe_id
+    """
+
+    def __init__(self):
+        self._postings: Dict[int, array] = {}
+        self._recipes: Dict[int, array] = {}
+        # Recipe ids by number of products, for recipes that share nothing
+        # with the query but are small enough to qualify.
+        self._by_size: Dict[int, Set[int]] = {}
+        self._dirty: Set[int] = set()
+        self._stale = True
+        self._cache = get_entity_cache("recipes")
+        self._cache.add_listener(self._on_invalidate)
+
+    def _on_invalidate(self, recipe_id: Optional[int]):
+        if recipe_id is None:
+            self._stale = True
+        else:
+            self._dirty.add(recipe_id)
+
+    def _sync(self):
+        """Brings the index up to date before a query."""
+        self._cache.validate()
+        db = DatabaseManager.get_instance()
+        if self._stale:
+            self._stale = False
+            self._dirty.clear()
+            self._postings.clear()
+            self._recipes.clear()
+            self._by_size.clear()
+            recipes: Dict[int, List[int]] = {}
+            for row in db.iter_query(self._INGREDIENTS_QUERY):
+                recipes.setdefault(row['recipe_id'], []).append(row['product_id'])
+            for recipe_id, product_ids in recipes.items():
+                self._add(recipe_id, product_ids)
+        elif self._dirty:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            recipes = {recipe_id: [] for recipe_id in dirty}
+            query = self._INGREDIENTS_QUERY + " WHERE ri.recipe_id IN ({placeholders})"
+            for row in db.fetchall_in(query, dirty):
+                recipes[row['recipe_id']].append(row['product_id'])
+            for recipe_id, product_ids in recipes.items():
+                self._remove(recipe_id)
+                self._add(recipe_id, product_ids)
+
+    def _add(self, recipe_id: int, product_ids: Iterable[int]):
+        products = array('q', sorted(set(product_ids)))
+        if not products:
+            return
+        self._recipes[recipe_id] = products
+        self._by_size.setdefault(len(products), set()).add(recipe_id)
+        for product_id in products:
+            postings = self._postings.get(product_id)
+            if postings is None:
+                self._postings[product_id] = array('q', (recipe_id,))
+            else:
+                _insert_sorted(postings, recipe_id)
+
+    def _remove(self, recipe_id: int):
+        products = self._recipes.pop(recipe_id, ())
+        if products:
+            self._by_size[len(products)].discard(recipe_id)
+        for product_id in products:
+            postings = self._postings[product_id]
+            _remove_sorted(postings, recipe_id)
+            if not postings:
+                del self._postings[product_id]
+
+    @catch_errors
+    def rebuild(self):
+        self._stale = True
+        self._sync()
+
+    @catch_errors
+    def match(self, product_ids: Iterable[int], max_missing: int = 0,
+              limit: int = None) -> List[RecipeMatch]:
+        """
+        Recipes missing at most `max_missing` of their products, best
+        coverage first; ties go to fewer missing products, then to larger
+        recipes.
+
+        Parameters:
+            product_ids: The products at hand, e.g. the pantry.
+        """
+        self._sync()
+        available = set(product_ids)
+        counts = Counter()
+        for product_id in available:
+            postings = self._postings.get(product_id)
+            if postings is not None:
+                counts.update(postings)
+        recipes = self._recipes
+        candidates = [(recipe_id, matched, len(recipes[recipe_id]))
+                      for recipe_id, matched in counts.items()
+                      if len(recipes[recipe_id]) - matched <= max_missing]
+        # Recipes sharing no product with `available` can still qualify.
+        for size in range(1, max_missing + 1):
+            candidates.extend((recipe_id, 0, size) for recipe_id in self._by_size.get(size, ())
+                              if recipe_id not in counts)
+        candidates.sort(key=lambda c: (-c[1] / c[2], c[2] - c[1], -c[2], c[0]))
+        if limit is not None:
+            candidates = candidates[:limit]
+        return [RecipeMatch(recipe_id, matched, total,
+                            tuple(p for p in recipes[recipe_id] if p not in available))
+                for recipe_id, matched, total in candidates]
+
+    @catch_errors
+    def cookable(self, product_ids: Iterable[int], limit: int = None) -> List[RecipeMatch]:
+        """Recipes whose every product is available."""
+        return self.match(product_ids, 0, limit)
+
+
+# Shared by the controllers; follows the "recipes" cache of RecipeRepository.
+matcher = RecipeMatcher()
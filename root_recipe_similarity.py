@@ -0,0 +1,167 @@
+# File: root_recipe_similarity.py --------------------------------------------------------------------
+
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence
+
+from root_database import DatabaseManager, SQLITE_MAX_VARIABLES, chunked
+from error_handler import catch_errors
+
+# Signature length and its split into LSH bands. Two recipes share a
+# bucket in some band with probability 1 - (1 - J^ROWS)^BANDS for a
+# Jaccard similarity J: about 0.95 at J = 0.3 and 0.27 at J = 0.1.
+NUM_HASHES = 64
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+
+_PRIME = (1 << 61) - 1
+# Fixed so that stored signatures stay comparable between runs.
+_SEED = 0x5EED
+_rng = random.Random(_SEED)
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_HASHES)]
+_BAND_MIX = _rng.randrange(1, _PRIME)
+# Hash values of each product seen so far, NUM_HASHES per product.
+_product_hashes: Dict[int, array] = {}
+
+
+@dataclass
+class SimilarRecipe:
+    recipe_id: int
+    # Estimated Jaccard similarity of the two recipes' product sets.
+    similarity: float
+
+
+def minhash_signature(product_ids: Iterable[int]) -> array:
+    """
+    MinHash signature of a set of product ids, empty for an empty set.
+    The hash values of a product are computed once, so a signature is an
+    element-wise min over the products' hash vectors.
+    """
+    vectors = []
+    for product_id in set(product_ids):
+        vector = _product_hashes.get(product_id)
+        if vector is None:
+            vector = array('q', [(a * product_id + b) % _PRIME for a, b in _HASH_PARAMS])
+            _product_hashes[product_id] = vector
+        vectors.append(vector)
+    if not vectors:
+        return array('q')
+    return array('q', map(min, *vectors)) if len(vectors) > 1 else array('q', vectors[0])
+
+
+def lsh_buckets(signature: Sequence[int]) -> List[int]:
+    """The bucket of each band of `signature`."""
+    buckets = []
+    for start in range(0, len(signature), ROWS):
+        bucket = 0
+        for value in signature[start:start + ROWS]:
+            bucket = (bucket * _BAND_MIX + value) % _PRIME
+        buckets.append(bucket)
+    return buckets
+
+
+def estimate_similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class RecipeSimilarity:
+    """
+    Similar recipes by the products they use.
+
+    Every recipe has a MinHash signature of its product ids in
+    recipe_signatures and one row per band in recipe_lsh_buckets. Triggers
+    mark a signature stale when the recipe's products change; refresh()
+    recomputes the stale ones only. A lookup reads the recipes sharing a
+    bucket with the given one through the bucket index and ranks just
+    those by their signatures, so the cost follows the number of
+    candidates instead of comparing against every recipe.
+    """
+
+    _CANDIDATES_QUERY = """
+    SELECT b.recipe_id
+    FROM recipe_lsh_buckets q
+    JOIN recipe_lsh_buckets b ON b.band = q.band AND b.bucket = q.bucket
+    WHERE q.recipe_id = ? AND b.recipe_id != q.recipe_id
+    GROUP BY b.recipe_id
+    """
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+
+    @catch_errors
+    def refresh(self) -> int:
+        """Recomputes the stale signatures and returns their number."""
+        stale = [row['recipe_id'] for row in self.db.fetchall(
+            "SELECT recipe_id FROM recipe_signatures WHERE signature IS NULL")]
+        if not stale:
+            return 0
+        products = {recipe_id: [] for recipe_id in stale}
+        for row in self.db.fetchall_in(
+                "SELECT recipe_id, product_id FROM recipe_ingredients "
+                "WHERE recipe_id IN ({placeholders})", stale):
+            products[row['recipe_id']].append(row['product_id'])
+
+        signatures = []
+        buckets = []
+        for recipe_id, product_ids in products.items():
+            signature = minhash_signature(product_ids)
+            signatures.append((signature.tobytes(), recipe_id))
+            buckets.extend((band, bucket, recipe_id)
+                           for band, bucket in enumerate(lsh_buckets(signature)))
+        with self.db.transaction():
+            for chunk in chunked(stale, SQLITE_MAX_VARIABLES):
+                placeholders = ", ".join("?" * len(chunk))
+                self.db.execute_query(
+                    f"DELETE FROM recipe_lsh_buckets WHERE recipe_id IN ({placeholders})",
+                    tuple(chunk))
+            self.db.executemany(
+                "UPDATE recipe_signatures SET signature = ? WHERE recipe_id = ?", signatures)
+            self.db.executemany(
+                "INSERT OR IGNORE INTO recipe_lsh_buckets (band, bucket, recipe_id) VALUES (?, ?, ?)",
+                buckets)
+        return len(stale)
+
+    @catch_errors
+    def rebuild(self) -> int:
+        """Recomputes every signature, e.g. after NUM_HASHES or BANDS change."""
+        with self.db.transaction():
+            self.db.execute_query("DELETE FROM recipe_lsh_buckets")
+            self.db.execute_query("DELETE FROM recipe_signatures")
+            self.db.execute_query("INSERT INTO recipe_signatures (recipe_id) SELECT id FROM recipes")
+            return self.refresh()
+
+    def _signatures(self, recipe_ids: List[int]) -> Dict[int, array]:
+        signatures = {}
+        for row in self.db.fetchall_in(
+                "SELECT recipe_id, signature FROM recipe_signatures WHERE recipe_id IN ({placeholders})",
+                recipe_ids):
+            signature = array('q')
+            signature.frombytes(row['signature'] or b"")
+            signatures[row['recipe_id']] = signature
+        return signatures
+
+    @catch_errors
+    def similar(self, recipe_id: int, k: int = 5, min_similarity: float = 0.1) -> List[SimilarRecipe]:
+        """
+        Up to `k` recipes most similar to `recipe_id`, most similar first.
+
+        Parameters:
+            min_similarity: Leaves out weaker matches, which LSH finds only
+                by chance anyway.
+        """
+        self.refresh()
+        signature = self._signatures([recipe_id]).get(recipe_id)
+        if not signature:
+            return []
+        candidates = [row['recipe_id'] for row in self.db.fetchall(self._CANDIDATES_QUERY, (recipe_id,))]
+        scored = []
+        for candidate_id, candidate in self._signatures(candidates).items():
+            similarity = estimate_similarity(signature, candidate)
+            if similarity >= min_similarity:
+                scored.append(SimilarRecipe(candidate_id, round(similarity, 3)))
+        scored.sort(key=lambda s: (-s.similarity, s.recipe_id))
+        return scored[:k]
@@ -1,53 +1,187 @@
 # File: root_repositories.py --------------------------------------------------------------------
 
-from root_database import DatabaseManager
-from root_models import Recipe, Product, RecipeIngredient, ShoppingList, ShoppingListItem, ErrorLog
-from typing import List, Dict
+from copy import copy
+from dataclasses import replace
+from datetime import datetime
+from root_database import DatabaseManager, FETCH_BATCH_SIZE, SQLITE_MAX_VARIABLES, chunked
+from root_models import (Recipe, Product, RecipeIngredient, ShoppingList, ShoppingListItem,
+                         PricePoint, ErrorLog)
+from root_cache import get_entity_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 from error_handler import catch_errors
 
+RECIPE_CACHE_SIZE = 512
+PRODUCT_CACHE_SIZE = 4096
+
+
+def normalize_name(name: str) -> str:
+    """Case- and whitespace-insensitive key used to match products and recipes by name."""
+    return " ".join(str(name).split()).casefold()
+
+
+def _copy_recipe(recipe: Recipe) -> Recipe:
+    """Returns a copy of a cached recipe so callers can mutate it freely."""
+    return replace(recipe, ingredients=[copy(ing) for ing in recipe.ingredients])
+
+
+def _product_from_row(row) -> Product:
+    return Product(
+        id=row['id'],
+        name=row['name'],
+        unit=row['unit'],
+        price_per_unit=row['price_per_unit'],
+        category=row['category'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        density=row['density'],
+        piece_weight=row['piece_weight']
+    )
+
+
+def _recipe_from_row(row, ingredients: List[RecipeIngredient]) -> Recipe:
+    return Recipe(
+        id=row['id'],
+        name=row['name'],
+        instructions=row['instructions'],
+        tags=row['tags'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+        ingredients=ingredients,
+        servings=row['servings']
+    )
+
+
+def _shopping_list_item_from_row(row) -> ShoppingListItem:
+    return ShoppingListItem(
+        id=row['id'],
+        shopping_list_id=row['shopping_list_id'],
+        product_id=row['product_id'],
+        quantity=row['quantity'],
+        unit=row['unit'],
+        is_purchased=row['is_purchased'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+    )
+
+
+def _price_point_from_row(row) -> PricePoint:
+    return PricePoint(
+        id=row['id'],
+        product_id=row['product_id'],
+        price_per_unit=row['price_per_unit'],
+        unit=row['unit'],
+        valid_from=row['valid_from'],
+        valid_to=row['valid_to']
+    )
+
+
+def _timestamp(when: Union[datetime, str]) -> str:
+    """Formats `when` like the database timestamps (UTC, as CURRENT_TIMESTAMP)."""
+    if isinstance(when, datetime):
+        return when.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return str(when)
+
+
+def _ingredient_from_row(row) -> RecipeIngredient:
+    return RecipeIngredient(
+        id=row['id'],
+        recipe_id=row['recipe_id'],
+        product_id=row['product_id'],
+        quantity=row['quantity'],
+        unit=row['unit'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at']
+    )
+
 
 class RecipeRepository:
     @catch_errors
     def __init__(self):
         self.db = DatabaseManager.get_instance()
+        self.cache = get_entity_cache("recipes", maxsize=RECIPE_CACHE_SIZE)
+        # {recipe_id: {servings: (ScaledIngredient, ...)}}, see RecipeController.
+        self.scaled_cache = get_entity_cache("scaled_ingredients", maxsize=RECIPE_CACHE_SIZE)
+
+    def _invalidate(self, recipe_id: int):
+        self.cache.invalidate(recipe_id)
+        self.scaled_cache.invalidate(recipe_id)
 
     @catch_errors
     def get_recipe_by_id(self, recipe_id: int) -> Recipe:
+        recipe = self.cache.get(recipe_id)
+        if recipe is not None:
+            return _copy_recipe(recipe)
         query = "SELECT * FROM recipes WHERE id = ?"
         row = self.db.fetchone(query, (recipe_id,))
         if row:
-            recipe = Recipe(
-                id=row['id'],
-                name=row['name'],
-                instructions=row['instructions'],
-                tags=row['tags'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                ingredients=self.get_ingredients_by_recipe_id(recipe_id)
-            )
-            return recipe
+            recipe = _recipe_from_row(
+                row, self.get_ingredients_by_recipe_id(recipe_id))
+            self.cache.put(recipe_id, recipe)
+            return _copy_recipe(recipe)
         return None
 
+    @catch_errors
+    def get_recipes_by_ids(self, recipe_ids: List[int]) -> Dict[int, Recipe]:
+        """
+        Fetches several recipes with their ingredients using chunked IN queries.
+        Ids that do not exist are left out of the result; the order of
+        `recipe_ids` is preserved.
+        """
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        found, missing = self.cache.get_many(recipe_ids)
+        if missing:
+            rows = self.db.fetchall_in(
+                "SELECT * FROM recipes WHERE id IN ({placeholders})", missing)
+            ingredients = self.get_ingredients_by_recipe_ids(
+                [row['id'] for row in rows])
+            for row in rows:
+                recipe = _recipe_from_row(row, ingredients.get(row['id'], []))
+                self.cache.put(recipe.id, recipe)
+                found[recipe.id] = recipe
+        return {recipe_id: _copy_recipe(found[recipe_id])
+                for recipe_id in recipe_ids if recipe_id in found}
+
+    @catch_errors
+    def get_recipes_by_name(self, name: str) -> List[Recipe]:
+        """Returns the recipes named `name`, ignoring ASCII case, oldest first."""
+        query = "SELECT id FROM recipes WHERE name = ? COLLATE NOCASE ORDER BY id"
+        recipe_ids = [row['id'] for row in self.db.fetchall(query, (name.strip(),))]
+        return list(self.get_recipes_by_ids(recipe_ids).values())
+
     @catch_errors
     def get_all_recipes(self) -> Dict[int, Recipe]:
-        query = "SELECT * FROM recipes"
-        rows = self.db.fetchall(query)
-        recipes = []
-        for row in rows:
-            recipe = Recipe(
-                id=row['id'],
-                name=row['name'],
-                instructions=row['instructions'],
-                tags=row['tags'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                ingredients=self.get_ingredients_by_recipe_id(row['id'])
-            )
-            recipes.append(recipe)
+        ingredients: Dict[int, List[RecipeIngredient]] = {}
+        for ing_row in self.db.iter_query("SELECT * FROM recipe_ingredients"):
+            ingredients.setdefault(ing_row['recipe_id'], []).append(
+                _ingredient_from_row(ing_row))
         recipes_dict: Dict[int, Recipe] = {
-            recipe.id: recipe for recipe in recipes}
+            row['id']: _recipe_from_row(row, ingredients.get(row['id'], []))
+            for row in self.db.iter_query("SELECT * FROM recipes")}
         return recipes_dict
 
+    @catch_errors
+    def iter_recipes(self, batch_size: int = FETCH_BATCH_SIZE,
+                     with_ingredients: bool = True) -> Iterator[Recipe]:
+        """
+        Streams all recipes ordered by id. Ingredients are loaded with one
+        query per batch, so memory use is bounded by `batch_size`.
+        """
+        query = "SELECT * FROM recipes ORDER BY id"
+        for rows in self.db.iter_batches(query, batch_size=batch_size):
+            ingredients = {}
+            if with_ingredients:
+                ingredients = self.get_ingredients_by_recipe_ids(
+                    [row['id'] for row in rows])
+            for row in rows:
+                yield _recipe_from_row(row, ingredients.get(row['id'], []))
+
+    @catch_errors
+    def iter_recipe_ingredients(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[RecipeIngredient]:
+        """Streams every row of recipe_ingredients ordered by recipe."""
+        query = "SELECT * FROM recipe_ingredients ORDER BY recipe_id"
+        for row in self.db.iter_query(query, batch_size=batch_size):
+            yield _ingredient_from_row(row)
+
     @catch_errors
     def get_all_tags(self) -> List[str]:
         query = "SELECT tags FROM recipes"
@@ -78,14 +212,24 @@ class RecipeRepository:
             ingredients.append(ingredient)
         return ingredients
 
+    @catch_errors
+    def get_ingredients_by_recipe_ids(self, recipe_ids: List[int]) -> Dict[int, List[RecipeIngredient]]:
+        """Returns the ingredients of several recipes, grouped by recipe id."""
+        query = "SELECT * FROM recipe_ingredients WHERE recipe_id IN ({placeholders})"
+        ingredients: Dict[int, List[RecipeIngredient]] = {}
+        for row in self.db.fetchall_in(query, recipe_ids):
+            ingredients.setdefault(row['recipe_id'], []).append(
+                _ingredient_from_row(row))
+        return ingredients
+
     @catch_errors
     def add_recipe(self, recipe: Recipe) -> int:
         query = """
-        INSERT INTO recipes (name, instructions, tags)
-        VALUES (?, ?, ?)
+        INSERT INTO recipes (name, instructions, tags, servings)
+        VALUES (?, ?, ?, ?)
         """
         cursor = self.db.execute_query(
-            query, (recipe.name, recipe.instructions, recipe.tags))
+            query, (recipe.name, recipe.instructions, recipe.tags, recipe.servings))
         recipe_id = cursor.lastrowid
         return recipe_id
 
@@ -99,15 +243,40 @@ class RecipeRepository:
             query, (recipe_id, ingredient.product_id,
                     ingredient.quantity, ingredient.unit)
         )
+        self._invalidate(recipe_id)
+
+    @catch_errors
+    def add_recipe_ingredients(self, recipe_id: int, ingredients: List[RecipeIngredient]):
+        """Inserts all ingredients of a recipe with a single executemany."""
+        self.insert_recipe_ingredients_many(
+            [(recipe_id, ing.product_id, ing.quantity, ing.unit) for ing in ingredients])
+
+    @catch_errors
+    def insert_recipe_ingredients_many(self, rows: List[tuple]):
+        """
+        Inserts ingredients of any number of recipes with a single executemany.
+
+        Parameters:
+            rows (List[tuple]): (recipe_id, product_id, quantity, unit) tuples.
+        """
+        query = """
+        INSERT INTO recipe_ingredients (recipe_id, product_id, quantity, unit)
+        VALUES (?, ?, ?, ?)
+        """
+        self.db.executemany(query, rows)
+        for recipe_id in {row[0] for row in rows}:
+            self._invalidate(recipe_id)
 
     @catch_errors
     def remove_ingredients_from_recipe(self, recipe_id: int):
         query = "DELETE FROM recipe_ingredients WHERE recipe_id = ?"
         self.db.execute_query(query, (recipe_id,))
+        self._invalidate(recipe_id)
 
     def delete_recipe(self, recipe_id: int):
         query = "DELETE FROM recipes WHERE id = ?"
         self.db.execute_query(query, (recipe_id,))
+        self._invalidate(recipe_id)
 
     def update_recipe(self, recipe_id: int, recipe: Recipe):
         query = """
@@ -115,56 +284,127 @@ class RecipeRepository:
         SET name = ?,
             instructions = ?,
             tags = ?,
+            servings = ?,
             updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
         """
         self.db.execute_query(
-            query, (recipe.name, recipe.instructions, recipe.tags, recipe_id))
+            query, (recipe.name, recipe.instructions, recipe.tags, recipe.servings, recipe_id))
+        self._invalidate(recipe_id)
 
 
 class ProductRepository:
     @catch_errors
     def __init__(self):
         self.db = DatabaseManager.get_instance()
+        self.cache = get_entity_cache("products", maxsize=PRODUCT_CACHE_SIZE)
+        # Holds the full product listing under a single key.
+        self.snapshot_cache = get_entity_cache("product_snapshots", maxsize=1)
 
     @catch_errors
     def get_all_products(self) -> Dict[int, Product]:
-        query = "SELECT * FROM products"
-        rows = self.db.fetchall(query)
-        products = []
-        for row in rows:
-            product = Product(
-                id=row['id'],
-                name=row['name'],
-                unit=row['unit'],
-                price_per_unit=row['price_per_unit'],
-                category=row['category'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            products.append(product)
+        products_dict = self.snapshot_cache.get("all")
+        if products_dict is None:
+            products_dict = {
+                product.id: product for product in self.iter_products()}
+            self.snapshot_cache.put("all", products_dict)
+        return {product_id: copy(product) for product_id, product in products_dict.items()}
 
-        products_dict: Dict[int, Product] = {
-            product.id: product for product in products}
-        return products_dict
+    @catch_errors
+    def iter_products(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[Product]:
+        """Streams all products ordered by id without building a list."""
+        query = "SELECT * FROM products ORDER BY id"
+        for row in self.db.iter_query(query, batch_size=batch_size):
+            yield _product_from_row(row)
 
     @catch_errors
     def get_product_by_id(self, product_id: int) -> Product:
+        product = self.cache.get(product_id)
+        if product is not None:
+            return copy(product)
         query = "SELECT * FROM products WHERE id = ?"
         row = self.db.fetchone(query, (product_id,))
         if row:
-            product = Product(
-                id=row['id'],
-                name=row['name'],
-                unit=row['unit'],
-                price_per_unit=row['price_per_unit'],
-                category=row['category'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            return product
+            product = _product_from_row(row)
+            self.cache.put(product_id, product)
+            return copy(product)
         return None
 
+    @catch_errors
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[int, Product]:
+        """
+        Fetches several products using chunked IN queries.
+        Ids that do not exist are left out of the result; the order of
+        `product_ids` is preserved.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        found, missing = self.cache.get_many(product_ids)
+        if missing:
+            rows = self.db.fetchall_in(
+                "SELECT * FROM products WHERE id IN ({placeholders})", missing)
+            for row in rows:
+                product = _product_from_row(row)
+                self.cache.put(product.id, product)
+                found[product.id] = product
+        return {product_id: copy(found[product_id])
+                for product_id in product_ids if product_id in found}
+
+    @catch_errors
+    def get_products_by_name(self, name: str) -> List[Product]:
+        """Returns the products named `name`, ignoring ASCII case, oldest first."""
+        query = "SELECT * FROM products WHERE name = ? COLLATE NOCASE ORDER BY id"
+        return [_product_from_row(row) for row in self.db.fetchall(query, (name.strip(),))]
+
+    @catch_errors
+    def get_product_ids_by_normalized_name(self) -> Dict[str, int]:
+        """
+        Maps normalize_name(product.name) to the product id for every product.
+        When several products share a name the oldest one wins.
+        """
+        ids: Dict[str, int] = {}
+        query = "SELECT id, name FROM products ORDER BY id"
+        for row in self.db.iter_query(query):
+            ids.setdefault(normalize_name(row['name']), row['id'])
+        return ids
+
+    @catch_errors
+    def insert_products_many(self, rows: List[tuple]):
+        """
+        Inserts products with a single executemany.
+
+        Parameters:
+            rows (List[tuple]): (name, unit, price_per_unit, category, density,
+                piece_weight) tuples.
+        """
+        query = """
+        INSERT INTO products (name, unit, price_per_unit, category, density, piece_weight)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """
+        self.db.executemany(query, rows)
+        self.snapshot_cache.clear()
+
+    @catch_errors
+    def update_products_many(self, rows: List[tuple]):
+        """
+        Updates product prices with a single executemany. Names are left as
+        stored; a NULL category, density or piece weight keeps the stored one.
+
+        Parameters:
+            rows (List[tuple]): (unit, price_per_unit, category, density,
+                piece_weight, product_id) tuples.
+        """
+        query = """
+        UPDATE products
+        SET unit = ?, price_per_unit = ?,
+            category = COALESCE(?, category), density = COALESCE(?, density),
+            piece_weight = COALESCE(?, piece_weight), updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """
+        self.db.executemany(query, rows)
+        for row in rows:
+            self.cache.invalidate(row[-1])
+        self.snapshot_cache.clear()
+
     @catch_errors
     def get_all_categories(self) -> List[str]:
         query = "SELECT category FROM products"
@@ -185,6 +425,7 @@ class ProductRepository:
                 shopping_list_id=row['shopping_list_id'],
                 product_id=row['product_id'],
                 quantity=row['quantity'],
+                unit=row['unit'],
                 is_purchased=row['is_purchased'],
                 created_at=row['created_at'],
                 updated_at=row['updated_at']
@@ -195,26 +436,177 @@ class ProductRepository:
     @catch_errors
     def add_product(self, product: Product):
         query = """
-        INSERT INTO products (name, unit, price_per_unit, category)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO products (name, unit, price_per_unit, category, density, piece_weight)
+        VALUES (?, ?, ?, ?, ?, ?)
         """
         self.db.execute_query(query, (product.name, product.unit,
-                                      product.price_per_unit, product.category))
+                                      product.price_per_unit, product.category,
+                                      product.density, product.piece_weight))
+        self.snapshot_cache.clear()
 
     @catch_errors
     def update_product(self, product_id: int, product: Product):
         query = """
         UPDATE products
-        SET name = ?, unit = ?, price_per_unit = ?, category = ?
+        SET name = ?, unit = ?, price_per_unit = ?, category = ?,
+            density = ?, piece_weight = ?
         WHERE id = ?
         """
         self.db.execute_query(query, (product.name, product.unit,
-                                      product.price_per_unit, product.category, product_id))
+                                      product.price_per_unit, product.category,
+                                      product.density, product.piece_weight, product_id))
+        self.cache.invalidate(product_id)
+        self.snapshot_cache.clear()
 
     @catch_errors
     def delete_product(self, product_id: int):
         query = "DELETE FROM products WHERE id = ?"
         self.db.execute_query(query, (product_id,))
+        self.cache.invalidate(product_id)
+        self.snapshot_cache.clear()
+
+
+class PriceHistoryRepository:
+    """
+    Reads the product_prices history kept by the trg_product_prices_*
+    triggers. Rows are never updated by the app except by compact().
+    """
+
+    # The newest price of a product that started at or before the bound time.
+    _AS_OF = """
+    SELECT p2.id FROM product_prices p2
+    WHERE p2.product_id = {product_id} AND p2.valid_from <= {when}
+    ORDER BY p2.valid_from DESC, p2.id DESC
+    LIMIT 1
+    """
+
+    @catch_errors
+    def __init__(self):
+        self.db = DatabaseManager.get_instance()
+
+    @catch_errors
+    def get_price_history(self, product_id: int) -> List[PricePoint]:
+        """Returns every price the product has had, oldest first."""
+        query = """
+        SELECT * FROM product_prices WHERE product_id = ?
+        ORDER BY valid_from, id
+        """
+        return [_price_point_from_row(row) for row in self.db.fetchall(query, (product_id,))]
+
+    @catch_errors
+    def get_price_at(self, product_id: int, when: Union[datetime, str]) -> Optional[PricePoint]:
+        """Returns the price in effect at `when`, or None if the product had none yet."""
+        query = "SELECT * FROM product_prices WHERE id = ({})".format(
+            self._AS_OF.format(product_id="?", when="?"))
+        row = self.db.fetchone(query, (product_id, _timestamp(when)))
+        return _price_point_from_row(row) if row else None
+
+    @catch_errors
+    def get_prices_at(self, product_ids: List[int], when: Union[datetime, str]) -> Dict[int, PricePoint]:
+        """Returns the prices in effect at `when` of several products, by product id."""
+        # The time is bound before the chunk values, so its condition comes first.
+        query = """
+        SELECT pp.* FROM product_prices pp
+        WHERE pp.id = (%s) AND pp.product_id IN ({placeholders})
+        """ % self._AS_OF.format(product_id="pp.product_id", when="?")
+        rows = self.db.fetchall_in(
+            query, list(dict.fromkeys(product_ids)), params=(_timestamp(when),))
+        return {row['product_id']: _price_point_from_row(row) for row in rows}
+
+    @catch_errors
+    def get_purchase_prices(self, shopping_list_id: int) -> Dict[int, PricePoint]:
+        """
+        Prices the purchased items of a list as they were when bought: an
+        item's updated_at is the time it was marked purchased. Returns the
+        prices by item id; items bought before the product's first recorded
+        price are left out.
+        """
+        query = """
+        SELECT i.id AS item_id, pp.*
+        FROM shopping_list_items i
+        JOIN product_prices pp ON pp.id = (%s)
+        WHERE i.shopping_list_id = ? AND i.is_purchased = 1
+        """ % self._AS_OF.format(product_id="i.product_id", when="i.updated_at")
+        return {row['item_id']: _price_point_from_row(row)
+                for row in self.db.fetchall(query, (shopping_list_id,))}
+
+    @catch_errors
+    def compact(self, min_duration_s: float = 0.0) -> int:
+        """
+        Removes redundant history rows and returns how many were removed.
+
+        - consecutive rows with the same price and unit become one row
+        - closed rows valid for less than `min_duration_s` seconds (e.g. a
+          typo fixed right away) are dropped; their time goes to the
+          previous row, or to the next one for a product's first row
+        - a short row is kept if the product was bought while it was valid
+          (purchase_log or a purchased item's updated_at), since purchases
+          are priced as of their time
+
+        The history is streamed once in (product_id, valid_from) order.
+        """
+        bought = self._short_rows_with_purchases(min_duration_s) if min_duration_s else set()
+        deletes: List[tuple] = []
+        updates: Dict[int, list] = {}
+        kept: List[list] = []  # [id, price, unit, valid_from, valid_to] of the current product
+        pending_start = None
+        product_id = None
+
+        def short(row) -> bool:
+            if not min_duration_s or row['valid_to'] is None or row['id'] in bought:
+                return False
+            duration = (datetime.fromisoformat(row['valid_to'])
+                        - datetime.fromisoformat(row['valid_from'])).total_seconds()
+            return duration < min_duration_s
+
+        query = "SELECT * FROM product_prices ORDER BY product_id, valid_from, id"
+        for row in self.db.iter_query(query):
+            if row['product_id'] != product_id:
+                product_id = row['product_id']
+                kept = []
+                pending_start = None
+            if short(row):
+                deletes.append((row['id'],))
+                if kept:
+                    kept[-1][4] = row['valid_to']
+                    updates[kept[-1][0]] = kept[-1]
+                elif pending_start is None:
+                    pending_start = row['valid_from']
+                continue
+            if kept and kept[-1][1] == row['price_per_unit'] and kept[-1][2] == row['unit']:
+                deletes.append((row['id'],))
+                kept[-1][4] = row['valid_to']
+                updates[kept[-1][0]] = kept[-1]
+                continue
+            entry = [row['id'], row['price_per_unit'], row['unit'], row['valid_from'], row['valid_to']]
+            if pending_start is not None:
+                entry[3] = pending_start
+                pending_start = None
+                updates[entry[0]] = entry
+            kept.append(entry)
+
+        if deletes or updates:
+            with self.db.transaction():
+                self.db.executemany("DELETE FROM product_prices WHERE id = ?", deletes)
+                self.db.executemany(
+                    "UPDATE product_prices SET valid_from = ?, valid_to = ? WHERE id = ?",
+                    [(entry[3], entry[4], entry[0]) for entry in updates.values()])
+        return len(deletes)
+
+    def _short_rows_with_purchases(self, min_duration_s: float) -> Set[int]:
+        """Ids of the closed rows shorter than `min_duration_s` that a purchase falls into."""
+        query = """
+        SELECT pp.id FROM purchase_log l
+        JOIN product_prices pp ON pp.product_id = l.product_id
+            AND pp.valid_from <= l.purchased_at AND l.purchased_at < pp.valid_to
+        WHERE (julianday(pp.valid_to) - julianday(pp.valid_from)) * 86400 < ?
+        UNION
+        SELECT pp.id FROM product_prices pp
+        JOIN shopping_list_items i ON i.product_id = pp.product_id AND i.is_purchased = 1
+            AND pp.valid_from <= i.updated_at AND i.updated_at < pp.valid_to
+        WHERE (julianday(pp.valid_to) - julianday(pp.valid_from)) * 86400 < ?
+        """
+        return {row['id'] for row in self.db.fetchall(query, (min_duration_s, min_duration_s))}
 
 
 class ShoppingListRepository:
@@ -225,6 +617,7 @@ class ShoppingListRepository:
 
     @catch_errors
     def get_all_shopping_lists(self) -> Dict[int, ShoppingList]:
+        """Returns every shopping list with its items, using one query for all items."""
         query = "SELECT * FROM shopping_lists"
         rows = self.db.fetchall(query)
 
@@ -232,44 +625,58 @@ class ShoppingListRepository:
             print("No shopping lists found!")
             return {}
 
-        shopping_lists = []
+        items: Dict[int, List[ShoppingListItem]] = {}
+        items_query = "SELECT * FROM shopping_list_items ORDER BY shopping_list_id, id"
+        for item_row in self.db.iter_query(items_query):
+            items.setdefault(item_row['shopping_list_id'], []).append(
+                _shopping_list_item_from_row(item_row))
 
+        shopping_lists_dict: Dict[int, ShoppingList] = {}
         for row in rows:
-            # Fetch items for this shopping list including the unit column.
-            items_query = "SELECT * FROM shopping_list_items WHERE shopping_list_id = ?"
-            items_rows = self.db.fetchall(items_query, (row['id'],))
-
-            items = [
-                ShoppingListItem(
-                    id=item_row['id'],
-                    shopping_list_id=item_row['shopping_list_id'],
-                    product_id=item_row['product_id'],
-                    quantity=item_row['quantity'],
-                    unit=item_row['unit'],  # NEW: include unit from the row
-                    is_purchased=item_row['is_purchased'],
-                    created_at=item_row['created_at'],
-                    updated_at=item_row['updated_at'],
-                ) for item_row in items_rows
-            ]
-
-            # Create the ShoppingList object with the items
-            shopping_list = ShoppingList(
+            shopping_lists_dict[row['id']] = ShoppingList(
                 id=row['id'],
                 title=row['title'],
                 total_sum=row['total_sum'],
                 purchased_count=row['purchased_count'],
                 created_at=row['created_at'],
                 updated_at=row['updated_at'],
-                items=items  # Include the items here
+                items=items.get(row['id'], [])
             )
-            shopping_lists.append(shopping_list)
-
-        # Convert to a dictionary with the ID as the key
-        shopping_lists_dict: Dict[int, ShoppingList] = {
-            shopping_list.id: shopping_list for shopping_list in shopping_lists
-        }
         return shopping_lists_dict
 
+    @catch_errors
+    def iter_shopping_lists(self, batch_size: int = FETCH_BATCH_SIZE,
+                            with_items: bool = True) -> Iterator[ShoppingList]:
+        """
+        Streams all shopping lists ordered by id. Items are loaded with one
+        query per batch of lists, so memory use is bounded by `batch_size`.
+        """
+        query = "SELECT * FROM shopping_lists ORDER BY id"
+        items_query = "SELECT * FROM shopping_list_items WHERE shopping_list_id IN ({placeholders})"
+        for rows in self.db.iter_batches(query, batch_size=batch_size):
+            items: Dict[int, List[ShoppingListItem]] = {}
+            if with_items:
+                for item_row in self.db.fetchall_in(items_query, [row['id'] for row in rows]):
+                    items.setdefault(item_row['shopping_list_id'], []).append(
+                        _shopping_list_item_from_row(item_row))
+            for row in rows:
+                yield ShoppingList(
+                    id=row['id'],
+                    title=row['title'],
+                    total_sum=row['total_sum'],
+                    purchased_count=row['purchased_count'],
+                    created_at=row['created_at'],
+                    updated_at=row['updated_at'],
+                    items=items.get(row['id'], [])
+                )
+
+    @catch_errors
+    def iter_shopping_list_items(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[ShoppingListItem]:
+        """Streams every shopping list item ordered by shopping list."""
+        query = "SELECT * FROM shopping_list_items ORDER BY shopping_list_id"
+        for row in self.db.iter_query(query, batch_size=batch_size):
+            yield _shopping_list_item_from_row(row)
+
     @catch_errors
     def get_shopping_list_by_id(self, shopping_list_id: int) -> ShoppingList:
         query = "SELECT * FROM shopping_lists WHERE id = ?"
@@ -301,37 +708,82 @@ class ShoppingListRepository:
 
     @catch_errors
     def add_shopping_list_items(self, shopping_list_id: int, items: List[ShoppingListItem]):
-        for item in items:
-            print(
-                f"Attempting to insert item with values: shopping_list_id={shopping_list_id}, "
-                f"product_id={item.product_id}, quantity={item.quantity}, "
-                f"unit={item.unit}, is_purchased={item.is_purchased}")
-            try:
-                query = """
-                INSERT INTO shopping_list_items 
-                (shopping_list_id, product_id, quantity, unit, is_purchased, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                """
-                self.db.execute_query(
-                    query, (item.shopping_list_id, item.product_id,
-                            item.quantity, item.unit, item.is_purchased)
-                )
-            except Exception as e:
-                print(f"Error inserting item: {item}, Error: {e}")
+        """
+        Inserts the items with a single executemany. A failing row raises, so
+        an enclosing transaction rolls back as a whole.
+        """
+        query = """
+        INSERT INTO shopping_list_items
+        (shopping_list_id, product_id, quantity, unit, is_purchased, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """
+        self.db.executemany(
+            query, [(shopping_list_id, item.product_id, item.quantity, item.unit, item.is_purchased)
+                    for item in items])
 
     @catch_errors
-    def update_shopping_list(self, shopping_list_id: int, shopping_list: ShoppingList):
+    def update_shopping_list(self, shopping_list_id: int,
+                             shopping_list: ShoppingList) -> Tuple[List[int], List[int]]:
+        """
+        Updates the title and total and makes the items match shopping_list.items.
+
+        Items are upserted by product, so unchanged ones keep their id and
+        updated_at (their purchase time) and the purchase log triggers fire
+        only for real changes. Items no longer on the list are deleted.
+        purchased_count is left to the triggers.
+
+        Returns:
+            (ticked, unticked): the ids of the items that became purchased
+            and unpurchased. The caller moves them into or out of the pantry
+            and undoes the purchases of the unticked ones.
+        """
         query = """
         UPDATE shopping_lists
-        SET title = ?, total_sum = ?, purchased_count = ?
+        SET title = ?, total_sum = ?, updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
         """
-        self.db.execute_query(query, (shopping_list.title, shopping_list.total_sum,
-                                      shopping_list.purchased_count, shopping_list_id))
-        self.db.execute_query(
-            "DELETE FROM shopping_list_items WHERE shopping_list_id = ?", (shopping_list_id,))
-        for item in shopping_list.items:
-            self.add_shopping_list_items(shopping_list_id, item)
+        upsert = """
+        INSERT INTO shopping_list_items (shopping_list_id, product_id, quantity, unit, is_purchased)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(shopping_list_id, product_id) DO UPDATE SET
+            quantity = excluded.quantity, unit = excluded.unit,
+            is_purchased = excluded.is_purchased, updated_at = CURRENT_TIMESTAMP
+        WHERE quantity IS NOT excluded.quantity OR unit IS NOT excluded.unit
+            OR is_purchased IS NOT excluded.is_purchased
+        """
+        purchased = {item.product_id: bool(item.is_purchased) for item in shopping_list.items}
+        with self.db.transaction():
+            self.db.execute_query(
+                query, (shopping_list.title, shopping_list.total_sum, shopping_list_id))
+            removed = []
+            ticked = []
+            unticked = []
+            # Products bought with this save that are not on the list yet.
+            new_purchased = {product_id for product_id, is_purchased in purchased.items()
+                             if is_purchased}
+            for row in self.db.fetchall(
+                    "SELECT id, product_id, is_purchased FROM shopping_list_items "
+                    "WHERE shopping_list_id = ?", (shopping_list_id,)):
+                new_purchased.discard(row['product_id'])
+                if row['product_id'] not in purchased:
+                    removed.append(row['id'])
+                elif row['is_purchased'] and not purchased[row['product_id']]:
+                    unticked.append(row['id'])
+                elif not row['is_purchased'] and purchased[row['product_id']]:
+                    ticked.append(row['id'])
+            for chunk in chunked(removed, SQLITE_MAX_VARIABLES):
+                self.db.execute_query(
+                    "DELETE FROM shopping_list_items WHERE id IN ({})".format(
+                        ", ".join("?" * len(chunk))), tuple(chunk))
+            self.db.executemany(
+                upsert, [(shopping_list_id, item.product_id, item.quantity, item.unit,
+                          int(bool(item.is_purchased))) for item in shopping_list.items])
+            if new_purchased:
+                ticked.extend(row['id'] for row in self.db.fetchall_in(
+                    "SELECT id FROM shopping_list_items "
+                    "WHERE shopping_list_id = ? AND product_id IN ({placeholders})",
+                    list(new_purchased), params=(shopping_list_id,)))
+        return ticked, unticked
 
     @catch_errors
     def get_items_by_shopping_list_id(self, shopping_list_id: int) -> List[ShoppingListItem]:
@@ -340,6 +792,7 @@ class ShoppingListRepository:
         SELECT id, shopping_list_id, product_id, quantity, unit, is_purchased, created_at, updated_at
         FROM shopping_list_items
         WHERE shopping_list_id = ?
+        ORDER BY id
         """
         rows = self.db.fetchall(query, (shopping_list_id,))
         items = []
@@ -357,6 +810,46 @@ class ShoppingListRepository:
             items.append(item)
         return items
 
+    @catch_errors
+    def get_unpurchased_items_by_shopping_list_id(self, shopping_list_id: int) -> List[ShoppingListItem]:
+        """
+        Returns the unpurchased items of a shopping list for pricing. Only the
+        columns of the partial idx_shopping_list_items_unpurchased are read,
+        so created_at and updated_at are None.
+        """
+        # The literal 0 must match the index's WHERE clause for SQLite to use it.
+        query = """
+        SELECT id, product_id, quantity, unit
+        FROM shopping_list_items
+        WHERE shopping_list_id = ? AND is_purchased = 0
+        """
+        return [
+            ShoppingListItem(
+                id=row['id'],
+                shopping_list_id=shopping_list_id,
+                product_id=row['product_id'],
+                quantity=row['quantity'],
+                unit=row['unit'],
+                is_purchased=False,
+                created_at=None,
+                updated_at=None,
+            ) for row in self.db.fetchall(query, (shopping_list_id,))
+        ]
+
+    @catch_errors
+    def get_item_counts(self) -> Dict[int, tuple]:
+        """
+        Maps every shopping list id with items to (total items, purchased items)
+        with one grouped query over idx_shopping_list_items_list_purchased.
+        """
+        query = """
+        SELECT shopping_list_id, COUNT(*) AS total, SUM(is_purchased = 1) AS purchased
+        FROM shopping_list_items
+        GROUP BY shopping_list_id
+        """
+        return {row['shopping_list_id']: (row['total'], row['purchased'])
+                for row in self.db.iter_query(query)}
+
     @catch_errors
     def get_purchased_count_by_shopping_list_id(self, shopping_list_id: int) -> int:
         query = """
@@ -391,6 +884,107 @@ class ShoppingListRepository:
         """
         self.db.execute_query(query, (is_purchased, item_id))
 
+    @catch_errors
+    def get_purchased_states(self, item_ids: List[int]) -> Dict[int, bool]:
+        """Maps the given item ids to their stored purchase status."""
+        rows = self.db.fetchall_in(
+            "SELECT id, is_purchased FROM shopping_list_items WHERE id IN ({placeholders})",
+            list(dict.fromkeys(item_ids)))
+        return {row['id']: bool(row['is_purchased']) for row in rows}
+
+    @catch_errors
+    def update_purchased_statuses(self, statuses: Dict[int, bool]):
+        """Writes the purchase status of several items with one executemany."""
+        query = """
+        UPDATE shopping_list_items
+        SET is_purchased = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """
+        self.db.executemany(
+            query, [(int(bool(is_purchased)), item_id) for item_id, is_purchased in statuses.items()])
+
+    @catch_errors
+    def set_purchased_for_list(self, shopping_list_id: int, is_purchased: bool,
+                               item_ids: List[int] = None) -> List[int]:
+        """
+        Sets the purchase status of every item of a list, or of `item_ids`
+        only, and returns the ids of the items that changed. Items already
+        in that state are not touched, so the triggers fire only for real
+        changes.
+        """
+        state = int(bool(is_purchased))
+        select = "SELECT id FROM shopping_list_items WHERE shopping_list_id = ? AND is_purchased != ?"
+        update = """
+        UPDATE shopping_list_items
+        SET is_purchased = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE shopping_list_id = ? AND is_purchased != ?
+        """
+        # The ids are read first instead of using UPDATE ... RETURNING,
+        # which the SQLite on older Android releases does not support.
+        with self.db.transaction():
+            if item_ids is None:
+                changed = [row['id'] for row in self.db.fetchall(select, (shopping_list_id, state))]
+                if changed:
+                    self.db.execute_query(update, (state, shopping_list_id, state))
+                return changed
+            changed = []
+            for chunk in chunked(dict.fromkeys(item_ids), SQLITE_MAX_VARIABLES - 2):
+                placeholders = ", ".join("?" * len(chunk))
+                ids = [row['id'] for row in self.db.fetchall(
+                    f"{select} AND id IN ({placeholders})", (shopping_list_id, state, *chunk))]
+                if ids:
+                    self.db.execute_query(
+                        f"{update} AND id IN ({placeholders})", (state, shopping_list_id, state, *chunk))
+                changed.extend(ids)
+            return changed
+
+    @catch_errors
+    def undo_purchases(self, item_ids: List[int]):
+        """
+        Appends a reversal (sign -1) of the standing purchase of each item to
+        purchase_log. Called for items the user unticks; an item that
+        becomes unpurchased otherwise, e.g. when a meal plan adds it again,
+        keeps its purchase.
+        """
+        query = """
+        INSERT INTO purchase_log (item_id, shopping_list_id, product_id, category, quantity, unit,
+                                  price_per_unit, price_unit, density, piece_weight, sign,
+                                  purchased_at)
+        SELECT l.item_id, l.shopping_list_id, l.product_id, l.category, l.quantity, l.unit,
+               l.price_per_unit, l.price_unit, l.density, l.piece_weight, -1, l.purchased_at
+        FROM shopping_list_items i
+        JOIN purchase_log l ON l.id = (
+            SELECT MAX(id) FROM purchase_log
+            WHERE shopping_list_id = i.shopping_list_id AND product_id = i.product_id AND sign = 1)
+        WHERE i.id IN ({placeholders})
+            AND (SELECT SUM(sign) FROM purchase_log
+                 WHERE shopping_list_id = i.shopping_list_id AND product_id = i.product_id) > 0
+        """
+        for chunk in chunked(dict.fromkeys(item_ids), SQLITE_MAX_VARIABLES):
+            self.db.execute_query(
+                query.format(placeholders=", ".join("?" * len(chunk))), tuple(chunk))
+
+    @catch_errors
+    def upsert_items(self, shopping_list_id: int, rows: List[tuple]):
+        """
+        Inserts or replaces items with a single executemany. An item already
+        on the list takes the new quantity and unit and becomes unpurchased;
+        a purchase it had stays in the purchase log.
+
+        Parameters:
+            rows (List[tuple]): (product_id, quantity, unit) tuples.
+        """
+        query = """
+        INSERT INTO shopping_list_items (shopping_list_id, product_id, quantity, unit, is_purchased)
+        VALUES (?, ?, ?, ?, 0)
+        ON CONFLICT(shopping_list_id, product_id) DO UPDATE SET
+            quantity = excluded.quantity, unit = excluded.unit,
+            is_purchased = 0, updated_at = CURRENT_TIMESTAMP
+        """
+        self.db.executemany(
+            query, [(shopping_list_id, product_id, quantity, unit)
+                    for product_id, quantity, unit in rows])
+
     @catch_errors
     def update_total_sum(self, shopping_list_id: int, total_sum: float):
         """Updates the total sum of a shopping list."""
@@ -401,6 +995,12 @@ class ShoppingListRepository:
         """
         self.db.execute_query(query, (total_sum, shopping_list_id))
 
+    @catch_errors
+    def delete_items_by_shopping_list_id(self, shopping_list_id: int):
+        """Removes every item from the shopping list."""
+        query = "DELETE FROM shopping_list_items WHERE shopping_list_id = ?"
+        self.db.execute_query(query, (shopping_list_id,))
+
     @catch_errors
     def delete_shopping_list_item(self, item_id: int):
         """Removes an item from the shopping list."""
@@ -467,15 +1067,24 @@ class ErrorRepository:
         Returns:
             List[ErrorLog]: A list of ErrorLog objects.
         """
+        return list(self.iter_error_logs(sort_order))
+
+    @catch_errors
+    def iter_error_logs(self, sort_order: str = "DESC",
+                        batch_size: int = FETCH_BATCH_SIZE) -> Iterator[ErrorLog]:
+        """
+        Streams error logs sorted by error_time without building a list.
+
+        Parameters:
+            sort_order (str): Sort order by 'ASC' or 'DESC'. Default is "DESC".
+            batch_size (int): Rows fetched from the cursor at a time.
+        """
         # Validate and set the sort order.
         order = "ASC" if sort_order.upper() == "ASC" else "DESC"
         query = f"SELECT * FROM error_logs ORDER BY error_time {order}"
-        rows = self.db.fetchall(query)
-        error_logs: List[ErrorLog] = []
-
-        for row in rows:
+        for row in self.db.iter_query(query, batch_size=batch_size):
             # Directly access the row items using keys.
-            error_log = ErrorLog(
+            yield ErrorLog(
                 id=row["id"],
                 error_message=row["error_message"],
                 error_time=row["error_time"],
@@ -484,8 +1093,6 @@ class ErrorRepository:
                 # Returns None if the field is NULL.
                 func_name=row["func_name"]
             )
-            error_logs.append(error_log)
-        return error_logs
 
     @catch_errors
     def get_error_logs_as_string(self, sort_order: str = "DESC") -> str:
@@ -499,12 +1106,8 @@ class ErrorRepository:
         Returns:
             str: A formatted string containing all error logs.
         """
-        error_logs = self.get_all_error_logs(sort_order)
-        if not error_logs:
-            return "No error logs found."
-
         log_strings = []
-        for log in error_logs:
+        for log in self.iter_error_logs(sort_order):
             # Build a formatted string for each error log using direct attributes.
             log_str = (
                 f"Error ID: {log.id}\n"
@@ -514,6 +1117,8 @@ class ErrorRepository:
                 f"Traceback: {log.traceback if log.traceback else 'None'}\n"
             )
             log_strings.append(log_str)
+        if not log_strings:
+            return "No error logs found."
 
         # Define a clear separation line between logs.
         separator = "\n" + "-" * 50 + "\n"
@@ -0,0 +1,196 @@
+# File: root_tracing.py --------------------------------------------------------------------
+
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Set to 1 to start the app with SQL tracing enabled.
+TRACE_ENV = "COOKNCART_TRACE_SQL"
+# Statements slower than this (milliseconds) go to the slow-query log.
+SLOW_QUERY_ENV = "COOKNCART_SLOW_SQL_MS"
+DEFAULT_SLOW_QUERY_MS = 50.0
+# A statement run more than this many times in one UI action is flagged as N+1.
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Reduces a statement to its shape: literals become ?, IN lists of any
+    length become IN (?...) and whitespace is collapsed. Statements that
+    differ only in their parameters normalize to the same text.
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+@dataclass
+class StatementStats:
+    sql: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+
+
+@dataclass
+class SlowQuery:
+    time: str
+    sql: str
+    duration_ms: float
+    rows: int
+    action: Optional[str]
+
+
+@dataclass
+class NPlusOneWarning:
+    action: str
+    sql: str
+    count: int
+
+
+class QueryTracer:
+    """
+    Records every statement DatabaseManager runs while enabled.
+
+    - per normalized statement: count, total and max duration, rows
+    - a slow-query log of statements above `slow_query_ms`
+    - N+1 warnings: the outermost catch_errors_ui call is a UI action, and
+      a statement repeated more than `n_plus_one_threshold` times inside
+      one action is reported
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get(TRACE_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+        self.slow_query_ms = float(os.environ.get(SLOW_QUERY_ENV, DEFAULT_SLOW_QUERY_MS))
+        self.n_plus_one_threshold = DEFAULT_N_PLUS_ONE_THRESHOLD
+        self.statements: Dict[str, StatementStats] = {}
+        self.slow_queries = deque(maxlen=200)
+        self.n_plus_one = deque(maxlen=200)
+        self._action: Optional[str] = None
+        self._action_counts: Counter = Counter()
+        self._captures: List[list] = []
+
+    @property
+    def in_action(self) -> bool:
+        return self._action is not None
+
+    def reset(self):
+        self.statements.clear()
+        self.slow_queries.clear()
+        self.n_plus_one.clear()
+
+    def record(self, sql: str, duration: float, rows: int):
+        """Called by DatabaseManager after each traced statement."""
+        key = normalize_sql(sql)
+        duration_ms = duration * 1000.0
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = StatementStats(key)
+            self.statements[key] = stats
+        stats.count += 1
+        stats.total_ms += duration_ms
+        stats.rows += rows
+        if duration_ms > stats.max_ms:
+            stats.max_ms = duration_ms
+
+        if duration_ms >= self.slow_query_ms:
+            self.slow_queries.append(SlowQuery(
+                time.strftime("%Y-%m-%d %H:%M:%S"), key, round(duration_ms, 3), rows, self._action))
+            logging.warning(f"Slow query ({duration_ms:.1f} ms, {rows} rows): {key}")
+        if self._action is not None:
+            self._action_counts[key] += 1
+        for capture in self._captures:
+            capture.append(key)
+
+    @contextmanager
+    def action(self, name: str):
+        """
+        Scope of one UI action. Nested scopes are ignored; when the outermost
+        one ends, statements repeated too often are reported as N+1.
+        """
+        if self._action is not None:
+            yield
+            return
+        self._action = name
+        self._action_counts = Counter()
+        try:
+            yield
+        finally:
+            counts = self._action_counts
+            self._action = None
+            self._action_counts = Counter()
+            for sql, count in counts.items():
+                if count > self.n_plus_one_threshold:
+                    self.n_plus_one.append(NPlusOneWarning(name, sql, count))
+                    logging.warning(f"N+1 in {name}: {count} x {sql}")
+
+    def report(self, limit: int = 50) -> dict:
+        top = sorted(self.statements.values(), key=lambda s: s.total_ms, reverse=True)[:limit]
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_ms,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "statements": [
+                {**asdict(s), "total_ms": round(s.total_ms, 3), "max_ms": round(s.max_ms, 3)}
+                for s in top],
+            "slow_queries": [asdict(q) for q in self.slow_queries],
+            "n_plus_one": [asdict(w) for w in self.n_plus_one],
+        }
+
+    def dump_json(self, path: str) -> str:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        return path
+
+
+tracer = QueryTracer()
+
+
+@contextmanager
+def capture_queries():
+    """Collects the normalized text of every statement run inside the block."""
+    was_enabled = tracer.enabled
+    tracer.enabled = True
+    captured: List[str] = []
+    tracer._captures.append(captured)
+    try:
+        yield captured
+    finally:
+        tracer._captures.remove(captured)
+        tracer.enabled = was_enabled
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """
+    Fails if the block runs more than `limit` statements.
+
+    Example:
+        with assert_max_queries(3):
+            ReseptitPage(parent=window)
+    """
+    with capture_queries() as captured:
+        yield captured
+    if len(captured) > limit:
+        repeated = Counter(captured).most_common(5)
+        details = "\n".join(f"  {count} x {sql}" for sql, count in repeated)
+        raise AssertionError(
+            f"Expected at most {limit} queries, got {len(captured)}. Most repeated:\n{details}")
@@ -0,0 +1,310 @@
+# File: root_units.py --------------------------------------------------------------------
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Units the app stores on products and list items.
+KNOWN_UNITS = ("kpl", "kg", "g", "mg", "l", "dl", "ml")
+
+# Units a product price can be expressed in (see ProductFormWidget).
+PRICE_UNITS = ("kpl", "kg", "l")
+
+# Spellings found in store price lists and older data, mapped to KNOWN_UNITS.
+# Package-type units are priced per piece.
+UNIT_ALIASES = {
+    "kpl": "kpl", "kappale": "kpl", "kappaletta": "kpl", "pcs": "kpl", "pc": "kpl",
+    "st": "kpl", "stk": "kpl", "ea": "kpl", "paketti": "kpl", "pkt": "kpl",
+    "pullo": "kpl", "purkki": "kpl", "prk": "kpl", "tölkki": "kpl", "rasia": "kpl",
+    "pussi": "kpl", "ps": "kpl",
+    "kg": "kg", "kilo": "kg", "kilogramma": "kg",
+    "g": "g", "gr": "g", "gramma": "g",
+    "mg": "mg", "milligramma": "mg",
+    "l": "l", "ltr": "l", "litra": "l", "liter": "l", "litre": "l",
+    "dl": "dl", "desilitra": "dl",
+    "ml": "ml", "millilitra": "ml",
+}
+
+# Price units that are rescaled to one of PRICE_UNITS: unit -> (price unit, factor).
+# E.g. 0.03 €/g becomes 30.0 €/kg.
+_PRICE_UNIT_SCALE = {
+    "g": ("kg", 1000.0),
+    "mg": ("kg", 1000000.0),
+    "dl": ("l", 10.0),
+    "ml": ("l", 1000.0),
+}
+
+
+# Smallest amount worth buying in each unit; planned quantities are rounded
+# up to a multiple of it.
+PURCHASE_STEPS = {
+    "kpl": 1.0,
+    "kg": 0.05, "g": 10.0, "mg": 10.0,
+    "l": 0.05, "dl": 0.5, "ml": 10.0,
+}
+
+
+def normalize_unit(unit) -> Optional[str]:
+    """Returns the canonical spelling of `unit`, or None if it is not recognised."""
+    if unit is None:
+        return None
+    key = str(unit).strip().casefold().removeprefix("€/").rstrip(".")
+    return UNIT_ALIASES.get(key)
+
+
+def round_to_purchasable(quantity: float, unit: str) -> float:
+    """
+    Rounds `quantity` up to the next multiple of the unit's PURCHASE_STEPS
+    entry, e.g. 2.2 kpl -> 3 kpl and 0.12 kg -> 0.15 kg.
+    """
+    step = PURCHASE_STEPS.get(unit)
+    if not step or quantity <= 0:
+        return round(quantity, 3)
+    # The tolerance keeps 0.15 kg from becoming 0.2 kg through float error.
+    return round(math.ceil(quantity / step - 1e-9) * step, 3)
+
+
+def normalize_price(price_per_unit: float, unit: str) -> Tuple[float, str]:
+    """
+    Expresses a price in one of PRICE_UNITS.
+
+    Parameters:
+        price_per_unit (float): Price per `unit`.
+        unit (str): A canonical unit from KNOWN_UNITS.
+
+    Returns:
+        (price, unit): The rescaled price and its price unit.
+    """
+    if unit in _PRICE_UNIT_SCALE:
+        price_unit, factor = _PRICE_UNIT_SCALE[unit]
+        return round(price_per_unit * factor, 6), price_unit
+    return price_per_unit, unit
+
+
+# Dimensions a quantity can have; each has a base unit the factors refer to.
+COUNT = "count"    # kpl
+MASS = "mass"      # kg
+VOLUME = "volume"  # l
+
+
+@dataclass(frozen=True)
+class UnitDefinition:
+    name: str
+    dimension: str
+    # Size of one unit in the dimension's base unit, e.g. g = 0.001 kg.
+    factor: float
+
+
+UNITS = {unit.name: unit for unit in (
+    UnitDefinition("kpl", COUNT, 1.0),
+    UnitDefinition("kg", MASS, 1.0),
+    UnitDefinition("g", MASS, 1 / 1000.0),
+    UnitDefinition("mg", MASS, 1 / 1000000.0),
+    UnitDefinition("l", VOLUME, 1.0),
+    UnitDefinition("dl", VOLUME, 1 / 10.0),
+    UnitDefinition("ml", VOLUME, 1 / 1000.0),
+)}
+
+
+def _positive(value) -> bool:
+    return value is not None and value > 0
+
+
+class UnitEngine:
+    """
+    Table-driven unit conversion.
+
+    Factors between units of one dimension are computed once, when the
+    engine is built. Conversions across dimensions go through the base
+    units and need a property of the product:
+
+    - density (kg/l) for mass <-> volume, e.g. wheat flour 0.6
+    - piece_weight (kg/kpl) for count <-> mass, e.g. one egg 0.06
+    - both for count <-> volume
+
+    Every method returns None for a conversion that is not possible.
+    """
+
+    def __init__(self, units: Dict[str, UnitDefinition] = None):
+        self.units = dict(units or UNITS)
+        self._factors: Dict[Tuple[str, str], float] = {
+            (source.name, target.name): source.factor / target.factor
+            for source in self.units.values()
+            for target in self.units.values()
+            if source.dimension == target.dimension
+        }
+
+    def dimension(self, unit: str) -> Optional[str]:
+        definition = self.units.get(unit)
+        return definition.dimension if definition else None
+
+    @staticmethod
+    def _bridge(source: str, target: str, density: Optional[float],
+                piece_weight: Optional[float]) -> Optional[float]:
+        """Factor from the base unit of `source` to the base unit of `target`."""
+        if source == MASS and target == VOLUME:
+            return 1.0 / density if _positive(density) else None
+        if source == VOLUME and target == MASS:
+            return density if _positive(density) else None
+        if source == COUNT and target == MASS:
+            return piece_weight if _positive(piece_weight) else None
+        if source == MASS and target == COUNT:
+            return 1.0 / piece_weight if _positive(piece_weight) else None
+        if _positive(density) and _positive(piece_weight):
+            if source == COUNT and target == VOLUME:
+                return piece_weight / density
+            if source == VOLUME and target == COUNT:
+                return density / piece_weight
+        return None
+
+    def factor(self, from_unit: str, to_unit: str, density: float = None,
+               piece_weight: float = None) -> Optional[float]:
+        """Multiplier that converts a quantity in `from_unit` to `to_unit`."""
+        factor = self._factors.get((from_unit, to_unit))
+        if factor is not None:
+            return factor
+        source = self.units.get(from_unit)
+        target = self.units.get(to_unit)
+        if source is None or target is None:
+            return None
+        bridge = self._bridge(source.dimension, target.dimension, density, piece_weight)
+        if bridge is None:
+            return None
+        return source.factor * bridge / target.factor
+
+    def convert(self, quantity: float, from_unit: str, to_unit: str, density: float = None,
+                piece_weight: float = None) -> Optional[float]:
+        """
+        Converts `quantity` from `from_unit` to `to_unit`.
+
+        E.g. convert(2, "dl", "kg", density=0.6) == 0.12.
+        """
+        factor = self.factor(from_unit, to_unit, density, piece_weight)
+        return None if factor is None else quantity * factor
+
+    def convert_many(self, quantities: Sequence[float], from_units: Sequence[str],
+                     to_units: Sequence[str], densities: Sequence[Optional[float]] = None,
+                     piece_weights: Sequence[Optional[float]] = None) -> List[Optional[float]]:
+        """
+        Converts parallel sequences in one pass. Each distinct combination of
+        units and product properties is resolved to a factor only once.
+        """
+        count = len(quantities)
+        densities = densities if densities is not None else (None,) * count
+        piece_weights = piece_weights if piece_weights is not None else (None,) * count
+        factors: Dict[tuple, Optional[float]] = {}
+        converted: List[Optional[float]] = []
+        for quantity, from_unit, to_unit, density, piece_weight in zip(
+                quantities, from_units, to_units, densities, piece_weights):
+            key = (from_unit, to_unit, density, piece_weight)
+            if key in factors:
+                factor = factors[key]
+            else:
+                factor = factors[key] = self.factor(from_unit, to_unit, density, piece_weight)
+            converted.append(None if factor is None or quantity is None else quantity * factor)
+        return converted
+
+    def sql_factor(self, from_unit: str, to_unit: str, density: str = "NULL",
+                   piece_weight: str = "NULL") -> str:
+        """
+        SQL expression with the value of factor() for the given column
+        expressions, NULL where factor() returns None. Lets set-based
+        statements convert quantities without leaving SQLite.
+
+        E.g. f"SUM(i.quantity * {engine.sql_factor('i.unit', 'p.unit', 'p.density')})".
+        """
+        def case(expr: str, values: Dict[str, str]) -> str:
+            whens = " ".join(f"WHEN '{name}' THEN {value}" for name, value in values.items())
+            return f"(CASE {expr} {whens} END)"
+
+        factors = {name: repr(unit.factor) for name, unit in self.units.items()}
+        dimensions = {name: f"'{unit.dimension}'" for name, unit in self.units.items()}
+        source, target = case(from_unit, dimensions), case(to_unit, dimensions)
+        d, w = density, piece_weight
+        bridges = (
+            (MASS, VOLUME, f"{d} > 0", f"1.0 / {d}"),
+            (VOLUME, MASS, f"{d} > 0", d),
+            (COUNT, MASS, f"{w} > 0", w),
+            (MASS, COUNT, f"{w} > 0", f"1.0 / {w}"),
+            (COUNT, VOLUME, f"{d} > 0 AND {w} > 0", f"{w} / {d}"),
+            (VOLUME, COUNT, f"{d} > 0 AND {w} > 0", f"{d} / {w}"),
+        )
+        whens = " ".join(
+            f"WHEN {source} = '{a}' AND {target} = '{b}' AND {condition} THEN {value}"
+            for a, b, condition, value in bridges)
+        bridge = f"(CASE WHEN {source} = {target} THEN 1.0 {whens} END)"
+        return f"({case(from_unit, factors)} * {bridge} / {case(to_unit, factors)})"
+
+    def price(self, quantity: float, unit: str, price_per_unit: Optional[float],
+              price_unit: Optional[str], density: float = None,
+              piece_weight: float = None) -> Optional[float]:
+        """Cost of `quantity` `unit`s of a product priced `price_per_unit` per `price_unit`."""
+        if price_per_unit is None:
+            return None
+        amount = self.convert(quantity, unit, price_unit, density, piece_weight)
+        return None if amount is None else amount * price_per_unit
+
+    def price_many(self, quantities: Sequence[float], units: Sequence[str],
+                   prices: Sequence[Optional[float]], price_units: Sequence[Optional[str]],
+                   densities: Sequence[Optional[float]] = None,
+                   piece_weights: Sequence[Optional[float]] = None) -> List[Optional[float]]:
+        """price() over parallel sequences, see convert_many()."""
+        amounts = self.convert_many(quantities, units, price_units, densities, piece_weights)
+        return [None if amount is None or price is None else amount * price
+                for amount, price in zip(amounts, prices)]
+
+
+# Shared by the controllers, the views and the recipe cost engine.
+engine = UnitEngine()
+
+
+def convert_quantity(quantity: float, unit: str, to_unit: str, density: float = None,
+                     piece_weight: float = None) -> Optional[float]:
+    """
+    Converts `quantity` from `unit` to `to_unit`. Returns None if the units
+    cannot be converted. See UnitEngine.convert().
+
+    E.g. convert_quantity(250, "g", "kg") == 0.25.
+    """
+    return engine.convert(quantity, unit, to_unit, density, piece_weight)
+
+
+def item_price(price_per_unit: float, quantity: float, unit: str) -> float:
+    """
+    Price of `quantity` `unit`s of a product priced per kpl/kg/l, ignoring
+    the product's own unit.
+
+    E.g. 500 g of a 4.00 €/kg product costs 2.00 €. Unknown units cost 0.
+    Kept for items whose unit cannot be converted to the product's price
+    unit, so that their stored totals do not change.
+    """
+    definition = UNITS.get(unit)
+    return price_per_unit * quantity * definition.factor if definition else 0.0
+
+
+def item_prices(items, products) -> Dict[int, float]:
+    """
+    Prices shopping list items against their products in one pass.
+
+    Parameters:
+        items: ShoppingListItems.
+        products (Dict[int, Product]): Products by id; items without a
+            product are left out.
+
+    Returns:
+        Dict[int, float]: Price by item id.
+    """
+    priced = [(item, products[item.product_id]) for item in items
+              if item.product_id in products]
+    prices = engine.price_many(
+        [item.quantity for item, _ in priced],
+        [item.unit for item, _ in priced],
+        [product.price_per_unit for _, product in priced],
+        [product.unit for _, product in priced],
+        [product.density for _, product in priced],
+        [product.piece_weight for _, product in priced])
+    return {
+        item.id: price if price is not None else item_price(
+            product.price_per_unit or 0.0, item.quantity, item.unit)
+        for (item, product), price in zip(priced, prices)
+    }
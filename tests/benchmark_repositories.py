@@ -0,0 +1,481 @@
+"""
+Repository / controller benchmarks.
+
+Runs the hot data paths of the app against the synthetic fixture databases
+from generate_dataset.py and reports latency percentiles together with the
+number of SQL statements and commits per call. Results are compared with
+tests/benchmark_baseline.json: statement and commit counts must not grow
+(an N+1 regression shows up here first), median latencies may grow by at
+most the latency tolerance.
+
+Usage:
+    python tests/benchmark_repositories.py                    # 1k and 10k tiers
+    python tests/benchmark_repositories.py --tiers 100k -n 5
+    python tests/benchmark_repositories.py --update-baseline --repeat 3
+    python tests/benchmark_repositories.py --json results.json
+
+Exit status is 1 if any case regressed against the baseline. The baseline
+records the machine it was measured on; regenerate it with --update-baseline
+on the machine that runs the gate.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+for path in (ROOT_DIR, TESTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from generate_dataset import DEFAULT_SEED, GENERATOR_VERSION, open_fixture_db  # noqa: E402
+from root_cache import clear_all_caches  # noqa: E402
+from root_controllers import (  # noqa: E402
+    AnalyticsController, RecipeController, ShoppingListController, ProductController)
+from root_database import DatabaseManager  # noqa: E402
+from root_meal_plan import MealPlanEntry  # noqa: E402
+
+BASELINE_FILE = os.path.join(TESTS_DIR, "benchmark_baseline.json")
+
+# A case regresses if its median grows by more than this fraction of the
+# baseline plus LATENCY_SLACK_MS (timer noise on sub-millisecond cases).
+# The median is gated rather than p95: with a few dozen samples the tail
+# of write cases is dominated by fsync jitter.
+LATENCY_TOLERANCE = 0.5
+LATENCY_SLACK_MS = 1.0
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StatementCounter:
+    """
+    Counts statements and commits on the app connection via sqlite3's trace
+    callback. Transaction control (BEGIN, savepoints, ROLLBACK) is not a
+    statement.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = 0
+        self.commits = 0
+
+    def _trace(self, sql: str):
+        keyword = sql.lstrip()[:8].upper()
+        if keyword.startswith("COMMIT"):
+            self.commits += 1
+        elif not keyword.startswith(("BEGIN", "ROLLBACK", "SAVEPOIN", "RELEASE")):
+            self.statements += 1
+
+    def __enter__(self):
+        self.connection.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        self.connection.set_trace_callback(None)
+
+
+@dataclass
+class CaseResult:
+    name: str
+    iterations: int
+    latencies_ms: List[float] = field(default_factory=list)
+    statements: int = 0
+    commits: int = 0
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.latencies_ms)
+        if not ordered:
+            return 0.0
+        rank = (len(ordered) - 1) * pct / 100.0
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def to_dict(self) -> dict:
+        result = {f"p{pct}_ms": round(self.percentile(pct), 3) for pct in PERCENTILES}
+        result.update({
+            "mean_ms": round(statistics.fmean(self.latencies_ms), 3),
+            "max_ms": round(max(self.latencies_ms), 3),
+            "iterations": self.iterations,
+            "statements": self.statements,
+            "commits": self.commits,
+        })
+        return result
+
+
+class BenchmarkContext:
+    """Fixture data shared by the cases of one tier."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.recipes = RecipeController()
+        self.shoplists = ShoppingListController()
+        self.products = ProductController()
+        db = DatabaseManager.get_instance()
+        self.product_ids = [row['id'] for row in db.fetchall("SELECT id FROM products")]
+        self.list_ids = [row['id'] for row in db.fetchall("SELECT id FROM shopping_lists")]
+        self.item_ids = [row['id'] for row in db.fetchall("SELECT id FROM shopping_list_items")]
+        self.recipe_ids = [row['id'] for row in db.fetchall("SELECT id FROM recipes")]
+        self.counter = 0
+
+    def next_id(self) -> int:
+        self.counter += 1
+        return self.counter
+
+
+# Each case factory gets the context and returns the function to time.
+def case_get_all_recipes(ctx: BenchmarkContext) -> Callable:
+    return ctx.recipes.get_all_recipes
+
+
+def case_get_all_shopping_lists(ctx: BenchmarkContext) -> Callable:
+    return ctx.shoplists.get_all_shopping_lists
+
+
+def case_shopping_list_overview(ctx: BenchmarkContext) -> Callable:
+    """Data part of OstolistatPage.populate_shopping_list: title and purchased/total per list."""
+    def run():
+        item_counts = ctx.shoplists.get_item_counts()
+        for shoplist_id, shoplist in ctx.shoplists.get_all_shopping_lists().items():
+            total_items, purchased_count = item_counts.get(shoplist_id, (0, 0))
+            f"{shoplist.title}\n{purchased_count}/{total_items}"
+    return run
+
+
+def case_get_shopping_list_with_prices(ctx: BenchmarkContext) -> Callable:
+    return lambda: ctx.shoplists.get_shopping_list_with_prices(ctx.rng.choice(ctx.list_ids))
+
+
+def case_add_recipe(ctx: BenchmarkContext) -> Callable:
+    def run():
+        ingredients = [{"product_id": product_id, "quantity": 1, "unit": "kpl"}
+                       for product_id in ctx.rng.sample(ctx.product_ids, 10)]
+        ctx.recipes.add_recipe(f"Benchmark resepti {ctx.next_id()}",
+                               "1. Sekoita.", "benchmark", ingredients)
+    return run
+
+
+def case_update_shopping_list(ctx: BenchmarkContext) -> Callable:
+    """
+    Saving an edited list of 20 items. Every call keeps 10 products with a
+    new quantity, removes 10 and adds 10, on a list of its own so that the
+    other cases keep their items.
+    """
+    products = ctx.rng.sample(ctx.product_ids, 30)
+    kept, edits = products[:10], (products[10:20], products[20:])
+    shoplist = ctx.shoplists.add_shopping_list(f"Benchmark {ctx.next_id()}", [])
+
+    def items(call: int) -> List[dict]:
+        quantity = 1 + call % 2
+        return [{"product_id": product_id, "quantity": quantity, "unit": "kpl"}
+                for product_id in kept + edits[call % 2]]
+
+    calls = itertools.count(1)
+    ctx.shoplists.update_shopping_list(shoplist.id, items=items(0))
+
+    def run():
+        call = next(calls)
+        ctx.shoplists.update_shopping_list(
+            shoplist.id, title=f"Päivitetty {call}", items=items(call))
+    return run
+
+
+def stored_purchase_states() -> Dict[int, bool]:
+    """The current purchase status of every shopping list item, by item id."""
+    return {row['id']: bool(row['is_purchased']) for row in DatabaseManager.get_instance().fetchall(
+        "SELECT id, is_purchased FROM shopping_list_items ORDER BY id")}
+
+
+def case_toggle_purchased(ctx: BenchmarkContext) -> Callable:
+    """
+    Controller part of ShoplistDetailWidget._on_item_clicked, for a click and
+    the click that undoes it. Both flip the item's stored status, so every
+    call writes one purchase and one reversal whatever state it finds.
+    """
+    states = stored_purchase_states()
+    item_ids = list(states)
+
+    def run():
+        item_id = ctx.rng.choice(item_ids)
+        ctx.shoplists.update_purchased_status(item_id, not states[item_id])
+        ctx.shoplists.update_purchased_status(item_id, states[item_id])
+        ctx.shoplists.update_total_sum(ctx.list_ids[0], 12.5)
+    return run
+
+
+def case_search_products(ctx: BenchmarkContext) -> Callable:
+    """TuotteetPage.populate_product_list filtering, without the QML model."""
+    def run():
+        products = ctx.products.get_all_products()
+        for product in sorted(products.values(), key=lambda p: p.name.lower()):
+            "luomu" in product.name.lower()
+    return run
+
+
+def case_search_recipes(ctx: BenchmarkContext) -> Callable:
+    """ReseptitPage.populate_recipe_list filtering, without the QML model."""
+    def run():
+        recipes = ctx.recipes.get_all_recipes()
+        for recipe in sorted(recipes.values(), key=lambda r: r.name.lower()):
+            "keitto" in recipe.name.lower()
+    return run
+
+
+def case_recipe_costs(ctx: BenchmarkContext) -> Callable:
+    """Costs of every recipe, as read when ReseptitPage sorts by cost."""
+    return ctx.recipes.get_recipe_costs
+
+
+def case_meal_plan_week(ctx: BenchmarkContext) -> Callable:
+    """A week of three meals a day consolidated into one shopping list."""
+    def run():
+        entries = [MealPlanEntry(ctx.rng.choice(ctx.recipe_ids), ctx.rng.choice((1.0, 1.5, 2.0)))
+                   for _ in range(21)]
+        ctx.shoplists.add_meal_plan(ctx.rng.choice(ctx.list_ids), entries)
+    return run
+
+
+def case_spending_stats(ctx: BenchmarkContext) -> Callable:
+    """
+    One purchase followed by the reports of TilastotPage. Every call ticks
+    a different unpurchased item, so a run can make at most as many calls
+    as the fixture has unpurchased items (179 in the 1k tier).
+    """
+    analytics = AnalyticsController()
+    analytics.refresh()
+    unpurchased = [item_id for item_id, is_purchased in stored_purchase_states().items()
+                   if not is_purchased]
+    ctx.rng.shuffle(unpurchased)
+
+    def run():
+        ctx.shoplists.update_purchased_status(unpurchased.pop(), True)
+        analytics.get_spend_by_period("week", limit=8)
+        analytics.get_spend_by_category()
+        analytics.get_top_products(10)
+        analytics.get_purchase_frequency(limit=10)
+    return run
+
+
+def case_match_recipes(ctx: BenchmarkContext) -> Callable:
+    """Recipes cookable from 200 products but for at most two, as in the "kotona" order."""
+    def run():
+        ctx.recipes.match_recipes(ctx.rng.sample(ctx.product_ids, 200), max_missing=2)
+    return run
+
+
+def case_similar_recipes(ctx: BenchmarkContext) -> Callable:
+    """Five most similar recipes of a random recipe, as in the recipe detail view."""
+    def run():
+        ctx.recipes.get_similar_recipes(ctx.rng.choice(ctx.recipe_ids), 5)
+    return run
+
+
+def case_plan_menu(ctx: BenchmarkContext) -> Callable:
+    """Seven recipes for at most 60 € from every recipe, with the pantry."""
+    def run():
+        ctx.recipes.plan_menu(7, 60.0)
+    return run
+
+
+CASES: Dict[str, Callable[[BenchmarkContext], Callable]] = {
+    "get_all_recipes": case_get_all_recipes,
+    "get_all_shopping_lists": case_get_all_shopping_lists,
+    "shopping_list_overview": case_shopping_list_overview,
+    "get_shopping_list_with_prices": case_get_shopping_list_with_prices,
+    "add_recipe": case_add_recipe,
+    "update_shopping_list": case_update_shopping_list,
+    "toggle_purchased": case_toggle_purchased,
+    "search_products": case_search_products,
+    "search_recipes": case_search_recipes,
+    "recipe_costs": case_recipe_costs,
+    "meal_plan_week": case_meal_plan_week,
+    "spending_stats": case_spending_stats,
+    "match_recipes": case_match_recipes,
+    "similar_recipes": case_similar_recipes,
+    "plan_menu": case_plan_menu,
+}
+
+
+def run_case(name: str, ctx: BenchmarkContext, iterations: int, warmup: int, cold: bool) -> CaseResult:
+    # Each case samples from its own generator, so its calls do not depend
+    # on how many calls the cases before it made.
+    ctx.rng = random.Random(f"{ctx.seed}-{name}")
+    func = CASES[name](ctx)
+    connection = DatabaseManager.get_instance().connection
+    # The repositories print progress; keep it out of the report.
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        for _ in range(warmup):
+            func()
+    result = CaseResult(name, iterations)
+    for _ in range(iterations):
+        if cold:
+            clear_all_caches()
+        with quiet, StatementCounter(connection) as counter:
+            start = time.perf_counter()
+            func()
+            result.latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        # Cases that sample the fixture (e.g. meal_plan_week) issue more or
+        # fewer statements per call, so the gate compares the largest count.
+        # A shorter run makes a prefix of the same calls.
+        result.statements = max(result.statements, counter.statements)
+        result.commits = max(result.commits, counter.commits)
+    return result
+
+
+def run_tier(tier: str, seed: int, iterations: int, warmup: int, cold: bool,
+             cases: List[str]) -> Dict[str, dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Write cases modify the database, so every tier runs on a fresh copy.
+        open_fixture_db(tier, seed, copy_to=os.path.join(tmp, "bench.db"))
+        clear_all_caches()
+        ctx = BenchmarkContext(seed)
+        results = {}
+        for name in cases:
+            results[name] = run_case(name, ctx, iterations, warmup, cold).to_dict()
+        DatabaseManager.reset_instance()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, dict]],
+            tolerance: float) -> List[str]:
+    """Returns a description of every regression against the baseline."""
+    regressions = []
+    for tier, cases in results.items():
+        for name, result in cases.items():
+            base = baseline.get(tier, {}).get(name)
+            if not base:
+                continue
+            for metric in ("statements", "commits"):
+                if result[metric] > base[metric]:
+                    regressions.append(
+                        f"{tier}/{name}: {metric} {base[metric]} -> {result[metric]}")
+            limit = base["p50_ms"] * (1 + tolerance) + LATENCY_SLACK_MS
+            if result["p50_ms"] > limit:
+                regressions.append(
+                    f"{tier}/{name}: p50 {base['p50_ms']:.2f} ms -> {result['p50_ms']:.2f} ms "
+                    f"(limit {limit:.2f} ms)")
+    return regressions
+
+
+def describe_environment(args) -> dict:
+    """What a baseline was measured on; latencies only compare on similar machines."""
+    cpu = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f
+                        if line.startswith("model name")), cpu)
+    return {
+        "measured_at": time.strftime("%Y-%m-%d"),
+        "platform": platform.platform(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "tiers": args.tiers,
+        "seed": args.seed,
+        "generator_version": GENERATOR_VERSION,
+        "iterations": args.iterations,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "cold": args.cold,
+    }
+
+
+def print_table(tier: str, cases: Dict[str, dict]):
+    print(f"\n== {tier} ==")
+    print(f"{'case':32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'stmts':>7} {'commits':>8}")
+    for name, result in cases.items():
+        print(f"{name:32} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+              f"{result['p99_ms']:9.2f} {result['statements']:7d} {result['commits']:8d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repositories and controllers.")
+    parser.add_argument("--tiers", default="1k,10k", help="Comma-separated scale tiers")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Run every tier this many times; a baseline keeps the slowest "
+                             "run of each case, a check the fastest")
+    parser.add_argument("--cases", help="Comma-separated subset of: " + ", ".join(CASES))
+    parser.add_argument("--cold", action="store_true", help="Clear entity caches before every call")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=LATENCY_TOLERANCE,
+                        help="Allowed relative median growth (default 0.5 = +50%%)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    cases = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    # A baseline keeps the slowest of the repeated runs of each case and a
+    # check the fastest, so that a noisy machine does not fail the gate.
+    pick = max if args.update_baseline else min
+    results = {}
+    for tier in args.tiers.split(","):
+        runs = [run_tier(tier, args.seed, args.iterations, args.warmup, args.cold, cases)
+                for _ in range(args.repeat)]
+        results[tier] = {name: pick((run[name] for run in runs), key=lambda r: r["p50_ms"])
+                         for name in cases}
+        print_table(tier, results[tier])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        for tier, tier_results in results.items():
+            if args.cases:
+                baseline.setdefault(tier, {}).update(tier_results)
+            else:
+                # A full run replaces the tier, so no case keeps numbers
+                # from an older tree or another machine.
+                baseline[tier] = tier_results
+        baseline["environment"] = describe_environment(args)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if "environment" in baseline:
+        env = baseline["environment"]
+        print(f"\nBaseline measured {env['measured_at']} on {env['cpu']} "
+              f"({env['cpu_count']} CPUs, {env['platform']}, SQLite {env['sqlite']}).")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+    print("\nNo regressions." if baseline else "\nNo baseline to compare against.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Headless UI benchmarks for the QML list pages.
+
+Builds TuotteetPage, ReseptitPage, OstolistatPage and ShoplistDetailWidget
+against the fixture databases from generate_dataset.py on the offscreen
+platform with the software Qt Quick backend, so it runs on a CI box
+without a display. Per page it measures:
+
+    construct     constructor incl. the initial list population
+    first_frame   constructor + first rendered frame (QWidget.grab)
+    populate      repopulating the QML list model
+    keystroke     filter latency per typed character (search bar text
+                  set one prefix at a time, events processed)
+
+ShoplistDetailWidget has no search bar; instead of keystrokes it times
+checking an item (_on_item_clicked), which also updates the overview row,
+and flushing the queued purchase states to the database.
+Every measurement also records the SQL statements it issued.
+
+Usage:
+    python tests/benchmark_ui.py                       # 1k and 10k tiers
+    python tests/benchmark_ui.py --tiers 100k -n 2 --json ui.json
+
+Each tier runs in its own process: ReseptitPage creates its controllers
+at import time, bound to whichever database is open at that moment.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("QT_QUICK_BACKEND", "software")
+os.environ.setdefault("QT_QUICK_CONTROLS_STYLE", "Basic")
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+for path in (ROOT_DIR, TESTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from generate_dataset import DEFAULT_SEED, build_fixture_db  # noqa: E402
+
+# Typed into every search bar, one character per keystroke.
+SEARCH_TEXT = {
+    "TuotteetPage": "luomu",
+    "ReseptitPage": "keitto",
+    "OstolistatPage": "ostokset",
+}
+
+WINDOW_SIZE = (400, 700)
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pct(p):
+        rank = (len(ordered) - 1) * p / 100.0
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 3)
+
+    return {"p50_ms": pct(50), "p95_ms": pct(95), "max_ms": round(ordered[-1], 3),
+            "mean_ms": round(statistics.fmean(ordered), 3), "samples": len(ordered)}
+
+
+def run_tier_in_process(tier: str, seed: int, iterations: int) -> dict:
+    """Runs every UI case for one tier. Must be the only tier run in this process."""
+    from PySide6.QtCore import QObject
+    from PySide6.QtWidgets import QApplication, QMainWindow, QStackedWidget
+    from benchmark_repositories import StatementCounter
+    from root_database import DatabaseManager
+
+    tmp = tempfile.mkdtemp()
+    src = build_fixture_db(tier, seed)
+    # The detail widget writes purchase states, so work on a copy.
+    with sqlite3.connect(src) as source, sqlite3.connect(os.path.join(tmp, "ui.db")) as target:
+        source.backup(target)
+    DatabaseManager.reset_instance()
+    DatabaseManager(os.path.join(tmp, "ui.db"))
+    db = DatabaseManager.get_instance()
+
+    app = QApplication.instance() or QApplication([])
+
+    class HostWindow(QMainWindow):
+        """Stands in for MainWindow: the pages call hide_buttons()/show_buttons() on it."""
+
+        def __init__(self):
+            super().__init__()
+            self.stacked_widget = QStackedWidget()
+            self.setCentralWidget(self.stacked_widget)
+            self.resize(*WINDOW_SIZE)
+
+        def hide_buttons(self):
+            pass
+
+        def show_buttons(self):
+            pass
+
+    from views_tuotteet_page import TuotteetPage
+    from views_reseptit_page import ReseptitPage
+    from views_ostoslistat_page import OstolistatPage
+    from widgets_shoplist_detail_widget import ShoplistDetailWidget
+
+    host = HostWindow()
+    host.show()
+    app.processEvents()
+
+    def measure(func):
+        """Returns (elapsed ms, SQL statements, result) with events flushed."""
+        with StatementCounter(db.connection) as counter:
+            start = time.perf_counter()
+            result = func()
+            app.processEvents()
+            elapsed = (time.perf_counter() - start) * 1000.0
+        return elapsed, counter.statements, result
+
+    def build(page_cls):
+        page = page_cls(parent=host)
+        host.stacked_widget.addWidget(page)
+        host.stacked_widget.setCurrentWidget(page)
+        return page
+
+    def dispose(page):
+        host.stacked_widget.removeWidget(page)
+        page.deleteLater()
+        app.processEvents()
+
+    populate = {
+        "TuotteetPage": lambda page: page.populate_product_list(),
+        "ReseptitPage": lambda page: page.populate_recipe_list(),
+        "OstolistatPage": lambda page: page.populate_shopping_list(),
+    }
+
+    results = {}
+    for page_cls in (TuotteetPage, ReseptitPage, OstolistatPage):
+        name = page_cls.__name__
+        construct, first_frame, repopulate, keystrokes = [], [], [], []
+        stats = {}
+        for _ in range(iterations):
+            elapsed, statements, page = measure(lambda: build(page_cls))
+            construct.append(elapsed)
+            stats["construct_statements"] = statements
+            start = time.perf_counter()
+            page.grab()
+            first_frame.append(elapsed + (time.perf_counter() - start) * 1000.0)
+
+            elapsed, statements, _ = measure(lambda: populate[name](page))
+            repopulate.append(elapsed)
+            stats["populate_statements"] = statements
+
+            text_field = page.search_bar.get_root_object().findChild(
+                QObject, page.search_bar.text_field_id)
+            text = SEARCH_TEXT[name]
+            keystroke_statements = 0
+            for end in list(range(1, len(text) + 1)) + list(range(len(text) - 1, -1, -1)):
+                elapsed, statements, _ = measure(
+                    lambda: text_field.setProperty("text", text[:end]))
+                keystrokes.append(elapsed)
+                keystroke_statements = max(keystroke_statements, statements)
+            stats["keystroke_statements"] = keystroke_statements
+            dispose(page)
+
+        results[name] = {
+            "construct": _summary(construct),
+            "first_frame": _summary(first_frame),
+            "populate": _summary(repopulate),
+            "keystroke": _summary(keystrokes),
+            **stats,
+        }
+
+    # ShoplistDetailWidget on the largest list, parented to the overview page
+    # as in the app (item clicks refresh the overview).
+    largest = db.fetchone(
+        "SELECT shopping_list_id AS id, COUNT(*) AS n FROM shopping_list_items "
+        "GROUP BY shopping_list_id ORDER BY n DESC LIMIT 1")
+    overview = build(OstolistatPage)
+    shoplist = overview.shoplist_controller.get_shopping_list_by_id(largest['id'])
+    construct, first_frame, repopulate, clicks, flushes = [], [], [], [], []
+    stats = {"items": largest['n']}
+    for _ in range(iterations):
+        elapsed, statements, widget = measure(lambda: ShoplistDetailWidget(parent=overview))
+        overview.stacked.addWidget(widget)
+        overview.stacked.setCurrentWidget(widget)
+        construct.append(elapsed)
+        stats["construct_statements"] = statements
+
+        elapsed, statements, _ = measure(lambda: widget.set_shopping_list(shoplist))
+        repopulate.append(elapsed)
+        stats["populate_statements"] = statements
+        start = time.perf_counter()
+        widget.grab()
+        first_frame.append(construct[-1] + elapsed + (time.perf_counter() - start) * 1000.0)
+
+        items = overview.shoplist_controller.get_items_by_shopping_list_id(shoplist.id)
+        for item in items[:10]:
+            elapsed, statements, _ = measure(
+                lambda: widget._on_item_clicked(item.id, bool(item.is_purchased), 0.0))
+            clicks.append(elapsed)
+            stats["click_statements"] = statements
+        elapsed, statements, _ = measure(widget.flush_pending)
+        flushes.append(elapsed)
+        stats["flush_statements"] = statements
+        overview.stacked.removeWidget(widget)
+        widget.deleteLater()
+        app.processEvents()
+
+    results["ShoplistDetailWidget"] = {
+        "construct": _summary(construct),
+        "first_frame": _summary(first_frame),
+        "populate": _summary(repopulate),
+        "item_click": _summary(clicks),
+        "flush": _summary(flushes),
+        **stats,
+    }
+    dispose(overview)
+    host.close()
+    DatabaseManager.reset_instance()
+    return results
+
+
+def print_table(tier: str, results: dict):
+    print(f"\n== {tier} ==")
+    print(f"{'widget':22} {'metric':12} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for widget, metrics in results.items():
+        for metric, summary in metrics.items():
+            if isinstance(summary, dict):
+                print(f"{widget:22} {metric:12} {summary['p50_ms']:9.2f} "
+                      f"{summary['p95_ms']:9.2f} {summary['max_ms']:9.2f}")
+        counts = ", ".join(f"{key}={value}" for key, value in metrics.items()
+                           if not isinstance(value, dict))
+        print(f"{'':22} {counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless QML list page benchmarks.")
+    parser.add_argument("--tiers", default="1k,10k", help="Comma-separated scale tiers")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--single-tier", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_tier:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_tier_in_process(args.single_tier, args.seed, args.iterations)
+        print(json.dumps(results))
+        return
+
+    all_results = {
+        "environment": {
+            "platform": os.environ["QT_QPA_PLATFORM"],
+            "quick_backend": os.environ["QT_QUICK_BACKEND"],
+            "window_size": list(WINDOW_SIZE),
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "tiers": {},
+    }
+    for tier in args.tiers.split(","):
+        # Build the fixture here so its output does not mix with the JSON.
+        build_fixture_db(tier, args.seed)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single-tier", tier,
+             "--seed", str(args.seed), "-n", str(args.iterations)],
+            capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            sys.exit(f"UI benchmark failed for tier {tier}")
+        results = json.loads(proc.stdout.strip().splitlines()[-1])
+        all_results["tiers"][tier] = results
+        print_table(tier, results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+EXPLAIN QUERY PLAN audit of the repository SQL.
+
+Runs the hot paths from benchmark_repositories.py and a sweep over the
+remaining repository methods against a fixture database from
+generate_dataset.py, collects every statement they issue through sqlite3's
+trace callback and runs EXPLAIN QUERY PLAN on one concrete example of each
+statement shape. Per statement it reports:
+
+    scan          tables read in full (SCAN, with or without an index)
+    temp b-tree   sorts / groupings done in a temporary B-tree
+    non-covering  index searches that still read the table row
+
+Statements issued by the benchmark cases are "hot". The plans are compared
+with tests/explain_baseline.json, and the check fails if a hot statement
+picks up a new scan or temp B-tree, or a new hot statement scans a table.
+
+Usage:
+    python tests/explain_queries.py                  # 10k tier
+    python tests/explain_queries.py --tier 100k --all
+    python tests/explain_queries.py --update-baseline
+
+Exit status is 1 if a hot statement regressed.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+for path in (ROOT_DIR, TESTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmark_repositories import CASES, BenchmarkContext  # noqa: E402
+from generate_dataset import DEFAULT_SEED, open_fixture_db  # noqa: E402
+from root_analytics import SpendingAnalytics  # noqa: E402
+from root_cache import clear_all_caches  # noqa: E402
+from root_pantry import Pantry  # noqa: E402
+from root_recipe_matcher import RecipeMatcher  # noqa: E402
+from root_recipe_similarity import RecipeSimilarity  # noqa: E402
+from root_database import DatabaseManager  # noqa: E402
+from root_models import ErrorLog  # noqa: E402
+from root_repositories import (  # noqa: E402
+    ErrorRepository, PriceHistoryRepository, ProductRepository, RecipeRepository,
+    ShoppingListRepository)
+from root_tracing import normalize_sql  # noqa: E402
+
+BASELINE_FILE = os.path.join(TESTS_DIR, "explain_baseline.json")
+
+_SKIPPED_KEYWORDS = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE", "--")
+_SCAN = re.compile(r"^SCAN (\w+)")
+_TEMP_BTREE = re.compile(r"^USE TEMP B-TREE FOR (.+)$")
+_NON_COVERING = re.compile(r"^SEARCH (\w+) USING INDEX (\w+)")
+
+
+@dataclass
+class StatementPlan:
+    sql: str
+    example: str
+    hot: bool = False
+    calls: int = 0
+    sources: List[str] = field(default_factory=list)
+    plan: List[str] = field(default_factory=list)
+    scans: List[str] = field(default_factory=list)
+    temp_btrees: List[str] = field(default_factory=list)
+    non_covering: List[str] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.scans or self.temp_btrees or self.non_covering)
+
+    def to_dict(self) -> dict:
+        return {"hot": self.hot, "scans": self.scans,
+                "temp_btrees": self.temp_btrees, "non_covering": self.non_covering}
+
+
+class StatementCollector:
+    """Keeps one expanded example of every statement shape run on the connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements: Dict[str, StatementPlan] = {}
+        self.source = ""
+        self.hot = False
+
+    def _trace(self, sql: str):
+        if sql.lstrip().upper().startswith(_SKIPPED_KEYWORDS):
+            return
+        key = normalize_sql(sql)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = StatementPlan(key, sql)
+            self.statements[key] = statement
+        statement.calls += 1
+        statement.hot = statement.hot or self.hot
+        if self.source not in statement.sources:
+            statement.sources.append(self.source)
+
+    @contextlib.contextmanager
+    def collecting(self, source: str, hot: bool):
+        self.source, self.hot = source, hot
+        self.connection.set_trace_callback(self._trace)
+        try:
+            yield
+        finally:
+            self.connection.set_trace_callback(None)
+
+
+def _sweep(ctx: BenchmarkContext) -> Dict[str, Callable]:
+    """Repository calls outside the benchmark cases, one per method."""
+    recipes = RecipeRepository()
+    products = ProductRepository()
+    shoplists = ShoppingListRepository()
+    errors = ErrorRepository()
+    prices = PriceHistoryRepository()
+    analytics = SpendingAnalytics()
+    pantry = Pantry()
+    matcher = RecipeMatcher()
+    similarity = RecipeSimilarity()
+    list_id = ctx.list_ids[0]
+    product_id = ctx.product_ids[0]
+    recipe_id = next(iter(recipes.get_all_recipes()))
+
+    def insert_and_delete_error():
+        error_id = errors.insert_error_log(ErrorLog(id=None, error_message="explain", error_time=None))
+        errors.delete_error_log(error_id)
+
+    return {
+        "recipes.get_recipe_by_id": lambda: recipes.get_recipe_by_id(recipe_id),
+        "recipes.get_recipes_by_ids": lambda: recipes.get_recipes_by_ids([recipe_id, recipe_id + 1]),
+        "recipes.iter_recipes": lambda: list(recipes.iter_recipes()),
+        "recipes.iter_recipe_ingredients": lambda: list(recipes.iter_recipe_ingredients()),
+        "recipes.get_all_tags": recipes.get_all_tags,
+        "recipes.get_ingredients_by_recipe_id": lambda: recipes.get_ingredients_by_recipe_id(recipe_id),
+        "recipes.get_ingredients_by_recipe_ids":
+            lambda: recipes.get_ingredients_by_recipe_ids([recipe_id, recipe_id + 1]),
+        "recipes.get_recipes_by_name": lambda: recipes.get_recipes_by_name("Benchmark resepti 1"),
+        "recipes.update_recipe": lambda: ctx.recipes.update_recipe(recipe_id, name="Explain"),
+        "recipes.delete_recipe": lambda: ctx.recipes.delete_recipe(recipe_id),
+        "products.iter_products": lambda: list(products.iter_products()),
+        "products.get_product_by_id": lambda: products.get_product_by_id(product_id),
+        "products.get_products_by_ids": lambda: products.get_products_by_ids(ctx.product_ids[:20]),
+        "products.get_product_ids_by_normalized_name": products.get_product_ids_by_normalized_name,
+        "products.get_all_categories": products.get_all_categories,
+        "products.get_products_by_shoplist_id": lambda: products.get_products_by_shoplist_id(list_id),
+        "products.get_products_by_name": lambda: products.get_products_by_name("maito"),
+        "products.update_product": lambda: ctx.products.update_product(product_id, price_per_unit=1.5),
+        "shoplists.iter_shopping_lists": lambda: list(shoplists.iter_shopping_lists()),
+        "shoplists.iter_shopping_list_items": lambda: list(shoplists.iter_shopping_list_items()),
+        "shoplists.get_shopping_list_by_id": lambda: shoplists.get_shopping_list_by_id(list_id),
+        "shoplists.get_unpurchased_items":
+            lambda: shoplists.get_unpurchased_items_by_shopping_list_id(list_id),
+        "shoplists.set_purchased_for_list":
+            lambda: shoplists.set_purchased_for_list(list_id, True, ctx.item_ids[:5]),
+        "shoplists.delete_shopping_list_item": lambda: shoplists.delete_shopping_list_item(ctx.item_ids[0]),
+        "shoplists.delete_shopping_list_by_id": lambda: shoplists.delete_shopping_list_by_id(ctx.list_ids[-1]),
+        "prices.get_price_history": lambda: prices.get_price_history(product_id),
+        "prices.get_price_at": lambda: prices.get_price_at(product_id, "2025-01-01 00:00:00"),
+        "prices.get_prices_at": lambda: prices.get_prices_at(ctx.product_ids[:20], "2025-01-01 00:00:00"),
+        "prices.compact": lambda: prices.compact(60.0),
+        "pantry.add_item": lambda: pantry.add_item(product_id, 500, "g", "2025-01-31"),
+        "pantry.get_items": pantry.get_items,
+        "pantry.get_expiring": lambda: pantry.get_expiring("2025-02-01"),
+        "pantry.add_purchased": lambda: pantry.add_purchased(ctx.item_ids[:50]),
+        "pantry.remove_purchased": lambda: pantry.remove_purchased(ctx.item_ids[:50]),
+        "pantry.cook": lambda: pantry.cook(recipe_id, 2),
+        "pantry.set_item": lambda: pantry.set_item(product_id, 1, "kg"),
+        "pantry.remove_item": lambda: pantry.remove_item(product_id),
+        "matcher.rebuild": matcher.rebuild,
+        "matcher.match_after_edit": lambda: (matcher._on_invalidate(recipe_id),
+                                             matcher.match(ctx.product_ids[:50], 1)),
+        "similarity.rebuild": similarity.rebuild,
+        "similarity.similar": lambda: similarity.similar(recipe_id),
+        "analytics.rebuild": analytics.rebuild,
+        "analytics.spend_by_period_month": lambda: analytics.spend_by_period("month", since="2024-01-01"),
+        "analytics.spend_by_product": lambda: analytics.spend_by_product(since="2024-01-01"),
+        "errors.insert_and_delete": insert_and_delete_error,
+        "errors.get_all_error_logs": errors.get_all_error_logs,
+        "errors.get_all_error_logs_asc": lambda: errors.get_all_error_logs("ASC"),
+        "products.delete_product": lambda: ctx.products.delete_product(ctx.product_ids[-1]),
+    }
+
+
+def collect(seed: int) -> Dict[str, StatementPlan]:
+    """Runs the workload on the open database and returns the statements it issued."""
+    ctx = BenchmarkContext(seed)
+    collector = StatementCollector(DatabaseManager.get_instance().connection)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, factory in CASES.items():
+            func = factory(ctx)
+            clear_all_caches()
+            with collector.collecting(name, hot=True):
+                func()
+        for name, func in _sweep(ctx).items():
+            clear_all_caches()
+            with collector.collecting(name, hot=False):
+                func()
+    return collector.statements
+
+
+def explain(connection: sqlite3.Connection, statement: StatementPlan):
+    """Fills in the plan of `statement` from EXPLAIN QUERY PLAN."""
+    rows = connection.execute("EXPLAIN QUERY PLAN " + statement.example).fetchall()
+    statement.plan = [row[3] for row in rows]
+    for detail in statement.plan:
+        scan = _SCAN.match(detail)
+        if scan:
+            statement.scans.append(scan.group(1))
+            continue
+        temp = _TEMP_BTREE.match(detail)
+        if temp:
+            statement.temp_btrees.append(temp.group(1))
+            continue
+        search = _NON_COVERING.match(detail)
+        if search:
+            statement.non_covering.append(f"{search.group(1)}.{search.group(2)}")
+
+
+def audit(tier: str, seed: int) -> Dict[str, StatementPlan]:
+    with tempfile.TemporaryDirectory() as tmp:
+        # The sweep deletes rows, so work on a copy.
+        path = os.path.join(tmp, "explain.db")
+        open_fixture_db(tier, seed, copy_to=path)
+        clear_all_caches()
+        try:
+            statements = collect(seed)
+            connection = DatabaseManager.get_instance().connection
+            for statement in statements.values():
+                explain(connection, statement)
+        finally:
+            DatabaseManager.reset_instance()
+    return statements
+
+
+def compare(statements: Dict[str, StatementPlan], baseline: Dict[str, dict]) -> List[str]:
+    """Returns a description of every hot statement whose plan got worse."""
+    regressions = []
+    for sql, statement in statements.items():
+        if not statement.hot:
+            continue
+        base = baseline.get(sql)
+        if base is None:
+            if statement.scans:
+                regressions.append(f"new hot statement scans {', '.join(statement.scans)}: {sql}")
+            continue
+        new_scans = sorted(set(statement.scans) - set(base["scans"]))
+        if new_scans:
+            regressions.append(f"full scan of {', '.join(new_scans)}: {sql}")
+        new_temp = sorted(set(statement.temp_btrees) - set(base["temp_btrees"]))
+        if new_temp:
+            regressions.append(f"temp B-tree for {', '.join(new_temp)}: {sql}")
+    return regressions
+
+
+def print_report(statements: Dict[str, StatementPlan], show_all: bool):
+    shown = [s for s in statements.values() if show_all or s.flagged]
+    shown.sort(key=lambda s: (not s.hot, not s.scans, s.sql))
+    for statement in shown:
+        marker = "HOT " if statement.hot else "    "
+        print(f"\n{marker}{statement.sql}")
+        print(f"     calls {statement.calls}, from {', '.join(statement.sources)}")
+        for detail in statement.plan:
+            print(f"     | {detail}")
+    flagged = [s for s in statements.values() if s.flagged]
+    print(f"\n{len(statements)} statements, {len(flagged)} flagged: "
+          f"{sum(bool(s.scans) for s in flagged)} scan, "
+          f"{sum(bool(s.temp_btrees) for s in flagged)} temp B-tree, "
+          f"{sum(bool(s.non_covering) for s in flagged)} non-covering")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN audit of the repository SQL.")
+    parser.add_argument("--tier", default="10k", help="Scale tier of the fixture database")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--all", action="store_true", help="Print every plan, not only flagged ones")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="Write the plans to this file")
+    args = parser.parse_args()
+
+    statements = audit(args.tier, args.seed)
+    print_report(statements, args.all)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({sql: {**s.to_dict(), "plan": s.plan, "calls": s.calls, "sources": s.sources}
+                       for sql, s in statements.items()}, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({sql: s.to_dict() for sql, s in statements.items()},
+                      f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(statements, baseline)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+    print("\nNo regressions." if baseline else "\nNo baseline to compare against.")
+
+
+if __name__ == "__main__":
+    main()
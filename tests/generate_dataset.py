@@ -0,0 +1,391 @@
+"""
+Deterministic synthetic datasets for benchmarks and tests.
+
+Builds a Cook & Cart database at a chosen scale tier. The same tier and
+seed always produce the same rows, so numbers from different runs and
+machines can be compared. Rows are written with executemany in a single
+transaction; the schema and triggers come from DatabaseManager.create_database.
+The price history and the purchase log are backdated to the generated
+timestamps, so as-of pricing and spending analytics see a year of history.
+
+Usage:
+    python tests/generate_dataset.py --tier 10k --seed 42
+    python tests/generate_dataset.py --tier 100k --out /tmp/big.db
+
+From code:
+    from generate_dataset import build_fixture_db, open_fixture_db
+    path = build_fixture_db("10k")        # cached under tests/fixtures/
+    db = open_fixture_db("10k")           # also makes it the app database
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from root_database import DatabaseManager, MIGRATIONS  # noqa: E402
+
+FIXTURE_DIR = os.path.join(ROOT_DIR, "tests", "fixtures")
+
+# Bump when the generated data changes so cached fixture files are rebuilt.
+# Fixture names also carry the schema version, so a new migration rebuilds them too.
+GENERATOR_VERSION = 2
+
+DEFAULT_SEED = 42
+
+# Timestamps are spread over the year before this date.
+REFERENCE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@dataclass(frozen=True)
+class ScaleTier:
+    products: int
+    recipes: int
+    shopping_lists: int
+    ingredients_per_recipe: tuple = (3, 15)
+    items_per_list: tuple = (5, 40)
+
+
+TIERS = {
+    "1k": ScaleTier(products=1_000, recipes=200, shopping_lists=50),
+    "10k": ScaleTier(products=10_000, recipes=2_000, shopping_lists=300),
+    "100k": ScaleTier(products=100_000, recipes=20_000, shopping_lists=2_000),
+}
+
+# (name, unit, typical price per unit, category)
+BASE_PRODUCTS = [
+    ("Kanafilee", "kg", 15.0, "Liha ja kala"),
+    ("Naudan jauheliha", "kg", 11.0, "Liha ja kala"),
+    ("Lohi", "kg", 20.0, "Liha ja kala"),
+    ("Silakka", "kg", 6.0, "Liha ja kala"),
+    ("Kananmunat", "kpl", 0.35, "Maitotuotteet"),
+    ("Maito", "l", 1.2, "Maitotuotteet"),
+    ("Voi", "kg", 12.0, "Maitotuotteet"),
+    ("Juusto", "kg", 14.0, "Maitotuotteet"),
+    ("Jogurtti", "l", 2.0, "Maitotuotteet"),
+    ("Kerma", "l", 2.5, "Maitotuotteet"),
+    ("Rahka", "kg", 4.0, "Maitotuotteet"),
+    ("Jauhot", "kg", 1.0, "Leipä ja viljatuotteet"),
+    ("Kaurahiutaleet", "kg", 1.6, "Leipä ja viljatuotteet"),
+    ("Ruisleipä", "kpl", 2.2, "Leipä ja viljatuotteet"),
+    ("Sokeri", "kg", 1.5, "Leipä ja viljatuotteet"),
+    ("Suola", "kg", 0.5, "Mausteet ja öljyt"),
+    ("Rypsiöljy", "l", 3.5, "Mausteet ja öljyt"),
+    ("Oliiviöljy", "l", 8.0, "Mausteet ja öljyt"),
+    ("Mustapippuri", "kg", 40.0, "Mausteet ja öljyt"),
+    ("Riisi", "kg", 2.0, "Kuivatuotteet"),
+    ("Pasta", "kg", 1.8, "Kuivatuotteet"),
+    ("Linssit", "kg", 3.5, "Kuivatuotteet"),
+    ("Tomaattimurska", "l", 1.5, "Säilykkeet"),
+    ("Kookosmaito", "l", 2.0, "Säilykkeet"),
+    ("Tomaatit", "kg", 3.0, "Kasvikset ja hedelmät"),
+    ("Kurkku", "kg", 2.5, "Kasvikset ja hedelmät"),
+    ("Perunat", "kg", 0.8, "Kasvikset ja hedelmät"),
+    ("Sipuli", "kg", 1.0, "Kasvikset ja hedelmät"),
+    ("Valkosipuli", "kpl", 0.4, "Kasvikset ja hedelmät"),
+    ("Paprika", "kg", 4.0, "Kasvikset ja hedelmät"),
+    ("Porkkana", "kg", 1.1, "Kasvikset ja hedelmät"),
+    ("Omena", "kg", 2.3, "Kasvikset ja hedelmät"),
+    ("Banaani", "kg", 1.7, "Kasvikset ja hedelmät"),
+    ("Sitruuna", "kpl", 0.7, "Kasvikset ja hedelmät"),
+    ("Tumma suklaa", "kg", 18.0, "Makeiset"),
+    ("Kahvi", "kg", 12.0, "Juomat"),
+    ("Appelsiinimehu", "l", 2.4, "Juomat"),
+]
+
+VARIANTS = ["", "Luomu", "Kotimainen", "Pirkka", "Rainbow", "Eko", "Premium",
+            "Laktoositon", "Gluteeniton", "Pakaste", "Tuore", "Maustettu"]
+
+RECIPE_DISHES = ["keitto", "pata", "salaatti", "vuoka", "pasta", "wokki",
+                 "piirakka", "pihvit", "laatikko", "curry", "leivonnaiset", "smoothie"]
+RECIPE_STYLES = ["Arki", "Mummon", "Nopea", "Juhla", "Kevyt", "Tulinen",
+                 "Kasvis", "Helppo", "Kesäinen", "Talvinen"]
+TAGS = ["arki", "juhla", "kasvis", "vegaani", "liha", "kala", "nopea",
+        "jälkiruoka", "aamiainen", "gluteeniton", "laktoositon", "budjetti"]
+
+# Ingredient quantities per product unit: (min, max, step)
+QUANTITY_RANGES = {
+    "kg": (0.1, 1.5, 0.05),
+    "l": (0.1, 2.0, 0.1),
+    "kpl": (1, 12, 1),
+}
+
+
+def _timestamp(rng: random.Random, max_days: int = 365) -> datetime:
+    return REFERENCE_TIME - timedelta(seconds=rng.randrange(max_days * 86400))
+
+
+def _fmt(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _fmt_ms(moment: datetime) -> str:
+    """The millisecond format the price history and purchase log triggers write."""
+    return moment.strftime("%Y-%m-%d %H:%M:%S.000")
+
+
+def _quantity(rng: random.Random, unit: str) -> float:
+    low, high, step = QUANTITY_RANGES[unit]
+    steps = int(round((high - low) / step))
+    return round(low + step * rng.randint(0, steps), 2)
+
+
+def _popularity_weights(count: int) -> list:
+    """Cumulative Zipf-like weights: a few staple products appear in most recipes and lists."""
+    cumulative = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** 0.8
+        cumulative.append(total)
+    return cumulative
+
+
+def _pick_products(rng: random.Random, product_ids: list, cum_weights: list, count: int) -> list:
+    chosen = []
+    seen = set()
+    while len(chosen) < count:
+        for product_id in rng.choices(product_ids, cum_weights=cum_weights, k=count):
+            if product_id not in seen:
+                seen.add(product_id)
+                chosen.append(product_id)
+                if len(chosen) == count:
+                    break
+    return chosen
+
+
+def generate_products(rng: random.Random, count: int) -> list:
+    rows = []
+    for i in range(count):
+        name, unit, price, category = BASE_PRODUCTS[i % len(BASE_PRODUCTS)]
+        variant = VARIANTS[(i // len(BASE_PRODUCTS)) % len(VARIANTS)]
+        serial = i // (len(BASE_PRODUCTS) * len(VARIANTS))
+        full_name = " ".join(part for part in (name, variant) if part)
+        if serial:
+            full_name = f"{full_name} {serial}"
+        price = round(price * rng.uniform(0.6, 1.6), 2)
+        created = _timestamp(rng, 730)
+        rows.append((full_name, unit, price, category, _fmt(created), _fmt(created)))
+    return rows
+
+
+def generate_price_history(rng: random.Random, products: list) -> list:
+    """
+    Price history rows (product_id, price_per_unit, unit, valid_from, valid_to)
+    as the trg_product_prices_* triggers would have written them: about a
+    third of the products had one to three earlier prices between their
+    creation and REFERENCE_TIME, and every product ends in its current price.
+    """
+    rows = []
+    for product_id, (_, unit, price, _, created, _) in enumerate(products, start=1):
+        valid_from = datetime.fromisoformat(created)
+        if rng.random() < 0.35:
+            span = int((REFERENCE_TIME - valid_from).total_seconds())
+            changes = sorted(valid_from + timedelta(seconds=rng.randrange(1, span))
+                             for _ in range(rng.randint(1, 3)))
+            for changed in changes:
+                earlier = round(price * rng.uniform(0.75, 1.1), 2)
+                rows.append((product_id, earlier, unit, _fmt_ms(valid_from), _fmt_ms(changed)))
+                valid_from = changed
+        rows.append((product_id, price, unit, _fmt_ms(valid_from), None))
+    return rows
+
+
+def generate_recipes(rng: random.Random, tier: ScaleTier, products: list,
+                     cum_weights: list) -> tuple:
+    product_ids = list(range(1, len(products) + 1))
+    recipes = []
+    ingredients = []
+    low, high = tier.ingredients_per_recipe
+    for recipe_id in range(1, tier.recipes + 1):
+        dish = rng.choice(RECIPE_DISHES)
+        name = f"{rng.choice(RECIPE_STYLES)} {dish} {recipe_id}"
+        tags = ", ".join(rng.sample(TAGS, rng.randint(0, 3)))
+        steps = rng.randint(2, 8)
+        instructions = "\n".join(
+            f"{step}. Valmistele ainekset ja kypsennä {rng.randint(5, 40)} minuuttia."
+            for step in range(1, steps + 1))
+        created = _fmt(_timestamp(rng))
+        recipes.append((name, instructions, tags, created, created))
+        for product_id in _pick_products(rng, product_ids, cum_weights, rng.randint(low, high)):
+            unit = products[product_id - 1][1]
+            ingredients.append((recipe_id, product_id, _quantity(rng, unit), unit, created, created))
+    return recipes, ingredients
+
+
+def generate_shopping_lists(rng: random.Random, tier: ScaleTier, products: list,
+                            cum_weights: list) -> tuple:
+    """
+    Shopping lists with a purchase history: the older a list is, the more of
+    its items are purchased. total_sum matches the items (unit = product unit).
+    """
+    product_ids = list(range(1, len(products) + 1))
+    lists = []
+    items = []
+    low, high = tier.items_per_list
+    for list_id in range(1, tier.shopping_lists + 1):
+        created = _timestamp(rng)
+        age_days = (REFERENCE_TIME - created).days
+        purchase_ratio = min(1.0, age_days / 30) if rng.random() < 0.9 else 0.0
+        total = 0.0
+        for product_id in _pick_products(rng, product_ids, cum_weights, rng.randint(low, high)):
+            _, unit, price, _, _, _ = products[product_id - 1]
+            quantity = _quantity(rng, unit)
+            total += price * quantity
+            purchased = 1 if rng.random() < purchase_ratio else 0
+            updated = created + timedelta(minutes=rng.randint(1, 60 * 24 * 3)) if purchased else created
+            items.append((list_id, product_id, quantity, unit, purchased,
+                          _fmt(created), _fmt(min(updated, REFERENCE_TIME))))
+        title = f"Ostokset {created:%d.%m.%Y} #{list_id}"
+        lists.append((title, round(total, 2), _fmt(created), _fmt(created)))
+    return lists, items
+
+
+# Purchased items at the price in effect when they were bought (updated_at),
+# or at the product's first price if it was bought before that.
+_PURCHASE_LOG_INSERT = """
+INSERT INTO purchase_log (item_id, shopping_list_id, product_id, category, quantity, unit,
+                          price_per_unit, price_unit, density, piece_weight, purchased_at)
+SELECT i.id, i.shopping_list_id, i.product_id, COALESCE(p.category, ''), i.quantity, i.unit,
+       pp.price_per_unit, pp.unit, p.density, p.piece_weight, i.updated_at || '.000'
+FROM shopping_list_items i
+JOIN products p ON p.id = i.product_id
+JOIN product_prices pp ON pp.id = COALESCE(
+    (SELECT h.id FROM product_prices h
+     WHERE h.product_id = i.product_id AND h.valid_from <= i.updated_at || '.000'
+     ORDER BY h.valid_from DESC, h.id DESC LIMIT 1),
+    (SELECT h.id FROM product_prices h
+     WHERE h.product_id = i.product_id
+     ORDER BY h.valid_from, h.id LIMIT 1))
+WHERE i.is_purchased = 1
+ORDER BY i.updated_at, i.id
+"""
+
+
+def generate_database(path: str, tier: str = "10k", seed: int = DEFAULT_SEED) -> dict:
+    """
+    Creates a new database at `path` filled with the given tier.
+
+    Returns:
+        dict: Row counts per table and the elapsed time.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown tier '{tier}', expected one of {', '.join(TIERS)}")
+    path = os.path.abspath(path)
+    if os.path.exists(path):
+        os.remove(path)
+    scale = TIERS[tier]
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    DatabaseManager.create_database(path, with_sample_data=False)
+    products = generate_products(rng, scale.products)
+    cum_weights = _popularity_weights(len(products))
+    recipes, ingredients = generate_recipes(rng, scale, products, cum_weights)
+    lists, items = generate_shopping_lists(rng, scale, products, cum_weights)
+    # Its own stream, so that the rows above do not depend on it.
+    history = generate_price_history(random.Random(f"{seed}-prices"), products)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO products (name, unit, price_per_unit, category, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", products)
+        conn.executemany(
+            "INSERT INTO recipes (name, instructions, tags, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)", recipes)
+        conn.executemany(
+            "INSERT INTO recipe_ingredients (recipe_id, product_id, quantity, unit, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", ingredients)
+        conn.executemany(
+            "INSERT INTO shopping_lists (title, total_sum, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?)", lists)
+        # purchased_count is maintained by trg_item_insert_purchased.
+        conn.executemany(
+            "INSERT INTO shopping_list_items "
+            "(shopping_list_id, product_id, quantity, unit, is_purchased, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", items)
+        # The triggers above stamped the price history and the purchase log
+        # with the current time; backdate both to the generated timestamps.
+        conn.execute("DELETE FROM product_prices")
+        conn.executemany(
+            "INSERT INTO product_prices (product_id, price_per_unit, unit, valid_from, valid_to) "
+            "VALUES (?, ?, ?, ?, ?)", history)
+        conn.execute("DELETE FROM purchase_log")
+        conn.execute(_PURCHASE_LOG_INSERT)
+    conn.execute("ANALYZE")
+    conn.close()
+
+    return {
+        "tier": tier,
+        "seed": seed,
+        "products": len(products),
+        "recipes": len(recipes),
+        "recipe_ingredients": len(ingredients),
+        "shopping_lists": len(lists),
+        "shopping_list_items": len(items),
+        "product_prices": len(history),
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+
+
+def fixture_path(tier: str, seed: int = DEFAULT_SEED) -> str:
+    return os.path.join(
+        FIXTURE_DIR, f"cookncart_{tier}_seed{seed}_v{GENERATOR_VERSION}_s{len(MIGRATIONS)}.db")
+
+
+def build_fixture_db(tier: str = "10k", seed: int = DEFAULT_SEED, force: bool = False) -> str:
+    """Returns the path of a cached fixture database, generating it on first use."""
+    path = fixture_path(tier, seed)
+    if force or not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        generate_database(tmp_path, tier, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def open_fixture_db(tier: str = "10k", seed: int = DEFAULT_SEED, copy_to: str = None) -> DatabaseManager:
+    """
+    Makes a fixture database the app database (DatabaseManager singleton).
+
+    Parameters:
+        copy_to (str): Open a fresh copy at this path instead of the cached
+            file. Use it for anything that writes.
+    """
+    path = build_fixture_db(tier, seed)
+    if copy_to:
+        src = sqlite3.connect(path)
+        dst = sqlite3.connect(copy_to)
+        src.backup(dst)
+        src.close()
+        dst.close()
+        path = copy_to
+    DatabaseManager.reset_instance()
+    return DatabaseManager(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Cook & Cart database.")
+    parser.add_argument("--tier", choices=sorted(TIERS), default="10k")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", help="Output path (default: cached fixture under tests/fixtures/)")
+    parser.add_argument("--force", action="store_true", help="Rebuild a cached fixture")
+    args = parser.parse_args()
+
+    if args.out:
+        stats = generate_database(args.out, args.tier, args.seed)
+        print(stats)
+        return
+    path = build_fixture_db(args.tier, args.seed, args.force)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
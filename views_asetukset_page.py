@@ -10,12 +10,18 @@ from root_controllers import ProductController as PC
 from root_controllers import ShoppingListController as SLC
 from root_controllers import RecipeController as RC
 from root_controllers import ErrorController
-from error_handler import catch_errors_ui
+from error_handler import catch_errors_ui, show_error_toast
 from qml import ScrollableLabel
+from views_tilastot_page import TilastotPage
+import root_profiling as profiling
 
 TURKOOSI = "#00B0F0"
 HARMAA = "#808080"
 CONFIG_FILE = "cookncart/utils/config.json"
+PROFILE_FILE = "utils/profile.json"
+# Prices replaced within this many seconds are dropped from the history,
+# unless something was bought at that price.
+PRICE_HISTORY_MIN_DURATION_S = 60.0
 
 # Create controller instances.
 RecipeController = RC()
@@ -43,6 +49,8 @@ class AsetuksetPage(QWidget):
         # Main layout for the page.
         main_layout = QVBoxLayout(self)
         self.error_log_page = None
+        self.profile_page = None
+        self.stats_page = None
 
         # -- Yläpalkki --
         top_bar_layout = QHBoxLayout()
@@ -72,6 +80,34 @@ class AsetuksetPage(QWidget):
         read_error_log_button.setObjectName("main_list_button")
         read_error_log_button.clicked.connect(self.display_error_log)
         initial_layout.addWidget(read_error_log_button)
+
+        stats_button = QPushButton("Tilastot")
+        stats_button.setObjectName("main_list_button")
+        stats_button.clicked.connect(self.display_stats)
+        initial_layout.addWidget(stats_button)
+
+        # Profiling: toggle, view and JSON export.
+        self.profiling_button = QPushButton()
+        self.profiling_button.setObjectName("main_list_button")
+        self.profiling_button.clicked.connect(self.toggle_profiling)
+        self._update_profiling_button()
+        initial_layout.addWidget(self.profiling_button)
+
+        show_profile_button = QPushButton("Näytä profilointi")
+        show_profile_button.setObjectName("main_list_button")
+        show_profile_button.clicked.connect(self.display_profile)
+        initial_layout.addWidget(show_profile_button)
+
+        save_profile_button = QPushButton("Tallenna profilointi (JSON)")
+        save_profile_button.setObjectName("main_list_button")
+        save_profile_button.clicked.connect(self.save_profile)
+        initial_layout.addWidget(save_profile_button)
+
+        compact_prices_button = QPushButton("Tiivistä hintahistoria")
+        compact_prices_button.setObjectName("main_list_button")
+        compact_prices_button.clicked.connect(self.compact_price_history)
+        initial_layout.addWidget(compact_prices_button)
+
         initial_layout.addStretch()  # Adds spacing if desired.
 
         self.stacked_widget.addWidget(self.initial_page)
@@ -116,6 +152,68 @@ class AsetuksetPage(QWidget):
         self.stacked_widget.addWidget(self.error_log_page)
         self.stacked_widget.setCurrentWidget(self.error_log_page)
 
+    @catch_errors_ui
+    def display_stats(self):
+        """
+        Display the spending statistics in the stacked widget.
+        """
+        self.window().hide_buttons()
+
+        self.stats_page = TilastotPage(parent=self)
+        self.back_button.show()
+
+        self.stacked_widget.addWidget(self.stats_page)
+        self.stacked_widget.setCurrentWidget(self.stats_page)
+
+    @catch_errors_ui
+    def _update_profiling_button(self):
+        state = "päällä" if profiling.is_enabled() else "pois"
+        self.profiling_button.setText(f"Profilointi: {state}")
+
+    @catch_errors_ui
+    def toggle_profiling(self):
+        """
+        Turn the per-function timing in catch_errors/catch_errors_ui on or off.
+        """
+        profiling.set_enabled(not profiling.is_enabled())
+        self._update_profiling_button()
+
+    @catch_errors_ui
+    def display_profile(self):
+        """
+        Display the collected profiling statistics in the stacked widget.
+        """
+        self.window().hide_buttons()
+
+        self.profile_page = QWidget()
+        self.back_button.show()
+        layout = QVBoxLayout(self.profile_page)
+        profile_label = ScrollableLabel(
+            parent=self, placeholder_text="Ei profilointitietoja. Kytke profilointi päälle.")
+        profile_label.set_text(profiling.format_report())
+        layout.addWidget(profile_label)
+
+        self.stacked_widget.addWidget(self.profile_page)
+        self.stacked_widget.setCurrentWidget(self.profile_page)
+
+    @catch_errors_ui
+    def save_profile(self):
+        """
+        Write the profiling statistics to PROFILE_FILE as JSON.
+        """
+        path = profiling.dump_json(PROFILE_FILE)
+        show_error_toast(self, f"Profilointi tallennettu: {path}",
+                         pos="top", background_color="green", text_color="black")
+
+    @catch_errors_ui
+    def compact_price_history(self):
+        """
+        Remove redundant product price history rows.
+        """
+        removed = ProductController.compact_price_history(PRICE_HISTORY_MIN_DURATION_S)
+        show_error_toast(self, f"Hintahistoriasta poistettu {removed} riviä.",
+                         pos="top", background_color="green", text_color="black")
+
     @catch_errors_ui
     def display_main_page(self):
         """
@@ -130,3 +228,11 @@ class AsetuksetPage(QWidget):
             self.stacked_widget.removeWidget(self.error_log_page)
             self.error_log_page.deleteLater()
             self.error_log_page = None
+        if self.profile_page is not None:
+            self.stacked_widget.removeWidget(self.profile_page)
+            self.profile_page.deleteLater()
+            self.profile_page = None
+        if self.stats_page is not None:
+            self.stacked_widget.removeWidget(self.stats_page)
+            self.stats_page.deleteLater()
+            self.stats_page = None
@@ -98,16 +98,28 @@ class OstolistatPage(QWidget):
         """Populate the scroll area with a button for each shopping list."""
         # Clear the scroll area before populating it again.
         self.scroll_area.clear_items()
+        # Purchased/total counts of every list in one query.
+        item_counts = self.shoplist_controller.get_item_counts()
         for shoplist_id, shoplist in self.shopping_lists.items():
-            # Count how many items are purchased.
-            purchased_count = self.shoplist_controller.get_purchased_count(
-                shoplist_id)
-            total_items = len(
-                self.shoplist_controller.get_items_by_shopping_list_id(shoplist_id))
-            # Create text showing purchased/total.
-            text = f"{shoplist.title}\n{purchased_count}/{total_items}"
+            total_items, purchased_count = item_counts.get(shoplist_id, (0, 0))
             if filter_text == "" or filter_text in shoplist.title.lower():
-                self.scroll_area.add_item(text, shoplist_id)
+                self.scroll_area.add_item(
+                    self._row_text(shoplist.title, purchased_count, total_items), shoplist_id)
+
+    @staticmethod
+    def _row_text(title: str, purchased_count: int, total_items: int) -> str:
+        """Text of one overview row: the title and purchased/total."""
+        return f"{title}\n{purchased_count}/{total_items}"
+
+    @catch_errors_ui
+    def update_shopping_list_row(self, shoplist_id: int, purchased_count: int, total_items: int):
+        """Updates the counts of one overview row in place instead of repopulating the list."""
+        shoplist = self.shopping_lists.get(shoplist_id)
+        if shoplist is None:
+            return
+        shoplist.purchased_count = purchased_count
+        self.scroll_area.set_item_text(
+            shoplist_id, self._row_text(shoplist.title, purchased_count, total_items))
 
     @catch_errors_ui
     def filter_shopping_lists(self, text):
@@ -177,6 +189,7 @@ class OstolistatPage(QWidget):
     def rm_shoplist_detail_widget(self):
         if self.page_detail:
             print("Removing page_detail")
+            self.page_detail.flush_pending()
             self.stacked.removeWidget(self.page_detail)
             self.page_detail.deleteLater()
             del self.page_detail
@@ -14,6 +14,10 @@ from error_handler import catch_errors_ui, show_error_toast
 
 TURKOOSI = "#00B0F0"
 HARMAA = "#808080"
+# Sort modes of the recipe list and their button labels. "kotona" lists
+# only the recipes the pantry covers but for PANTRY_MAX_MISSING products.
+SORT_MODES = ("nimi", "hinta", "kotona")
+PANTRY_MAX_MISSING = 2
 
 RecipeController = RC()
 ProductController = PC()
@@ -33,6 +37,9 @@ class ReseptitPage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.recipes_dict = {}
+        self.recipe_costs = {}
+        self.sort_mode = "nimi"
+        self.recipe_matches = []
         self.update_recipes_dict()
 
         main_layout = QVBoxLayout(self)
@@ -72,6 +79,9 @@ class ReseptitPage(QWidget):
         self.search_bar = MainSearchTextField(
             text_field_id="top_bar_search_bar", placeholder_text="Hae reseptejä")
         top_bar_search_layout.addWidget(self.search_bar)
+        self.sort_btn = QPushButton("Järjestä: nimi")
+        self.sort_btn.clicked.connect(self.toggle_sort)
+        top_bar_search_layout.addWidget(self.sort_btn)
 
         self.new_btn = QPushButton("Uusi resepti")
         self.new_btn.setObjectName("top_bar_new_button")
@@ -112,19 +122,56 @@ class ReseptitPage(QWidget):
         Fetches all recipes from the RecipeController and updates the local dictionary.
         """
         self.recipes_dict = RecipeController.get_all_recipes()
+        if self.sort_mode == "hinta":
+            self.recipe_costs = RecipeController.get_recipe_costs()
+        elif self.sort_mode == "kotona":
+            self.recipe_matches = RecipeController.match_recipes(max_missing=PANTRY_MAX_MISSING)
 
     @catch_errors_ui
     def populate_recipe_list(self, filter_text=""):
         # Clear current layout
         self.scroll_area.clear_items()
-        # Sort recipes by name (case-insensitive)
-        sorted_recipes = sorted(
-            self.recipes_dict.values(),
-            key=lambda r: r.name.lower()
-        )
+        if self.sort_mode == "kotona":
+            # Best pantry coverage first, as ranked by the matcher.
+            for match in self.recipe_matches:
+                recipe = self.recipes_dict.get(match.recipe_id)
+                if recipe is None or (filter_text and filter_text not in recipe.name.lower()):
+                    continue
+                missing = len(match.missing)
+                status = "kaikki kotona" if not missing else f"puuttuu {missing}"
+                self.scroll_area.add_item(f"{recipe.name} – {status}", recipe.id)
+            return
+        if self.sort_mode == "hinta":
+            # Cheapest first; recipes without a cost go last.
+            costs = self.recipe_costs
+            sorted_recipes = sorted(
+                self.recipes_dict.values(),
+                key=lambda r: (costs[r.id].total if r.id in costs else float("inf"),
+                               r.name.lower())
+            )
+        else:
+            # Sort recipes by name (case-insensitive)
+            sorted_recipes = sorted(
+                self.recipes_dict.values(),
+                key=lambda r: r.name.lower()
+            )
         for recipe in sorted_recipes:
             if filter_text == "" or filter_text in recipe.name.lower():
-                self.scroll_area.add_item(recipe.name, recipe.id)
+                text = recipe.name
+                if self.sort_mode == "hinta" and recipe.id in self.recipe_costs:
+                    text = f"{recipe.name} – {self.recipe_costs[recipe.id].total:.2f} €"
+                self.scroll_area.add_item(text, recipe.id)
+
+    @catch_errors_ui
+    def toggle_sort(self):
+        """Cycles the recipe list through name, cost and pantry order."""
+        self.sort_mode = SORT_MODES[(SORT_MODES.index(self.sort_mode) + 1) % len(SORT_MODES)]
+        if self.sort_mode == "hinta":
+            self.recipe_costs = RecipeController.get_recipe_costs()
+        elif self.sort_mode == "kotona":
+            self.recipe_matches = RecipeController.match_recipes(max_missing=PANTRY_MAX_MISSING)
+        self.sort_btn.setText(f"Järjestä: {self.sort_mode}")
+        self.populate_recipe_list(filter_text=self.search_bar.get_text().lower().strip())
 
     @catch_errors_ui
     def display_recipe_detail(self, recipe):
@@ -0,0 +1,85 @@
+# File: views_tilastot_page.py --------------------------------------------------------------------
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton
+
+from root_controllers import AnalyticsController
+from error_handler import catch_errors_ui
+from qml import ScrollableLabel
+
+# Periods shown in the spend-per-period section.
+PERIOD_ROWS = 8
+TOP_PRODUCTS = 10
+FREQUENCY_ROWS = 10
+
+
+class TilastotPage(QWidget):
+    """
+    Tilastot-sivu, avataan Asetukset-sivulta:
+      - Napit viikko- ja kuukausinäkymän välillä
+      - Kulutus jaksoittain, kategorioittain, eniten maksaneet tuotteet
+        ja useimmin ostetut tuotteet keskimääräisine ostoväleineen
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.controller = AnalyticsController()
+        self.period = "week"
+
+        layout = QVBoxLayout(self)
+        period_layout = QHBoxLayout()
+        self.week_button = QPushButton("Viikoittain")
+        self.week_button.clicked.connect(lambda: self.set_period("week"))
+        self.month_button = QPushButton("Kuukausittain")
+        self.month_button.clicked.connect(lambda: self.set_period("month"))
+        period_layout.addWidget(self.week_button)
+        period_layout.addWidget(self.month_button)
+        layout.addLayout(period_layout)
+
+        self.stats_label = ScrollableLabel(
+            parent=self, placeholder_text="Ei ostoja vielä. Merkitse ostoslistan tuotteita ostetuiksi.")
+        layout.addWidget(self.stats_label, 1)
+
+        self.set_period(self.period)
+
+    @catch_errors_ui
+    def set_period(self, period: str):
+        self.period = period
+        # The selected period keeps the default style, the other one is gray.
+        for button, value in ((self.week_button, "week"), (self.month_button, "month")):
+            button.setObjectName("" if value == period else "gray_button")
+            button.style().unpolish(button)
+            button.style().polish(button)
+        self.update_stats()
+
+    @catch_errors_ui
+    def update_stats(self):
+        """Refreshes the rollups with new purchases and redraws the report."""
+        periods = self.controller.get_spend_by_period(self.period, limit=PERIOD_ROWS)
+        if not periods:
+            self.stats_label.set_text("")
+            return
+        categories = self.controller.get_spend_by_category()
+        top_products = self.controller.get_top_products(TOP_PRODUCTS)
+        frequency = self.controller.get_purchase_frequency(limit=FREQUENCY_ROWS)
+
+        title = "Viikko" if self.period == "week" else "Kuukausi"
+        lines = [f"Kulutus ({title.lower()})"]
+        lines += [f"  {row.key}: {row.amount:.2f} € ({row.purchases} ostoa)" for row in periods]
+
+        lines += ["", "Kategoriat"]
+        lines += [f"  {row.key or 'Ei kategoriaa'}: {row.amount:.2f} €" for row in categories]
+
+        lines += ["", f"Top {TOP_PRODUCTS} tuotteet"]
+        lines += [f"  {index}. {row.name}: {row.amount:.2f} € ({row.purchases} ostoa)"
+                  for index, row in enumerate(top_products, start=1)]
+
+        lines += ["", "Ostotiheys"]
+        for row in frequency:
+            interval = row.interval_days
+            interval_text = f"{interval:.1f} pv välein" if interval is not None else "yhtenä päivänä"
+            lines.append(f"  {row.name}: {row.purchases} ostoa, {interval_text}, viimeksi {row.last_day}")
+
+        unpriced = sum(row.unpriced for row in categories)
+        if unpriced:
+            lines += ["", f"{unpriced} ostoa ilman hintaa ei näy summissa."]
+        self.stats_label.set_text("\n".join(lines))
@@ -247,8 +247,10 @@ class AddProductsWidget(QWidget):
         root_obj = target.get_root_object()
         if root_obj is not None:
             root_obj.clearTags()
+            products_by_id = self.product_controller.get_products_by_ids(
+                [p["id"] for p in products])
             for p in products:
-                product = self.product_controller.get_product_by_id(p["id"])
+                product = products_by_id[p["id"]]
                 root_obj.addTag(
                     product.name, p["id"], p["quantity"], p["unit"])
 
@@ -10,6 +10,7 @@ from PySide6.QtCore import Signal
 from widgets_add_tags_widget import AddTagsWidget
 from widgets_add_products_widget import AddProductsWidget
 from qml import NormalTextField, TallTextField
+from root_models import DEFAULT_SERVINGS
 
 from error_handler import catch_errors_ui, show_error_toast
 
@@ -92,6 +93,15 @@ class AddRecipeWidget(QWidget):
         layout.addWidget(instructions_label)
         layout.addWidget(self.instructions_edit)
 
+        # Servings the ingredient quantities are for.
+        servings_label = QLabel("Annoksia:")
+        self.servings_edit = NormalTextField(
+            text_field_id="servings_edit",
+            placeholder_text=f"Oletus {DEFAULT_SERVINGS}"
+        )
+        layout.addWidget(servings_label)
+        layout.addWidget(self.servings_edit)
+
         # 3) Tags selection: show current tags and a button to edit them.
         self.tags_display_label = QLabel()
         if self.selected_tags:
@@ -202,6 +212,7 @@ class AddRecipeWidget(QWidget):
         # Prepopulate text fields with the recipe data.
         self.name_edit.set_text(recipe.name)
         self.instructions_edit.set_text(recipe.instructions)
+        self.servings_edit.set_text(str(recipe.servings))
         # Assume recipe.tags is a comma-separated string.
         if recipe.tags:
             tags_list = [tag.strip()
@@ -243,6 +254,15 @@ class AddRecipeWidget(QWidget):
         if not instructions:
             instructions = ""
 
+        servings_str = self.servings_edit.get_text().strip()
+        try:
+            servings = int(servings_str) if servings_str else DEFAULT_SERVINGS
+        except ValueError:
+            servings = 0
+        if servings <= 0:
+            self._show_error("Annosmäärän täytyy olla positiivinen kokonaisluku.")
+            return
+
         # Validate selected products
         for p in self.selected_products:
             try:
@@ -283,7 +303,8 @@ class AddRecipeWidget(QWidget):
                     name=name,
                     instructions=instructions,
                     tags=tags,
-                    ingredients=ingredients
+                    ingredients=ingredients,
+                    servings=servings
                 )
                 recipe = updated_recipe
             else:
@@ -292,7 +313,8 @@ class AddRecipeWidget(QWidget):
                     name=name,
                     instructions=instructions,
                     tags=tags,
-                    ingredients=ingredients
+                    ingredients=ingredients,
+                    servings=servings
                 )
         except Exception as e:
             print(f"Reseptin tallennus epäonnistui: {e}")
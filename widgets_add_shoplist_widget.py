@@ -48,6 +48,9 @@ class AddShoplistWidget(QWidget):
     def _handle_finished_add_products(self, selected_products):
         """Handles the selection of products from AddProductsWidget."""
         self.selected_products = []
+        # Fetch full product details from the database in one batch.
+        products = self.product_controller.get_products_by_ids(
+            [p.get("id") for p in selected_products if p.get("id")])
         for product_data in selected_products:
             product_id = product_data.get("id")
             quantity = product_data.get("quantity", 1)
@@ -56,8 +59,7 @@ class AddShoplistWidget(QWidget):
                 print(
                     "ERROR: Missing product ID in selected product data:", product_data)
                 continue
-            # Fetch full product details from the database.
-            product = self.product_controller.get_product_by_id(product_id)
+            product = products.get(product_id)
             if not product:
                 print(
                     f"ERROR: Product with ID {product_id} not found in database.")
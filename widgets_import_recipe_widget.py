@@ -5,7 +5,10 @@ from PySide6.QtWidgets import (
     QPushButton, QStackedWidget
 )
 from PySide6.QtCore import Signal, Qt
-from root_controllers import RecipeController, ProductController
+from root_controllers import RecipeController, ProductController, PantryController
+from root_meal_plan import consolidate
+from root_pantry import take_from_stock
+from root_models import DEFAULT_SERVINGS
 from qml import ScrollViewWidget, MainSearchTextField, IngredientSelectorWidget
 
 from error_handler import catch_errors_ui, show_error_toast
@@ -23,7 +26,9 @@ class ImportRecipeWidget(QWidget):
         # Create controller instances (or receive them as parameters)
         self.recipe_controller = RecipeController()
         self.product_controller = ProductController()
+        self.pantry_controller = PantryController()
         self.selected_recipe = None
+        self.servings = DEFAULT_SERVINGS
         self.selected_products = selected_products
         self._init_ui()
 
@@ -99,6 +104,7 @@ class ImportRecipeWidget(QWidget):
         recipe = self.recipe_controller.get_recipe_by_id(id)
         if recipe:
             self.selected_recipe = recipe
+            self.servings = recipe.servings
             self._populate_ingredient_list(recipe)
             self.stacked.setCurrentIndex(1)
 
@@ -114,6 +120,18 @@ class ImportRecipeWidget(QWidget):
         self.select_all_btn.clicked.connect(self._on_select_all)
         top_bar.addWidget(self.select_all_btn)
         layout.addLayout(top_bar)
+        # Servings: the quantities below are scaled to this many servings.
+        servings_bar = QHBoxLayout()
+        self.servings_down_btn = QPushButton("−")
+        self.servings_down_btn.clicked.connect(lambda: self._change_servings(-1))
+        self.servings_label = QLabel()
+        self.servings_up_btn = QPushButton("+")
+        self.servings_up_btn.clicked.connect(lambda: self._change_servings(1))
+        servings_bar.addWidget(self.servings_down_btn)
+        servings_bar.addWidget(self.servings_label)
+        servings_bar.addWidget(self.servings_up_btn)
+        servings_bar.addStretch()
+        layout.addLayout(servings_bar)
         # Ingredient list with checkboxes
         self.ingredient_list_widget = IngredientSelectorWidget(parent=self)
         layout.addWidget(self.ingredient_list_widget)
@@ -130,16 +148,39 @@ class ImportRecipeWidget(QWidget):
         layout.addLayout(btn_layout)
 
     @catch_errors_ui
-    def _populate_ingredient_list(self, recipe):
+    def _populate_ingredient_list(self, recipe, checked_ids=()):
         self.ingredient_list_widget.clear_tags()
+        self.servings_label.setText(f"{self.servings} annosta")
+        ingredients = self.recipe_controller.get_scaled_ingredients(recipe.id, self.servings)
+        # Fetch the product names for all ingredients in one batch.
+        product_ids = [ing.product_id for ing in ingredients]
+        products = self.product_controller.get_products_by_ids(product_ids)
+        stock = self.pantry_controller.get_stock(product_ids)
         # For each ingredient in the selected recipe, add a checkable list item.
-        for ing in recipe.ingredients:
-            # Use product controller to fetch product name.
-            product = self.product_controller.get_product_by_id(ing.product_id)
+        # The amount at home is subtracted; an ingredient the pantry covers
+        # in full keeps its quantity in case the user wants it anyway.
+        for ing in ingredients:
+            product = products.get(ing.product_id)
             product_name = product.name if product else f"Tuote {ing.product_id}"
-            text = f"{product_name}: {ing.quantity} {ing.unit}"
+            at_home = take_from_stock(stock, ing.product_id, ing.quantity, ing.unit, product)
+            quantity = round(ing.quantity - at_home, 3)
+            text = f"{product_name}: {ing.quantity:g} {ing.unit}"
+            if at_home and quantity > 0:
+                text += f" (kotona {round(at_home, 3):g}, puuttuu {quantity:g})"
+            elif at_home:
+                text += " (kotona)"
+                quantity = ing.quantity
             self.ingredient_list_widget.get_root_object().addTag(
-                text, False, ing.quantity, ing.unit, ing.product_id)
+                text, ing.product_id in checked_ids, quantity, ing.unit, ing.product_id)
+
+    @catch_errors_ui
+    def _change_servings(self, step):
+        if not self.selected_recipe or self.servings + step < 1:
+            return
+        self.servings += step
+        # Rebuilding the list keeps the ingredients the user already checked.
+        checked_ids = {tag["id"] for tag in self.ingredient_list_widget.get_selected_tags().toVariant()}
+        self._populate_ingredient_list(self.selected_recipe, checked_ids)
 
     @catch_errors_ui
     def _on_select_all(self):
@@ -153,12 +194,26 @@ class ImportRecipeWidget(QWidget):
     @catch_errors_ui
     def _on_import(self):
         selected_products = self.ingredient_list_widget.get_selected_tags().toVariant()
-        for product in selected_products:
-            self.selected_products.append(product)
-        if selected_products:
-            self.importCompleted.emit(self.selected_products)
-        else:
+        if not selected_products:
             self._show_error("Et ole valinnut yhtään ainesosaa.")
+            return
+        # A product already on the list is summed with the imported amount
+        # instead of being added twice.
+        products = self.product_controller.get_products_by_ids(
+            [p["id"] for p in self.selected_products + selected_products])
+        items = consolidate(
+            ((p["id"], p.get("quantity", 1), p.get("unit") or "") for p in self.selected_products),
+            products, normalize=False)
+        unconverted = []
+        consolidate(((p["id"], p["quantity"], p.get("unit") or "") for p in selected_products),
+                    products, items, normalize=False, unconverted=unconverted)
+        self.selected_products = [
+            {"id": item.product_id, "quantity": round(item.quantity, 3), "unit": item.unit}
+            for item in items.values()]
+        if unconverted:
+            self._show_error(
+                f"{len(unconverted)} ainesosaa ohitettiin: yksikköä ei voi muuntaa.")
+        self.importCompleted.emit(self.selected_products)
 
     @catch_errors_ui
     def _on_cancel(self):
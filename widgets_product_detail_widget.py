@@ -10,6 +10,9 @@ from widgets_product_form_widget import ProductFormWidget
 
 from error_handler import catch_errors_ui, show_error_toast
 
+# Price history rows shown under the product details.
+PRICE_HISTORY_ROWS = 5
+
 
 class ProductDetailWidget(QWidget):
     @catch_errors_ui
@@ -48,8 +51,10 @@ class ProductDetailWidget(QWidget):
         self.price_label = QLabel()
         self.category_label = QLabel()
         self.unit_label = QLabel()
+        self.price_history_label = QLabel()
 
-        for lbl in [self.name_label, self.price_label, self.category_label, self.unit_label]:
+        for lbl in [self.name_label, self.price_label, self.category_label, self.unit_label,
+                    self.price_history_label]:
             lbl.setWordWrap(True)
             layout.addWidget(lbl)
 
@@ -87,14 +92,27 @@ class ProductDetailWidget(QWidget):
             self.price_label.setText(f"Hinta: {price_text}")
             self.category_label.setText(f"Kategoria: {product.category}")
             self.unit_label.setText(f"Yksikkö: {unit_display}")
+            self._update_price_history(currency_unit)
         else:
             self.name_label.setText("Tuotetta ei löytynyt")
             self.price_label.setText("")
             self.category_label.setText("")
             self.unit_label.setText("")
+            self.price_history_label.setText("")
         # Ensure the detail view is shown.
         self.stacked.setCurrentIndex(0)
 
+    @catch_errors_ui
+    def _update_price_history(self, currency_unit):
+        """Shows the latest prices of the product, newest first."""
+        history = self.product_controller.get_price_history(self.product.id)
+        if len(history) < 2:
+            self.price_history_label.setText("")
+            return
+        lines = [f"{point.valid_from[:10]}: {point.price_per_unit or 0:.2f} {currency_unit}/{point.unit}"
+                 for point in reversed(history[-PRICE_HISTORY_ROWS:])]
+        self.price_history_label.setText("Hintahistoria:\n" + "\n".join(lines))
+
     @catch_errors_ui
     def _switch_to_edit_view(self):
         """Switches the stacked widget to display the edit product view."""
@@ -5,12 +5,14 @@ from PySide6.QtWidgets import (
     QHBoxLayout, QStackedWidget
 )
 from PySide6.QtCore import Signal
-from root_controllers import RecipeController, ProductController
+from root_controllers import RecipeController, ProductController, PantryController
 
 from error_handler import catch_errors_ui, show_error_toast
 
 TURKOOSI = "#00B0F0"
 HARMAA = "#808080"
+# Similar recipes shown under the ingredients.
+SIMILAR_RECIPES = 3
 
 
 class RecipeDetailWidget(QWidget):
@@ -23,6 +25,7 @@ class RecipeDetailWidget(QWidget):
         super().__init__(parent)
         self.recipe_controller = RecipeController()
         self.product_controller = ProductController()
+        self.pantry_controller = PantryController()
         self.recipe = None  # Currently displayed recipe
 
         # Use a QStackedWidget to hold the detail view (and optionally other pages)
@@ -38,13 +41,22 @@ class RecipeDetailWidget(QWidget):
         self.instructions_label = QLabel()
         self.tags_label = QLabel()
         self.ingredients_label = QLabel()
+        self.cost_label = QLabel()
         for lbl in [self.name_label, self.instructions_label,
-                    self.tags_label, self.ingredients_label]:
+                    self.tags_label, self.ingredients_label, self.cost_label]:
             lbl.setWordWrap(True)
             detail_layout.addWidget(lbl)
 
-        # Buttons: Edit, Delete, Back
+        # Similar recipes: one button per recipe, rebuilt by set_recipe().
+        self.similar_label = QLabel()
+        detail_layout.addWidget(self.similar_label)
+        self.similar_layout = QVBoxLayout()
+        detail_layout.addLayout(self.similar_layout)
+
+        # Buttons: Cooked, Edit, Delete, Back
         btn_layout = QHBoxLayout()
+        self.cooked_btn = QPushButton("Kokattu")
+        btn_layout.addWidget(self.cooked_btn)
         self.edit_btn = QPushButton("Muokkaa reseptiä")
         self.delete_btn = QPushButton("Poista resepti")
         self.delete_btn.setObjectName("delete_button")
@@ -57,6 +69,7 @@ class RecipeDetailWidget(QWidget):
         self.stacked.addWidget(self.detail_page)  # index 0
 
         # --- Signal Connections ---
+        self.cooked_btn.clicked.connect(self.on_cooked_clicked)
         self.edit_btn.clicked.connect(self.switch_to_edit_view)
         self.delete_btn.clicked.connect(self.on_delete_clicked)
         # (Assume back_btn is handled by the parent view.)
@@ -70,20 +83,68 @@ class RecipeDetailWidget(QWidget):
             instructions_formatted = recipe.instructions.replace("\n", "<br>")
             self.instructions_label.setText(
                 f"<b>Ohjeet:</b><br>{instructions_formatted}")
-            self.tags_label.setText(f"<b>Tagit:</b> {recipe.tags}")
+            self.tags_label.setText(
+                f"<b>Tagit:</b> {recipe.tags}<br><b>Annoksia:</b> {recipe.servings}")
             ingredients_text = ""
+            products = self.product_controller.get_products_by_ids(
+                [ingredient.product_id for ingredient in recipe.ingredients])
             for ingredient in recipe.ingredients:
-                product = self.product_controller.get_product_by_id(
-                    ingredient.product_id)
+                product = products.get(ingredient.product_id)
                 product_name = product.name if product else f"Tuote {ingredient.product_id}"
                 quantity_str = f"{ingredient.quantity:g}"
                 ingredients_text += f"{product_name}: {quantity_str} {ingredient.unit}<br>"
             self.ingredients_label.setText(ingredients_text)
+            self._update_cost_label()
+            self._update_similar_recipes()
         else:
             self.name_label.setText("Reseptiä ei löytynyt")
             self.instructions_label.clear()
             self.tags_label.clear()
             self.ingredients_label.clear()
+            self.cost_label.clear()
+            self._clear_similar_recipes()
+
+    @catch_errors_ui
+    def _clear_similar_recipes(self):
+        self.similar_label.clear()
+        while self.similar_layout.count():
+            widget = self.similar_layout.takeAt(0).widget()
+            if widget is not None:
+                widget.deleteLater()
+
+    @catch_errors_ui
+    def _update_similar_recipes(self):
+        self._clear_similar_recipes()
+        similar = self.recipe_controller.get_similar_recipes(self.recipe.id, SIMILAR_RECIPES)
+        if not similar:
+            return
+        self.similar_label.setText("<b>Samankaltaiset reseptit:</b>")
+        for recipe, similarity in similar:
+            button = QPushButton(f"{recipe.name} ({similarity * 100:.0f} % samoja tuotteita)")
+            button.setObjectName("gray_button")
+            button.clicked.connect(lambda _, r=recipe: self.set_recipe(
+                self.recipe_controller.get_recipe_by_id(r.id)))
+            self.similar_layout.addWidget(button)
+
+    @catch_errors_ui
+    def _update_cost_label(self):
+        cost = self.recipe_controller.get_recipe_cost(self.recipe.id)
+        if cost is None:
+            self.cost_label.clear()
+            return
+        text = f"<b>Hinta:</b> {cost.total:.2f} € ({cost.per_serving(self.recipe.servings):.2f} €/annos)"
+        if not cost.complete:
+            text += f" ({cost.unpriced_count} ainesosaa ilman hintaa)"
+        self.cost_label.setText(text)
+
+    @catch_errors_ui
+    def on_cooked_clicked(self):
+        """Deducts the recipe's ingredients from the pantry."""
+        if not self.recipe:
+            return
+        deducted = self.pantry_controller.cook_recipe(self.recipe.id)
+        show_error_toast(self, f"Ruokakomerosta vähennetty {deducted} tuotetta.",
+                         pos="top", background_color="green", text_color="black")
 
     @catch_errors_ui
     def switch_to_edit_view(self):
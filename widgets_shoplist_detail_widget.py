@@ -11,6 +11,8 @@ from root_models import ShoppingList, ShoppingListItem
 from widgets_add_products_widget import AddProductsWidget
 from widgets_import_recipe_widget import ImportRecipeWidget
 from qml import ShoplistWidget
+from root_pricing import pricing
+from root_purchase_queue import PurchaseStatusQueue
 
 from error_handler import catch_errors_ui, show_error_toast, ask_confirmation
 
@@ -32,6 +34,10 @@ class ShoplistDetailWidget(QWidget):
         self.shoplist_controller = SLC()
         self.pc = PC()
         self.shoppinglist = None  # Current shopping list
+        # Items of the current list by id, with purchase states as shown in the UI.
+        self._items = {}
+        self._prices = {}
+        self.purchase_queue = None
         self.layout = QVBoxLayout(self)
         self.stacked_widget = QStackedWidget()
         self.layout.addWidget(self.stacked_widget)
@@ -104,7 +110,10 @@ class ShoplistDetailWidget(QWidget):
     @catch_errors_ui
     def set_shopping_list(self, shopping_list: ShoppingList):
         """Sets the current shopping list and refreshes the product list."""
+        self.flush_pending()
         self.shoppinglist = shopping_list
+        self.purchase_queue = PurchaseStatusQueue(
+            shopping_list.id, controller=self.shoplist_controller, parent=self)
         self.shoplist_label.setText(shopping_list.title)
         self._refresh_product_list()
 
@@ -115,43 +124,29 @@ class ShoplistDetailWidget(QWidget):
         if not self.shoppinglist:
             return
 
+        self.flush_pending()
         self.product_list.clear_tags()
         shopping_list_items = self.shoplist_controller.repo.get_items_by_shopping_list_id(
             self.shoppinglist.id)
+        self._items = {item.id: item for item in shopping_list_items}
 
-        total_cost = 0  # Cost for unpurchased items
+        products = self.pc.get_products_by_ids(
+            list({item.product_id for item in shopping_list_items}))
+        self._prices = pricing.item_prices(shopping_list_items)
 
         for item in shopping_list_items:
-            product = self.pc.get_all_products().get(item.product_id)
+            product = products.get(item.product_id)
             if product:
-                # Determine product_price based on the unit
-                if item.unit == "kpl":
-                    product_price = product.price_per_unit * item.quantity
-                elif item.unit == "kg":
-                    product_price = product.price_per_unit * item.quantity
-                elif item.unit == "g":
-                    product_price = product.price_per_unit * \
-                        (item.quantity / 1000.0)
-                elif item.unit == "mg":
-                    product_price = product.price_per_unit * \
-                        (item.quantity / 1000000.0)
-                elif item.unit == "l":
-                    product_price = product.price_per_unit * item.quantity
-                elif item.unit == "dl":
-                    product_price = product.price_per_unit * \
-                        (item.quantity / 10.0)
-                elif item.unit == "ml":
-                    product_price = product.price_per_unit * \
-                        (item.quantity / 1000.0)
-                else:
-                    product_price = 0  # Or handle unknown units appropriately
-
-                if not item.is_purchased:
-                    total_cost += product_price
+                product_price = self._prices[item.id]
                 checked = True if item.is_purchased == 1 else False
                 self.add_tag(text=product.name, checked=checked, id=item.id,
                              quantity=item.quantity, unit=item.unit, price=product_price)
-        self._update_total_cost_label(total_cost)
+        self._update_total_cost_label(self._unpurchased_total())
+
+    def _unpurchased_total(self) -> float:
+        """Cost of the unpurchased items, from the in-memory state."""
+        return round(sum(price for item_id, price in self._prices.items()
+                         if not self._items[item_id].is_purchased), 2)
 
     @catch_errors_ui
     def add_tag(self, text="", id=0, checked=False, quantity=0, unit="", price=0):
@@ -173,40 +168,60 @@ class ShoplistDetailWidget(QWidget):
     @catch_errors_ui
     def _on_item_clicked(self, item_id, checked, total_cost):
         """Handles the click event on a shopping list item.
-        Updates the purchase status of the item in the database."""
-        shopping_list_items = self.shoplist_controller.repo.get_items_by_shopping_list_id(
-            self.shoppinglist.id)
-        print(
-            f"Item clicked: {item_id}, Checked: {checked}, Total Cost: {total_cost}")
-        for item in shopping_list_items:
-            if item.id == item_id:
-                item.is_purchased = checked
-                break
-        self.shoplist_controller.update_purchased_status(item_id, not checked)
-        self.shoplist_controller.update_total_sum(
-            self.shoppinglist.id, total_cost)
+        `checked` is the state before the click. The new state is applied in
+        memory and queued; the database write happens in the next flush."""
+        item = self._items.get(item_id)
+        if item is None:
+            return
+        stored = bool(item.is_purchased)
+        item.is_purchased = not checked
+        total_cost = self._unpurchased_total()
+        self.purchase_queue.set_status(
+            item_id, item.is_purchased, stored=stored, total_sum=total_cost)
         self._update_total_cost_label(total_cost)
-        self.parent.populate_shopping_list()
+        self._update_overview_row()
+
+    def _update_overview_row(self):
+        purchased_count = sum(1 for item in self._items.values() if item.is_purchased)
+        self.parent.update_shopping_list_row(
+            self.shoppinglist.id, purchased_count, len(self._items))
+
+    @catch_errors_ui
+    def flush_pending(self):
+        """Writes queued purchase states to the database."""
+        if self.purchase_queue is not None:
+            self.purchase_queue.flush()
+
+    def hideEvent(self, event):
+        # Leaving the view by any route writes the queued toggles.
+        self.flush_pending()
+        super().hideEvent(event)
 
     @catch_errors_ui
     def set_all_checked(self):
+        self.flush_pending()
         self.product_list.set_all_checked()
-        shopping_list_items = self.shoplist_controller.repo.get_items_by_shopping_list_id(
-            self.shoppinglist.id)
-        for item in shopping_list_items:
-            self.shoplist_controller.update_purchased_status(
-                item.id, True)  # Set all items as purchased
+        # One UPDATE for the whole list; only the changed items come back.
+        changed = self.shoplist_controller.set_all_purchased(self.shoppinglist.id, True)
+        self.purchase_queue.mark_stored(changed, True)
+        for item_id in changed:
+            if item_id in self._items:
+                self._items[item_id].is_purchased = True
+        self._update_total_cost_label(self._unpurchased_total())
+        self._update_overview_row()
 
     @catch_errors_ui
     def get_selected_products(self):
         """Returns a list of selected products from the shopping list."""
         if not self.shoppinglist:
             return []
+        self.flush_pending()
         shopping_list_items = self.shoplist_controller.repo.get_items_by_shopping_list_id(
             self.shoppinglist.id)
         selected_products = []
+        products = self.pc.get_all_products()
         for item in shopping_list_items:
-            product = self.pc.get_all_products().get(item.product_id)
+            product = products.get(item.product_id)
             if product:
                 selected_products.append({
                     "id": product.id,
@@ -277,6 +292,7 @@ class ShoplistDetailWidget(QWidget):
         if not self.shoppinglist:
             print("No shopping list is set.")
             return
+        self.flush_pending()
         existing_items = self.shoplist_controller.get_items_by_shopping_list_id(
             self.shoppinglist.id)
         if not selected_products:
@@ -340,6 +356,7 @@ class ShoplistDetailWidget(QWidget):
         confirm = ask_confirmation(
             self, pos="mid", yes_text="Poista", no_text="Peruuta")
         if confirm:
+            self.purchase_queue.discard()
             self.shoplist_controller.delete_shopping_list_by_id(
                 self.shoppinglist.id)
             show_error_toast(self.parent, "Ostoslista poistettu onnistuneesti.",
@@ -348,4 +365,5 @@ class ShoplistDetailWidget(QWidget):
 
     @catch_errors_ui
     def _go_back(self):
+        self.flush_pending()
         self.finished.emit()